@@ -0,0 +1,417 @@
+import json
+import logging
+import os
+import re
+import signal
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from multiprocessing import Pool, Value
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Text, TextIO, Tuple
+
+from mythril.exceptions import CompilerError
+
+from dolabra.analysis.cache import ResultCache
+from dolabra.analysis.findings import FindingsWriter
+from dolabra.analysis.prefetch import PrefetchPipeline
+from dolabra.constants import ENGINE_SYMBOLIC, ENGINE_STATIC, RPC_PREFETCH_CONCURRENCY, TIMEOUT
+from dolabra.contract_loaders.compilation import CompilationCache, SolidityCompiler
+from dolabra.contract_loaders.corpus_loader import open_corpus
+from dolabra.contract_loaders.jsonrpc_loader import rpc_client
+from dolabra.contract_loaders.loader import LoaderType, Loader
+from dolabra.contract_loaders.proxy import Proxy
+
+log = logging.getLogger(__name__)
+
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_ERROR = 'error'
+
+ADDRESS_PATTERN = re.compile(r'^0x[0-9a-fA-F]{40}$')
+FILE_LOADER_TYPES = {
+    '.bin': LoaderType.BINARY,
+    '.sol': LoaderType.SOLIDITY,
+}
+
+
+class BatchJob(NamedTuple):
+    """ A single contract to analyze, described by its loader so that it can be shipped to a worker process. """
+    name: Text
+    loader_type: LoaderType
+    options: Dict
+
+
+class JobTimeout(Exception):
+    """ Raised inside a worker when a job exceeds its wall-clock limit. """
+    pass
+
+
+def job_from_path(path: Path, solc: Optional[Text] = None) -> BatchJob:
+    loader_type = FILE_LOADER_TYPES.get(path.suffix)
+    if loader_type is None:
+        raise ValueError('Unsupported contract file: "%s"' % path)
+    options = {'path': str(path)}
+    if loader_type == LoaderType.SOLIDITY:
+        options['solc'] = solc
+    return BatchJob(str(path), loader_type, options)
+
+
+def job_from_address(address: Text, rpc: Optional[Text] = None, rpc_cache: Optional[Text] = None,
+                     block: Optional[int] = None) -> BatchJob:
+    options = {'address': address, 'rpc': rpc, 'rpc_cache': rpc_cache, 'block': block}
+    return BatchJob(address, LoaderType.JSON_RPC, options)
+
+
+def jobs_from_directory(directory: Text, solc: Optional[Text] = None) -> List[BatchJob]:
+    """ Collects every .bin and .sol file below *directory*. """
+    paths = sorted(path for path in Path(directory).rglob('*') if path.suffix in FILE_LOADER_TYPES)
+    return [job_from_path(path, solc) for path in paths]
+
+
+def jobs_from_addresses(addresses: Iterable[Text], rpc: Optional[Text] = None,
+                        rpc_cache: Optional[Text] = None, block: Optional[int] = None) -> List[BatchJob]:
+    return [job_from_address(address, rpc, rpc_cache, block) for address in addresses]
+
+
+def jobs_from_corpus(corpus: Text) -> List[BatchJob]:
+    """ Creates a job for every address of a packed bytecode corpus. """
+    return [BatchJob(address, LoaderType.CORPUS, {'corpus': corpus, 'address': address})
+            for address in open_corpus(corpus).addresses()]
+
+
+def jobs_from_manifest(manifest: Text, rpc: Optional[Text] = None, solc: Optional[Text] = None,
+                       rpc_cache: Optional[Text] = None, block: Optional[int] = None) -> List[BatchJob]:
+    """
+    Reads a manifest with one contract per line: either a contract address or a path to a .bin/.sol file.
+    Relative paths are resolved against the directory of the manifest. Empty lines and lines starting with '#' are ignored.
+    """
+    manifest_path = Path(manifest)
+    jobs = []
+    with open(manifest_path) as manifest_file:
+        for line in manifest_file:
+            entry = line.strip()
+            if not entry or entry.startswith('#'):
+                continue
+            if ADDRESS_PATTERN.match(entry):
+                jobs.append(job_from_address(entry, rpc, rpc_cache, block))
+            else:
+                path = Path(entry)
+                if not path.is_absolute():
+                    path = manifest_path.parent / path
+                jobs.append(job_from_path(path, solc))
+    return jobs
+
+
+def expand_solidity_jobs(jobs: List[BatchJob], solc: Optional[Text] = None,
+                         compile_cache: Optional[Text] = None) -> List[BatchJob]:
+    """
+    Replaces every Solidity job by one job per deployable contract of its file. All files are compiled up front,
+    together, into the compilation cache the workers then read from; without *compile_cache* a temporary one is used.
+    Files that fail to compile keep their job, so the error is reported for them.
+    """
+    paths = [Path(job.options['path']) for job in jobs if job.loader_type == LoaderType.SOLIDITY]
+    if not paths:
+        return jobs
+    compile_cache = compile_cache or tempfile.mkdtemp(prefix='dolabra-solc-')
+    try:
+        compiled = SolidityCompiler(solc, cache=CompilationCache(compile_cache)).compile(paths)
+    except CompilerError as e:
+        log.error('Could not compile the Solidity sources: %s', e)
+        return jobs
+
+    expanded = []
+    contracts_count = 0
+    for job in jobs:
+        contracts = compiled.get(Path(job.options['path'])) if job.loader_type == LoaderType.SOLIDITY else None
+        deployable = [contract for contract in contracts or [] if contract.runtime_code]
+        if not deployable:
+            expanded.append(job)
+            continue
+        contracts_count += len(deployable)
+        for contract in deployable:
+            options = dict(job.options, contract_name=contract.name, compile_cache=compile_cache)
+            expanded.append(BatchJob('{}:{}'.format(job.name, contract.name), job.loader_type, options))
+    log.info('Expanded %d Solidity files into %d contracts', len(paths), contracts_count)
+    return expanded
+
+
+class ProxyPlan(NamedTuple):
+    """ The jobs left to analyze, the proxies taking the results of each implementation and what they are. """
+    jobs: List[BatchJob]
+    followers: Dict[Text, List[BatchJob]]
+    proxies: Dict[Text, Dict]
+
+
+def _check_proxy(job: BatchJob) -> Tuple[BatchJob, Optional[Proxy]]:
+    """ Whether the contract of the JSON-RPC *job* is a proxy, and the job carrying the values read to tell. """
+    try:
+        contract_loader = Loader.get_contract(job.loader_type, **job.options)
+        proxy = contract_loader.proxy()
+    except Exception as e:
+        log.warning('Could not check whether %s is a proxy: %s', job.name, e)
+        return job, None
+    return job._replace(options=dict(job.options, **contract_loader.loaded_options())), proxy
+
+
+def resolve_proxy_jobs(jobs: List[BatchJob], concurrency: int = RPC_PREFETCH_CONCURRENCY) -> ProxyPlan:
+    """
+    Replaces the jobs of proxy contracts among the JSON-RPC jobs by one job per implementation, so that each
+    implementation is analyzed once whatever the number of proxies delegating to it (see *resolve_proxy*).
+    Implementations that are jobs of their own keep their job. Contracts that cannot be read keep their job,
+    so the error is reported for them.
+
+    Up to *concurrency* contracts are checked at once, all at the block the first check of their node pins.
+    The jobs kept carry the chain data read by the check (see *JsonRpcLoader.loaded_options*), which neither
+    the prefetch stage nor the workers read again.
+    """
+    blocks: Dict[Tuple, int] = {}
+    pinned: List[BatchJob] = []
+    for job in jobs:
+        if job.loader_type == LoaderType.JSON_RPC:
+            key = (job.options.get('rpc'), job.options.get('rpc_cache'), job.options.get('block'))
+            try:
+                if key not in blocks:
+                    blocks[key] = rpc_client(*key).block_number
+                job = job._replace(options=dict(job.options, block=blocks[key]))
+            except Exception as e:
+                log.warning('Could not read the block number of %s: %s', job.name, e)
+        pinned.append(job)
+
+    rpc_jobs = [job for job in pinned if job.loader_type == LoaderType.JSON_RPC]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        checked = dict(zip((job.name for job in rpc_jobs), executor.map(_check_proxy, rpc_jobs)))
+
+    kept: List[BatchJob] = []
+    implementation_jobs: Dict[Text, BatchJob] = {}
+    followers: Dict[Text, List[BatchJob]] = {}
+    proxy_jobs: Dict[Text, BatchJob] = {}
+    proxies: Dict[Text, Dict] = {}
+    for job in pinned:
+        job, proxy = checked.get(job.name, (job, None))
+        if proxy is None:
+            kept.append(job)
+            continue
+        proxies[job.name] = proxy._asdict()
+        proxy_jobs[job.name] = job
+        options = {name: value for name, value in job.options.items() if name != 'prefetched'}
+        implementation_jobs.setdefault(proxy.implementation, BatchJob(
+            proxy.implementation, job.loader_type, dict(options, address=proxy.implementation)))
+
+    names = {job.name.lower(): job.name for job in kept}
+    for implementation, job in implementation_jobs.items():
+        if implementation not in names:
+            names[implementation] = job.name
+            kept.append(job)
+    for proxy_name, proxy in proxies.items():
+        followers.setdefault(names[proxy['implementation']], []).append(proxy_jobs[proxy_name])
+    if proxies:
+        log.info('Resolved %d proxies to %d implementations', len(proxies), len(implementation_jobs))
+    return ProxyPlan(kept, followers, proxies)
+
+
+# Seconds of symbolic execution left unused by finished jobs, shared by the workers of an adaptive batch
+_time_bank = None
+
+
+def _raise_job_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def _init_worker(time_bank=None) -> None:
+    """ Pays the mythril/z3 import cost once per worker process instead of once per contract. """
+    global _time_bank
+    _time_bank = time_bank
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from dolabra.analysis.module.modules.loader import ModuleLoader
+    import dolabra.analysis.symbolic  # noqa: F401
+    ModuleLoader()
+
+
+def _alive(pid: int) -> bool:
+    """ Whether the worker process *pid* still runs, the pools never report tasks lost with their worker. """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _borrow_time(contract_loader, timeout: int = TIMEOUT) -> int:
+    """ Takes seconds saved by earlier jobs for a contract estimated to need more than the fixed *timeout*. """
+    from dolabra.analysis.budget import estimate_cost
+
+    if _time_bank is None:
+        return 0
+    disassembly = contract_loader.disassembly()
+    if disassembly is None or not disassembly.instruction_list:
+        return 0
+    wanted = min(estimate_cost(disassembly).seconds - timeout, timeout)
+    if wanted <= 0:
+        return 0
+    with _time_bank.get_lock():
+        extra = int(min(wanted, _time_bank.value))
+        _time_bank.value -= extra
+    return extra
+
+
+def _return_time(seconds: float) -> None:
+    if _time_bank is not None and seconds > 0:
+        with _time_bank.get_lock():
+            _time_bank.value += seconds
+
+
+@lru_cache(maxsize=None)
+def _solver_cache(path: Text):
+    """ The SMT query cache of this worker, kept open for all of its jobs. """
+    from dolabra.analysis.smt_cache import SolverCache
+    return SolverCache(path)
+
+
+def _run_job(job: BatchJob, job_timeout: Optional[float] = None, result_cache: Optional[ResultCache] = None,
+             engine: Text = ENGINE_SYMBOLIC, symbolic_fallback: bool = False, adaptive: bool = False,
+             findings_writer: Optional[FindingsWriter] = None, smt_cache: Optional[Text] = None,
+             signatures: Optional[Text] = None, timeout: int = TIMEOUT) -> Dict:
+    from dolabra.analysis.static import StaticWrapper
+    from dolabra.analysis.symbolic import SymbolicWrapper
+
+    record = {'name': job.name, 'status': STATUS_OK, 'wall_time': None, 'results': None, 'error': None}
+    if engine == ENGINE_STATIC:
+        record['undecided'] = None
+    start_time = time.time()
+    previous_handler = signal.signal(signal.SIGALRM, _raise_job_timeout)
+    if job_timeout:
+        signal.setitimer(signal.ITIMER_REAL, job_timeout)
+    solver_cache = _solver_cache(smt_cache) if smt_cache and engine != ENGINE_STATIC else None
+    try:
+        contract_loader = Loader.get_contract(job.loader_type, **job.options)
+        if engine == ENGINE_STATIC:
+            analysis = StaticWrapper(contract_loader, SymbolicWrapper.white_list, symbolic_fallback=symbolic_fallback,
+                                     result_cache=result_cache, signatures=signatures)
+            record['results'] = analysis.run_analysis()
+            record['undecided'] = analysis.undecided
+            if findings_writer is not None:
+                findings_writer.emit_report(record['results'])
+        elif adaptive:
+            extra = _borrow_time(contract_loader, timeout)
+            if extra and job_timeout:
+                signal.setitimer(signal.ITIMER_REAL, job_timeout + extra - (time.time() - start_time))
+            analysis = SymbolicWrapper(contract_loader, result_cache=result_cache, timeout=timeout + extra,
+                                       adaptive=True, findings_writer=findings_writer, smt_cache=solver_cache,
+                                       signatures=signatures)
+            analysis_start = time.time()
+            try:
+                record['results'] = analysis.run_analysis()
+            finally:
+                # A cached report spent none of its allotment, only the borrowed seconds go back
+                _return_time(extra if analysis.cached else timeout + extra - (time.time() - analysis_start))
+            record['budget'] = analysis.budget._asdict() if analysis.budget else None
+        else:
+            record['results'] = SymbolicWrapper(contract_loader, result_cache=result_cache, timeout=timeout,
+                                                findings_writer=findings_writer,
+                                                smt_cache=solver_cache, signatures=signatures).run_analysis()
+    except JobTimeout:
+        log.warning('Analysis of %s exceeded %s seconds', job.name, job_timeout)
+        record['status'] = STATUS_TIMEOUT
+    except Exception as e:
+        log.exception('Analysis of %s failed', job.name)
+        record['status'] = STATUS_ERROR
+        record['error'] = str(e) or type(e).__name__
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    record['wall_time'] = round(time.time() - start_time, 3)
+    if solver_cache is not None:
+        record['smt_cache'] = solver_cache.report()
+    return record
+
+
+def _follower_record(record: Dict, name: Text) -> Dict:
+    """ The record of the contract *name* taking the results of the contract analyzed for *record*. """
+    results = record['results']
+    if results is not None:
+        results = [[dict(result, contract=name) if result.get('contract') == record['name'] else result
+                    for result in pattern_results] for pattern_results in results]
+    return dict(record, name=name, representative=record['name'], wall_time=0.0, results=results)
+
+
+def _fan_out(record: Dict, followers: Dict[Text, List[BatchJob]],
+             proxies: Dict[Text, Dict]) -> Tuple[List[Dict], List[BatchJob]]:
+    """
+    *record* and the records of its followers, of their followers in turn and so on, and the jobs of the
+    followers to analyze themselves. Only successful analyses are taken, but by proxies, which only forward
+    calls to the contract they follow.
+    """
+    records, retried = [record], []
+    position = 0
+    while position < len(records):
+        leader = records[position]
+        for job in followers.get(leader['name'], []):
+            if leader['status'] == STATUS_OK or job.name in proxies:
+                records.append(_follower_record(leader, job.name))
+            else:
+                retried.append(job)
+        position += 1
+    return records, retried
+
+
+def run_batch(jobs: List[BatchJob], output: TextIO, workers: Optional[int] = None,
+              job_timeout: Optional[float] = None, result_cache: Optional[ResultCache] = None,
+              engine: Text = ENGINE_SYMBOLIC, symbolic_fallback: bool = False,
+              adaptive: bool = False, smt_cache: Optional[Text] = None,
+              signatures: Optional[Text] = None,
+              followers: Optional[Dict[Text, List[BatchJob]]] = None,
+              proxies: Optional[Dict[Text, Dict]] = None, prefetch: int = 0,
+              timeout: int = TIMEOUT) -> Dict[Text, int]:
+    """
+    Analyzes *jobs* on a pool of *workers* processes and writes one JSON record per contract to *output*
+    as soon as it is finished. Returns the number of contracts per status.
+
+    With *adaptive*, each contract gets a budget sized to its estimated cost, and the time cheap contracts
+    leave unused goes to later contracts estimated to need more than the fixed timeout. With *smt_cache*, the
+    path of an SQLite file, the workers share the solver verdicts of every contract through it. With
+    *signatures*, the path of a signature index, findings are labelled with the signatures of their functions.
+    *followers* are the jobs of the contracts that take the results of each analyzed contract instead of being
+    analyzed, see *triage_jobs* and *resolve_proxy_jobs*; their records name the contract they were taken from,
+    and followers of a follower take the same results. When an analysis does not succeed, its followers are
+    analyzed themselves once the other jobs are done, but for proxies (see *_fan_out*). The
+    records of the contracts in *proxies* carry their proxy kind and implementation. With *prefetch*, the
+    chain data of that many JSON-RPC contracts is loaded ahead of their analysis, see *PrefetchPipeline*.
+    *timeout* is the symbolic execution timeout of each contract, *job_timeout* the wall time a job may take.
+    """
+    summary = {STATUS_OK: 0, STATUS_TIMEOUT: 0, STATUS_ERROR: 0}
+    log.info('Analyzing %d contracts with %s worker processes...', len(jobs), workers or 'default')
+    time_bank = Value('d', 0.0) if adaptive else None
+    if engine == ENGINE_SYMBOLIC or symbolic_fallback:
+        # Import the engine before forking, so the workers inherit it instead of importing it each
+        import dolabra.analysis.symbolic  # noqa: F401
+    pending = jobs
+    with Pool(processes=workers, initializer=_init_worker, initargs=(time_bank,)) as pool:
+        run_job = partial(_run_job, job_timeout=job_timeout, result_cache=result_cache,
+                          engine=engine, symbolic_fallback=symbolic_fallback, adaptive=adaptive, smt_cache=smt_cache,
+                          signatures=signatures, timeout=timeout)
+        while pending:
+            pipeline = None
+            if prefetch and any(job.loader_type == LoaderType.JSON_RPC for job in pending):
+                pipeline = PrefetchPipeline(workers or os.cpu_count(), ahead=prefetch)
+            retried = []
+            for record in pool.imap_unordered(run_job, pipeline.jobs(pending) if pipeline is not None else pending):
+                if pipeline is not None:
+                    pipeline.finished()
+                records, failed_over = _fan_out(record, followers or {}, proxies or {})
+                retried.extend(failed_over)
+                for written in records:
+                    if proxies and written['name'] in proxies:
+                        written['proxy'] = proxies[written['name']]
+                    output.write(json.dumps(written) + '\n')
+                    summary[written['status']] += 1
+                output.flush()
+            if retried:
+                log.info('Analyzing %d contracts whose representative could not be analyzed', len(retried))
+            pending = retried
+    log.info('Batch analysis finished: %d ok, %d timeout, %d error',
+             summary[STATUS_OK], summary[STATUS_TIMEOUT], summary[STATUS_ERROR])
+    return summary
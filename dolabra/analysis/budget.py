@@ -0,0 +1,135 @@
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Text
+
+from mythril.disassembler.disassembly import Disassembly
+from mythril.laser.plugin.loader import LaserPluginLoader
+
+from dolabra.analysis.module.modules.basemodule import BaseModule
+from dolabra.analysis.static import StaticScanner, function_name
+from dolabra.constants import (
+    TIMEOUT,
+    MAX_DEPTH,
+    BOUNDED_LOOPS_LIMIT,
+    BUDGET_MIN_TIMEOUT,
+    BUDGET_BASE_SECONDS,
+    BUDGET_SECONDS_PER_FUNCTION,
+    BUDGET_SECONDS_PER_BACK_EDGE,
+    BUDGET_BYTES_PER_SECOND,
+    BUDGET_STORAGE_WEIGHT,
+    BUDGET_SHALLOW_SHARE,
+    BUDGET_SHALLOW_MAX_DEPTH,
+    BUDGET_SHALLOW_LOOPS_LIMIT,
+    BUDGET_COVERAGE_TARGET
+)
+
+log = logging.getLogger(__name__)
+
+COVERAGE_PLUGIN = 'coverage'
+STORAGE_OPCODES = ('SLOAD', 'SSTORE')
+
+
+class CostEstimate(NamedTuple):
+    """ Static features of a contract and the symbolic execution time they are expected to need. """
+    code_size: int
+    selectors: int
+    back_edges: int
+    storage_density: float
+    seconds: float
+
+
+class AnalysisBudget(NamedTuple):
+    """ Limits of the symbolic execution of one contract: a shallow pass followed by a deeper one. """
+    timeout: int
+    max_depth: int
+    bounded_loops_limit: int
+    shallow_timeout: int
+    shallow_max_depth: int
+    shallow_loops_limit: int
+
+
+def estimate_cost(disassembly: Disassembly) -> CostEstimate:
+    """
+    Estimates the cost of a contract from its runtime code: every dispatched function and every loop
+    (a jump back to an earlier block) adds a fixed number of seconds, large code adds more, and the whole
+    estimate grows with the share of storage accesses, which create the most solver work.
+    """
+    scanner = StaticScanner(disassembly)
+    instructions = scanner.instructions
+    code_size = len(disassembly.bytecode) // 2
+    selectors = len(scanner.dispatcher())
+    back_edges = sum(1 for block in scanner.blocks.values() for successor in block.successors
+                     if successor <= block.start)
+    storage_ops = sum(1 for instruction in instructions if instruction['opcode'] in STORAGE_OPCODES)
+    storage_density = storage_ops / len(instructions) if instructions else 0.0
+
+    seconds = (BUDGET_BASE_SECONDS + BUDGET_SECONDS_PER_FUNCTION * selectors
+               + BUDGET_SECONDS_PER_BACK_EDGE * back_edges + code_size / BUDGET_BYTES_PER_SECOND)
+    seconds *= 1 + BUDGET_STORAGE_WEIGHT * storage_density
+    return CostEstimate(code_size, selectors, back_edges, round(storage_density, 4), round(seconds, 1))
+
+
+def plan_budget(estimate: CostEstimate, timeout: int = TIMEOUT, max_depth: int = MAX_DEPTH,
+                bounded_loops_limit: int = BOUNDED_LOOPS_LIMIT) -> AnalysisBudget:
+    """ Scales the budget to the estimate; *timeout*, *max_depth* and *bounded_loops_limit* are the upper bounds. """
+    budget = int(min(max(estimate.seconds, BUDGET_MIN_TIMEOUT), timeout))
+    return AnalysisBudget(timeout=budget,
+                          max_depth=max_depth,
+                          bounded_loops_limit=bounded_loops_limit,
+                          shallow_timeout=max(int(budget * BUDGET_SHALLOW_SHARE), 1),
+                          shallow_max_depth=min(max_depth, BUDGET_SHALLOW_MAX_DEPTH),
+                          shallow_loops_limit=min(bounded_loops_limit, BUDGET_SHALLOW_LOOPS_LIMIT))
+
+
+def _runtime_coverage(disassembly: Disassembly) -> Optional[List[bool]]:
+    """ Covered instructions of the runtime code in the last laser run, from mythril's coverage plugin. """
+    plugin = LaserPluginLoader().plugin_list.get(COVERAGE_PLUGIN)
+    if plugin is None:
+        return None
+    bytecode = disassembly.bytecode[2:] if disassembly.bytecode.startswith('0x') else disassembly.bytecode
+    size = len(disassembly.instruction_list)
+    for code, (count, covered) in plugin.coverage.items():
+        if isinstance(code, tuple):
+            try:
+                code = bytes(code).hex()
+            except TypeError:
+                continue
+        code = code[2:] if code.startswith('0x') else code
+        if code == bytecode and count == size:
+            return covered
+    return None
+
+
+def function_coverage(disassembly: Disassembly) -> Dict[Text, float]:
+    """ Share of the instructions reachable from each function entry that the last laser run executed. """
+    covered = _runtime_coverage(disassembly)
+    if covered is None:
+        return {}
+    scanner = StaticScanner(disassembly)
+    coverage = {}
+    for selector, entry in scanner.dispatcher().items():
+        indices = [index for block in scanner.reachable_blocks(entry) for index in range(block.start, block.end + 1)]
+        if indices:
+            coverage[function_name(disassembly, selector, entry)] = \
+                sum(1 for index in indices if covered[index]) / len(indices)
+    return coverage
+
+
+def functions_to_deepen(disassembly: Disassembly, modules: Iterable[BaseModule]) -> List[int]:
+    """
+    Returns the selectors worth a deeper pass after a shallow one: functions some module has not settled on,
+    unless the static scan rules that module's pattern out, and functions whose code was poorly covered.
+    Functions every module has settled on are never deepened.
+    """
+    modules = list(modules)
+    scanner = StaticScanner(disassembly)
+    scans = {function.selector: function for function in scanner.scan([module.pattern_name for module in modules])}
+    coverage = function_coverage(disassembly)
+    selectors: Set[int] = set()
+    for selector, function in scans.items():
+        unsettled = [module for module in modules if not module.is_settled(function.name)]
+        if not unsettled:
+            continue
+        unclassified = any(function.verdicts.get(module.pattern_name) is not False for module in unsettled)
+        if unclassified or coverage.get(function.name, 0.0) < BUDGET_COVERAGE_TARGET:
+            selectors.add(selector)
+    return sorted(selectors)
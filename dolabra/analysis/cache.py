@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Text, Union
+
+from eth_hash.auto import keccak
+
+from dolabra.constants import (
+    TIMEOUT,
+    MAX_DEPTH,
+    BOUNDED_LOOPS_LIMIT,
+    RESULT_CACHE_MAX_SIZE,
+    RESULT_CACHE_MAX_AGE,
+    RESULT_CACHE_EVICTION_INTERVAL
+)
+
+log = logging.getLogger(__name__)
+
+# Bump whenever the layout of the stored reports changes
+CACHE_FORMAT_VERSION = 1
+
+
+def code_hash(bytecode: Text) -> Text:
+    """ Keccak hash of hex *bytecode* as mythril computes it, or '' for code that is not hex. """
+    bytecode = bytecode[2:] if bytecode[:2] == '0x' else bytecode
+    try:
+        return '0x' + keccak(bytes.fromhex(bytecode)).hex()
+    except ValueError:
+        return ''
+
+
+def analysis_variant(per_function: bool = False, adaptive: bool = False,
+                     selectors: Optional[Iterable[int]] = None, exclude: bool = False) -> Optional[Text]:
+    """
+    Names the symbolic analysis mode for *ResultCache.key*, None for the default single run. Runs constrained
+    to the function *selectors*, or with *exclude* to the calldata matching none of them, are told apart by them.
+    """
+    if per_function:
+        variant = 'per-function'
+    else:
+        variant = 'adaptive' if adaptive else None
+    if selectors is None:
+        return variant
+    constraint = '{}:{}'.format('excluded' if exclude else 'selectors',
+                                ','.join('0x%08x' % selector for selector in sorted(selectors)))
+    return '{}/{}'.format(variant, constraint) if variant else constraint
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of analysis reports.
+
+    Entries are keyed by the keccak hash of the analyzed bytecode together with the analysis settings,
+    so byte-identical contracts (clones, token templates) are only analyzed once. The cache is bounded
+    by total size and entry age; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory: Union[Text, Path], max_size: int = RESULT_CACHE_MAX_SIZE,
+                 max_age: float = RESULT_CACHE_MAX_AGE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._puts_since_eviction = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(bytecode: Text, white_list: List[Text], timeout: int = TIMEOUT, max_depth: int = MAX_DEPTH,
+            bounded_loops_limit: int = BOUNDED_LOOPS_LIMIT, variant: Optional[Text] = None) -> Optional[Text]:
+        """
+        Returns the cache key for *bytecode* analyzed with the given settings, or None for code that cannot be hashed.
+        The *variant* distinguishes analysis modes producing different reports for the same settings.
+        """
+        bytecode_hash = code_hash(bytecode.strip())
+        if not bytecode_hash:
+            return None
+        settings = [CACHE_FORMAT_VERSION, bytecode_hash, sorted(white_list), timeout, max_depth, bounded_loops_limit]
+        if variant is not None:
+            settings.append(variant)
+        settings = json.dumps(settings)
+        return hashlib.sha256(settings.encode()).hexdigest()
+
+    def _path(self, key: Text) -> Path:
+        return self.directory / key[:2] / (key + '.json')
+
+    def get(self, key: Text) -> Optional[List]:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                self._remove(path)
+                return None
+            with open(path) as entry:
+                report = json.load(entry)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning('Dropping unreadable cache entry %s: %s', path, e)
+            self._remove(path)
+            return None
+        # Refresh the modification time, which is used as the recency for eviction
+        os.utime(path)
+        return report
+
+    def put(self, key: Text, report: List) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Write to a private file first, concurrent workers may hit the same key
+        tmp_path = path.with_suffix('.%d.tmp' % os.getpid())
+        with open(tmp_path, 'w') as entry:
+            json.dump(report, entry)
+        os.replace(tmp_path, path)
+
+        self._puts_since_eviction += 1
+        if self._puts_since_eviction >= RESULT_CACHE_EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self) -> None:
+        """ Removes expired entries, then the least recently used ones until the cache fits into *max_size*. """
+        self._puts_since_eviction = 0
+        now = time.time()
+        entries = []
+        for path in self.directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
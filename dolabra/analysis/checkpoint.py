@@ -0,0 +1,332 @@
+import copyreg
+import io
+import logging
+import os
+import pickle
+import signal
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Text
+
+import z3
+from mythril.laser.ethereum.cfg import Node
+from mythril.laser.ethereum.function_managers import keccak_function_manager
+from mythril.laser.ethereum.state.account import Account
+from mythril.laser.ethereum.state.global_state import GlobalState
+from mythril.laser.ethereum.strategy import BasicSearchStrategy
+from mythril.laser.ethereum.svm import LaserEVM
+from mythril.laser.ethereum.time_handler import time_handler
+from mythril.laser.ethereum.transaction.symbolic import execute_message_call
+from mythril.laser.ethereum.transaction.transaction_models import tx_id_manager
+
+from dolabra.analysis.module.modules.basemodule import BaseModule
+from dolabra.analysis.smt_cache import SOLVER_TIME_MARGIN_MS
+from dolabra.constants import CHECKPOINT_FORMAT_VERSION
+
+log = logging.getLogger(__name__)
+
+# Module attributes bound to the run rather than part of its progress
+TRANSIENT_MODULE_ATTRIBUTES = ('on_result',)
+
+
+def _reduce_node(node: Node):
+    # Only the last state of a node is read again (see basemodule.previous_state), not the whole history
+    state = dict(vars(node))
+    state['states'] = node.states[-1:]
+    return copyreg.__newobj__, (type(node),), state
+
+
+class AccountBalance:
+    """ Picklable stand-in for the balance lambda of a mythril account. """
+
+    def __init__(self, account: Account):
+        self.account = account
+
+    def __call__(self):
+        return self.account._balances[self.account.address]
+
+
+def _reduce_account(account: Account):
+    state = dict(vars(account))
+    state['balance'] = AccountBalance(account)
+    return copyreg.__newobj__, (type(account),), state
+
+
+def _reduce_function(function: z3.FuncDeclRef):
+    return z3.Function, (function.name(),) + tuple(function.domain(index) for index in range(function.arity())) \
+        + (function.range(),)
+
+
+def _reduce_sort(sort: z3.SortRef):
+    if isinstance(sort, z3.BitVecSortRef):
+        return z3.BitVecSort, (sort.size(),)
+    if isinstance(sort, z3.ArraySortRef):
+        return z3.ArraySort, (sort.domain(), sort.range())
+    if isinstance(sort, z3.BoolSortRef):
+        return z3.BoolSort, ()
+    raise pickle.PicklingError('Cannot checkpoint z3 sort %s' % sort)
+
+
+class CheckpointPickler(pickle.Pickler):
+    """
+    Pickles laser states. The z3 terms are left out and collected in *expressions*, to be written as a single
+    SMT-LIB script sharing their common subterms (see *write_checkpoint*). The objects of *externals* belong
+    to the run and are pickled by their key, to be replaced by the ones of the resuming run.
+    """
+
+    def __init__(self, file, externals: Dict[Text, object]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        self.dispatch_table[Node] = _reduce_node
+        self.dispatch_table[Account] = _reduce_account
+        self.dispatch_table[z3.FuncDeclRef] = _reduce_function
+        for sort_type in (z3.SortRef, z3.BitVecSortRef, z3.ArraySortRef, z3.BoolSortRef):
+            self.dispatch_table[sort_type] = _reduce_sort
+        self.externals = {id(value): key for key, value in externals.items() if value is not None}
+        self.expressions: List[z3.ExprRef] = []
+        self._indexes: Dict[int, int] = {}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, z3.ExprRef):
+            ast_id = obj.get_id()
+            index = self._indexes.get(ast_id)
+            if index is None:
+                index = self._indexes[ast_id] = len(self.expressions)
+                self.expressions.append(obj)
+            return 'expression', index
+        key = self.externals.get(id(obj))
+        if key is not None:
+            return 'external', key
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, externals: Dict[Text, object], expressions: List[z3.ExprRef]):
+        super().__init__(file)
+        self.externals = externals
+        self.expressions = expressions
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == 'expression':
+            return self.expressions[key]
+        if kind == 'external' and key in self.externals:
+            return self.externals[key]
+        raise pickle.UnpicklingError('The checkpoint refers to %s "%s" this run does not have' % (kind, key))
+
+
+def _expressions_script(expressions: List[z3.ExprRef]) -> Text:
+    # Each term is the argument of its own uninterpreted predicate, a closing true keeps the conjunction binary
+    solver = z3.Solver()
+    wrapped = [z3.Function('dolabra!checkpoint!%d' % index, expression.sort(), z3.BoolSort())(expression)
+               for index, expression in enumerate(expressions + [z3.BoolVal(True)])]
+    solver.add(z3.And(*wrapped))
+    return solver.sexpr()
+
+
+def _parse_expressions(script: Text) -> List[z3.ExprRef]:
+    conjunction = z3.parse_smt2_string(script)[0]
+    return [wrapped.arg(0) for wrapped in conjunction.children()[:-1]]
+
+
+def module_state(module: BaseModule) -> Dict:
+    """ The accumulated state of *module*: its results, its cache and whatever it collects besides. """
+    return {name: value for name, value in vars(module).items() if name not in TRANSIENT_MODULE_ATTRIBUTES}
+
+
+class Checkpoint:
+    """ A symbolic execution stopped within its message call transaction *transaction* (counted from 0). """
+
+    def __init__(self, identity: Dict, transaction: int, address, work_list: List[GlobalState],
+                 open_states: List, modules: Dict[Text, Dict], plugins: Dict[Text, Dict], keccak: Dict,
+                 next_transaction_id: int):
+        self.identity = identity
+        self.transaction = transaction
+        # Address of the contract the message calls go to
+        self.address = address
+        self.work_list = work_list
+        self.open_states = open_states
+        self.modules = modules
+        self.plugins = plugins
+        self.keccak = keccak
+        self.next_transaction_id = next_transaction_id
+
+    def restore(self, modules: List[BaseModule], plugins: Dict) -> None:
+        """ Puts the state of the modules, of the laser plugins and of mythril's globals back. """
+        for module in modules:
+            vars(module).update(self.modules.get(type(module).__name__, {}))
+        for name, plugin in plugins.items():
+            vars(plugin).update(self.plugins.get(name, {}))
+        vars(keccak_function_manager).update(self.keccak)
+        tx_id_manager.set_counter(self.next_transaction_id)
+
+
+def write_checkpoint(path: Text, checkpoint: Checkpoint, externals: Dict[Text, object]) -> None:
+    """
+    Writes *checkpoint* to *path*: a pickled header, the SMT-LIB script of the z3 terms and the pickled
+    states. The file is replaced at once, an interrupted write leaves an earlier checkpoint intact.
+    """
+    body = io.BytesIO()
+    pickler = CheckpointPickler(body, externals)
+    pickler.dump(checkpoint)
+    temporary_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(temporary_path, 'wb') as checkpoint_file:
+            pickle.dump({'version': CHECKPOINT_FORMAT_VERSION, 'identity': checkpoint.identity}, checkpoint_file)
+            pickle.dump(_expressions_script(pickler.expressions), checkpoint_file)
+            checkpoint_file.write(body.getbuffer())
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+
+
+def read_checkpoint(path: Text, identity: Dict, externals: Dict[Text, object]) -> Checkpoint:
+    """ Reads the checkpoint at *path*, raises ValueError unless it was taken of an analysis matching *identity*. """
+    with open(path, 'rb') as checkpoint_file:
+        header = pickle.load(checkpoint_file)
+        if not isinstance(header, dict) or header.get('version') != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError('Unsupported checkpoint format: "%s"' % path)
+        if header['identity'] != identity:
+            raise ValueError('The checkpoint "%s" was taken of another contract or module selection' % path)
+        expressions = _parse_expressions(pickle.load(checkpoint_file))
+        return CheckpointUnpickler(checkpoint_file, externals, expressions).load()
+
+
+class CheckpointStrategy(BasicSearchStrategy):
+    """ Strategy extension ending the execution instead of handing out the next state once a checkpoint is due. """
+
+    def __init__(self, super_strategy: BasicSearchStrategy, **kwargs) -> None:
+        self.super_strategy = super_strategy
+        self.checkpointer: Checkpointer = kwargs['checkpointer']
+        BasicSearchStrategy.__init__(self, super_strategy.work_list, super_strategy.max_depth)
+
+    def get_strategic_global_state(self) -> GlobalState:
+        if self.checkpointer.due():
+            raise StopIteration
+        return self.super_strategy.get_strategic_global_state()
+
+    def run_check(self) -> bool:
+        return self.super_strategy.run_check()
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint of the symbolic execution to *path* when it times out or when one is requested (see
+    *request*, e.g. by SIGUSR1), and ends the execution there.
+
+    The checkpoint is taken before the next state is handed out, so no state is lost to the timeout: it holds
+    the work list, the world states ending the current message call transaction, the module and plugin state
+    and mythril's global keccak and transaction id state. Timeouts during the contract creation are not
+    checkpointed, they end the execution as usual.
+    """
+
+    def __init__(self, path: Text, identity: Dict, modules: List[BaseModule], plugins: Dict,
+                 externals: Optional[Dict[Text, object]] = None):
+        self.path = path
+        self.identity = identity
+        self.modules = modules
+        self.plugins = plugins
+        self.externals = externals or {}
+        # Message call transactions started so far, set by a resumed execution
+        self.transaction = 0
+        self.requested = False
+        self.taken = False
+        self.laser: Optional[LaserEVM] = None
+
+    def initialize(self, laser: LaserEVM) -> None:
+        """ Hooks into *laser*, after every other strategy extension so it sees the states before they do. """
+        self.laser = laser
+        laser.extend_strategy(CheckpointStrategy, checkpointer=self)
+
+        @laser.laser_hook('start_sym_trans')
+        def start_sym_trans():
+            self.transaction += 1
+
+    def request(self) -> None:
+        self.requested = True
+
+    @contextmanager
+    def signal_handler(self, signal_number: int = getattr(signal, 'SIGUSR1', 0)) -> Iterator[None]:
+        """ Requests a checkpoint on *signal_number* while in the block, where the platform and thread allow it. """
+        if not signal_number or threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        previous_handler = signal.signal(signal_number, lambda signum, frame: self.request())
+        try:
+            yield
+        finally:
+            signal.signal(signal_number, previous_handler)
+
+    def due(self) -> bool:
+        """ Whether the execution ends here, taking the checkpoint when it has not been taken yet. """
+        if self.taken:
+            return True
+        if self.transaction < 1 or not (self.requested or self.timed_out()):
+            return False
+        if not self.laser.work_list:
+            # The transaction is over, its end states are checkpointed with the states of the next one
+            return True
+        self.taken = True
+        try:
+            self.write()
+        except Exception:
+            log.exception('Could not write the checkpoint to %s', self.path)
+        return True
+
+    def timed_out(self) -> bool:
+        """
+        Whether the execution is out of time. The solver gives up as unsat within the last *SOLVER_TIME_MARGIN_MS*
+        already, which would empty the work list before laser's own timeout check is reached.
+        """
+        if self.laser.execution_timeout <= 0:
+            return False
+        return self.laser._check_execution_termination() or time_handler.time_remaining() <= SOLVER_TIME_MARGIN_MS
+
+    def write(self) -> None:
+        laser = self.laser
+        address = laser.work_list[0].transaction_stack[0][0].callee_account.address
+        checkpoint = Checkpoint(self.identity, self.transaction - 1, address, list(laser.work_list),
+                                list(laser.open_states),
+                                {type(module).__name__: module_state(module) for module in self.modules},
+                                {name: dict(vars(plugin)) for name, plugin in self.plugins.items()},
+                                dict(vars(keccak_function_manager)), tx_id_manager._next_transaction_id)
+        write_checkpoint(self.path, checkpoint, self.externals)
+        log.info('Checkpointed %d states of message call transaction %d to %s', len(checkpoint.work_list),
+                 checkpoint.transaction, self.path)
+
+
+def resume_sym_exec(laser: LaserEVM, checkpoint: Checkpoint) -> None:
+    """
+    Continues the symbolic execution *checkpoint* was taken of, in place of *LaserEVM.sym_exec*: finishes its
+    message call transaction from the checkpointed work list, then runs the remaining transactions.
+    """
+    for hook in laser._start_sym_exec_hooks:
+        hook()
+    time_handler.start_execution(laser.execution_timeout)
+    laser.time = datetime.now()
+    laser.open_states = checkpoint.open_states
+    # The strategies hold on to the work list, it is filled in place
+    laser.work_list[:] = checkpoint.work_list
+    log.info('Resuming message call transaction %d with %d states', checkpoint.transaction, len(laser.work_list))
+    laser.exec()
+    for hook in laser._stop_sym_trans_hooks:
+        hook()
+
+    for transaction in range(checkpoint.transaction + 1, laser.transaction_count):
+        if len(laser.open_states) == 0:
+            break
+        if laser.use_reachability_check:
+            laser.open_states = [state for state in laser.open_states if state.constraints.is_possible()]
+        log.info('Starting message call transaction, iteration: %d, %d initial states', transaction,
+                 len(laser.open_states))
+        for hook in laser._start_sym_trans_hooks:
+            hook()
+        execute_message_call(laser, checkpoint.address)
+        for hook in laser._stop_sym_trans_hooks:
+            hook()
+    laser.executed_transactions = True
+
+    for hook in laser._stop_sym_exec_hooks:
+        hook()
@@ -0,0 +1,66 @@
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Text, TextIO
+
+log = logging.getLogger(__name__)
+
+
+class FindingsWriter:
+    """
+    Writes module hits as JSON lines the moment they are found, followed by a summary line.
+
+    Every finding carries the seconds elapsed since the writer was created and the number of states laser has
+    explored so far, so consumers can process findings incrementally and measure the time to the first finding.
+    """
+
+    def __init__(self, output: TextIO, contract: Optional[Text] = None, proxy: Optional[Dict] = None):
+        self.output = output
+        self.contract = contract
+        # Kind and implementation of the analyzed proxy, whose findings are those of its implementation
+        self.proxy = proxy
+        self.start_time = time.time()
+        self.first_finding_time: Optional[float] = None
+        self.findings = 0
+        self.laser = None
+
+    @property
+    def elapsed(self) -> float:
+        return round(time.time() - self.start_time, 3)
+
+    @property
+    def states(self) -> Optional[int]:
+        return self.laser.total_states if self.laser is not None else None
+
+    def _write(self, record: Dict) -> None:
+        self.output.write(json.dumps(record) + '\n')
+        self.output.flush()
+
+    def emit(self, result: Dict[Text, Text]) -> None:
+        if self.first_finding_time is None:
+            self.first_finding_time = self.elapsed
+        self.findings += 1
+        self._write({'type': 'finding',
+                     'contract': self.contract or result.get('contract'),
+                     'pattern': result.get('pattern'),
+                     'function_name': result.get('function_name'),
+                     'signature': result.get('signature'),
+                     'elapsed': self.elapsed,
+                     'states': self.states})
+
+    def emit_report(self, report: List[List[Dict]]) -> None:
+        """ Emits the findings of a report produced without laser, e.g. a cached or static one. """
+        for results in report:
+            for result in results:
+                self.emit(result)
+
+    def summary(self, status: Text = 'ok', error: Optional[Text] = None) -> None:
+        self._write({'type': 'summary',
+                     'contract': self.contract,
+                     'status': status,
+                     'error': error,
+                     'findings': self.findings,
+                     'time_to_first_finding': self.first_finding_time,
+                     'elapsed': self.elapsed,
+                     'states': self.states,
+                     'proxy': self.proxy})
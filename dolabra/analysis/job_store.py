@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import sqlite3
+import time
+from functools import partial
+from multiprocessing import Pool, SimpleQueue, Value
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Text, TextIO, Tuple, Union
+
+from dolabra.analysis.batch import (
+    STATUS_OK,
+    STATUS_TIMEOUT,
+    STATUS_ERROR,
+    BatchJob,
+    _alive,
+    _init_worker,
+    _run_job
+)
+from dolabra.analysis.cache import ResultCache
+from dolabra.constants import (
+    ENGINE_SYMBOLIC,
+    JOB_STORE_LEASE,
+    JOB_STORE_HEARTBEAT_INTERVAL,
+    JOB_STORE_DEADLINE_GRACE,
+    JOB_STORE_MAX_ATTEMPTS,
+    JOB_STORE_BUSY_TIMEOUT,
+    TIMEOUT
+)
+from dolabra.contract_loaders.loader import LoaderType
+
+log = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_TIMED_OUT = 'timeout'
+JOB_STATUSES = (JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_TIMED_OUT)
+
+# Store status of a job per status of its batch record
+RECORD_STATUSES = {STATUS_OK: JOB_DONE, STATUS_TIMEOUT: JOB_TIMED_OUT, STATUS_ERROR: JOB_FAILED}
+
+
+class StoredJob(NamedTuple):
+    """ A job claimed from a *JobStore*. """
+    id: int
+    job: BatchJob
+    attempts: int
+
+
+class JobStore:
+    """
+    Durable queue of the contracts of an analysis campaign, in an SQLite database.
+
+    Every job is pending, running, done, failed or timed out, with its attempts, timings and batch record.
+    Any number of processes, on machines sharing the file, claim jobs atomically and keep the jobs they run
+    leased through heartbeats. The jobs of a worker that stopped heartbeating for *lease* seconds are claimed
+    again, until they used up *max_attempts*. The database uses a rollback journal, which unlike WAL works
+    on network filesystems with working locks.
+    """
+
+    def __init__(self, path: Union[Text, Path], lease: float = JOB_STORE_LEASE,
+                 max_attempts: int = JOB_STORE_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Transactions are explicit, claims take the write lock before reading
+            self._connection = sqlite3.connect(str(self.path), timeout=JOB_STORE_BUSY_TIMEOUT, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=DELETE')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, name TEXT UNIQUE, '
+                                     'loader_type TEXT, options TEXT, status TEXT, attempts INTEGER, worker TEXT, '
+                                     'added REAL, started REAL, heartbeat REAL, finished REAL, wall_time REAL, '
+                                     'error TEXT, record TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)')
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _transaction(self) -> 'JobStoreTransaction':
+        return JobStoreTransaction(self.connection)
+
+    def add(self, jobs: Iterable[BatchJob]) -> int:
+        """ Adds the jobs not in the store yet, by name, and returns how many were added. """
+        now = time.time()
+        rows = ((job.name, job.loader_type.name, json.dumps(job.options), JOB_PENDING, 0, now) for job in jobs)
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO jobs (name, loader_type, options, status, attempts, added) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            return connection.total_changes - before
+
+    def claim(self, worker: Text, count: int = 1) -> List[StoredJob]:
+        """ Marks up to *count* pending jobs, or jobs of lost workers, as run by *worker* and returns them. """
+        now = time.time()
+        expired = now - self.lease
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET status = ?, finished = ?, error = ? WHERE status = ? AND heartbeat < ? '
+                               'AND attempts >= ?', (JOB_FAILED, now, 'Worker lost', JOB_RUNNING, expired,
+                                                     self.max_attempts))
+            rows = connection.execute('SELECT id, name, loader_type, options, attempts FROM jobs WHERE status = ? '
+                                      'ORDER BY id LIMIT ?', (JOB_PENDING, count)).fetchall()
+            if len(rows) < count:
+                rows += connection.execute('SELECT id, name, loader_type, options, attempts FROM jobs '
+                                           'WHERE status = ? AND heartbeat < ? ORDER BY id LIMIT ?',
+                                           (JOB_RUNNING, expired, count - len(rows))).fetchall()
+            connection.executemany('UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started = ?, '
+                                   'heartbeat = ?, finished = NULL, error = NULL WHERE id = ?',
+                                   [(JOB_RUNNING, worker, now, now, row[0]) for row in rows])
+        return [StoredJob(job_id, BatchJob(name, LoaderType[loader_type], json.loads(options)), attempts + 1)
+                for job_id, name, loader_type, options, attempts in rows]
+
+    def heartbeat(self, worker: Text, job_ids: Iterable[int]) -> None:
+        """ Extends the lease of *worker* on the jobs *job_ids*. """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany('UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ? AND worker = ?',
+                                   [(now, job_id, JOB_RUNNING, worker) for job_id in job_ids])
+
+    def finish(self, worker: Text, job_id: int, record: Dict) -> bool:
+        """
+        Stores the batch record of a job *worker* ran to its end. Tells whether it was stored, which it is not
+        when the lease of *worker* expired and the job was claimed again.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ?, finished = ?, wall_time = ?, error = ?, '
+                                        'record = ? WHERE id = ? AND status = ? AND worker = ?',
+                                        (RECORD_STATUSES.get(record['status'], JOB_FAILED), time.time(),
+                                         record.get('wall_time'), record.get('error'), json.dumps(record), job_id,
+                                         JOB_RUNNING, worker))
+            return cursor.rowcount == 1
+
+    def retry(self, worker: Text, job_id: int) -> bool:
+        """
+        Makes a job *worker* lost the run of pending again, counting the attempt. Tells whether it was, which
+        it is not once the job used up its attempts or when *worker* no longer holds it.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ? WHERE id = ? AND status = ? AND worker = ? '
+                                        'AND attempts < ?', (JOB_PENDING, job_id, JOB_RUNNING, worker,
+                                                             self.max_attempts))
+            return cursor.rowcount == 1
+
+    def release(self, worker: Text) -> int:
+        """ Makes the running jobs of *worker* pending again, not counting their attempts, returns how many. """
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ?, attempts = attempts - 1 WHERE status = ? '
+                                        'AND worker = ?', (JOB_PENDING, JOB_RUNNING, worker))
+            return cursor.rowcount
+
+    def requeue(self, statuses: Iterable[Text]) -> int:
+        """ Makes the jobs of *statuses* pending again with fresh attempts, returns how many. """
+        statuses = list(statuses)
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ?, attempts = 0 WHERE status IN ({})'.format(
+                ', '.join('?' * len(statuses))), [JOB_PENDING] + statuses)
+            return cursor.rowcount
+
+    def counts(self) -> Dict[Text, int]:
+        """ Number of jobs per status. """
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return counts
+
+    def records(self, statuses: Optional[Iterable[Text]] = None) -> Iterator[Dict]:
+        """ The batch records of the finished jobs, of *statuses* only if given, in the order of the jobs. """
+        statuses = list(statuses or (JOB_DONE, JOB_FAILED, JOB_TIMED_OUT))
+        cursor = self.connection.execute('SELECT record FROM jobs WHERE status IN ({}) AND record IS NOT NULL '
+                                         'ORDER BY id'.format(', '.join('?' * len(statuses))), statuses)
+        for (record,) in cursor:
+            yield json.loads(record)
+
+
+class JobStoreTransaction:
+    """ Runs a block of statements as one immediate transaction, which holds the write lock from its start. """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+# Queue the workers of this process report the jobs they start to, see *_init_campaign_worker*
+_started = None
+
+
+def _init_campaign_worker(time_bank, started: SimpleQueue) -> None:
+    global _started
+    _started = started
+    _init_worker(time_bank)
+
+
+def _run_campaign_job(job_id: int, job: BatchJob, **options) -> Dict:
+    # Written right away, unlike a Queue's buffer this survives the worker dying with the job
+    _started.put((job_id, os.getpid(), time.time()))
+    return _run_job(job, **options)
+
+
+def default_worker_id() -> Text:
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def run_campaign(store: JobStore, output: Optional[TextIO] = None, workers: Optional[int] = None,
+                 job_timeout: Optional[float] = None, result_cache: Optional[ResultCache] = None,
+                 engine: Text = ENGINE_SYMBOLIC, symbolic_fallback: bool = False, adaptive: bool = False,
+                 smt_cache: Optional[Text] = None, worker: Optional[Text] = None,
+                 max_jobs: Optional[int] = None, signatures: Optional[Text] = None) -> Dict[Text, int]:
+    """
+    Runs jobs of *store* on a pool of *workers* processes until no job is left to claim, or after *max_jobs*.
+    Jobs are claimed as workers become free, so other processes on the same store share the rest. Records are
+    stored as soon as they are finished and, with *output*, also written to it as JSON lines. A job whose worker
+    process died is run again while it has attempts left, one past its deadline is killed and timed out.
+    Returns the number of contracts run per status.
+    """
+    workers = workers or os.cpu_count()
+    worker = worker or default_worker_id()
+    summary = {STATUS_OK: 0, STATUS_TIMEOUT: 0, STATUS_ERROR: 0}
+    log.info('Running the jobs of %s as %s with %d worker processes...', store.path, worker, workers)
+    time_bank = Value('d', 0.0) if adaptive else None
+    if engine == ENGINE_SYMBOLIC or symbolic_fallback:
+        # Import the engine before forking, so the workers inherit it instead of importing it each
+        import dolabra.analysis.symbolic  # noqa: F401
+    started = SimpleQueue()
+    with Pool(processes=workers, initializer=_init_campaign_worker, initargs=(time_bank, started)) as pool:
+        try:
+            _run_claimed(store, pool, started, worker, workers, max_jobs, output, summary,
+                         dict(job_timeout=job_timeout, result_cache=result_cache, engine=engine,
+                              symbolic_fallback=symbolic_fallback, adaptive=adaptive, smt_cache=smt_cache,
+                              signatures=signatures))
+        except KeyboardInterrupt:
+            log.info('Interrupted, handing the running jobs of %s back to the store', worker)
+            store.release(worker)
+            raise
+    log.info('Campaign worker %s finished: %d ok, %d timeout, %d error', worker,
+             summary[STATUS_OK], summary[STATUS_TIMEOUT], summary[STATUS_ERROR])
+    return summary
+
+
+def _run_claimed(store: JobStore, pool, started: SimpleQueue, worker: Text, workers: int, max_jobs: Optional[int],
+                 output: Optional[TextIO], summary: Dict[Text, int], options: Dict) -> None:
+    finished: queue.Queue = queue.Queue()
+    in_flight: Dict[int, StoredJob] = {}
+    # Worker process and start time of the jobs in flight that started
+    running: Dict[int, Tuple[int, float]] = {}
+    # A job may borrow up to TIMEOUT seconds of the time bank on top of its timeout
+    job_timeout = options['job_timeout']
+    deadline = job_timeout + (TIMEOUT if options['adaptive'] else 0) + JOB_STORE_DEADLINE_GRACE if job_timeout else None
+    claimed = 0
+    last_heartbeat = time.time()
+    while True:
+        free = workers - len(in_flight)
+        if max_jobs is not None:
+            free = min(free, max_jobs - claimed)
+        for stored in store.claim(worker, free) if free > 0 else []:
+            claimed += 1
+            in_flight[stored.id] = stored
+            pool.apply_async(_run_campaign_job, (stored.id, stored.job), options,
+                             callback=partial(_job_done, finished, stored),
+                             error_callback=partial(_job_failed, finished, stored))
+        if not in_flight:
+            break
+        try:
+            stored, record = finished.get(timeout=JOB_STORE_HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            stored = None
+        # A job given up on may still finish
+        if stored is not None and stored.id in in_flight:
+            del in_flight[stored.id]
+            running.pop(stored.id, None)
+            _store_record(store, worker, stored, record, output, summary)
+        _collect_started(started, running)
+        for stored, record in _lost_jobs(in_flight, running, deadline):
+            del in_flight[stored.id]
+            del running[stored.id]
+            if record['status'] == STATUS_TIMEOUT or not store.retry(worker, stored.id):
+                _store_record(store, worker, stored, record, output, summary)
+        if time.time() - last_heartbeat >= JOB_STORE_HEARTBEAT_INTERVAL:
+            store.heartbeat(worker, in_flight)
+            last_heartbeat = time.time()
+
+
+def _store_record(store: JobStore, worker: Text, stored: StoredJob, record: Dict, output: Optional[TextIO],
+                  summary: Dict[Text, int]) -> None:
+    record['attempt'] = stored.attempts
+    if not store.finish(worker, stored.id, record):
+        log.warning('The lease of %s on %s expired, dropping its record', worker, stored.job.name)
+        return
+    summary[record['status']] += 1
+    if output is not None:
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+
+def _collect_started(started: SimpleQueue, running: Dict[int, Tuple[int, float]]) -> None:
+    while not started.empty():
+        job_id, pid, start_time = started.get()
+        running[job_id] = pid, start_time
+
+
+def _lost_jobs(in_flight: Dict[int, StoredJob], running: Dict[int, Tuple[int, float]],
+               deadline: Optional[float]) -> List[Tuple[StoredJob, Dict]]:
+    """
+    The jobs in flight whose worker died, which the pool never reports, and the jobs past their *deadline*,
+    whose worker is killed so the pool replaces it. Each comes with the record to store if it is not retried.
+    """
+    now = time.time()
+    lost = []
+    for job_id, (pid, start_time) in running.items():
+        stored = in_flight.get(job_id)
+        if stored is None:
+            continue
+        if not _alive(pid):
+            log.error('Worker %d running %s died', pid, stored.job.name)
+            lost.append((stored, _lost_record(stored, STATUS_ERROR, 'Worker process {} died'.format(pid))))
+        elif deadline is not None and now - start_time > deadline:
+            log.error('%s overran its deadline, killing worker %d', stored.job.name, pid)
+            os.kill(pid, signal.SIGKILL)
+            lost.append((stored, _lost_record(stored, STATUS_TIMEOUT, 'Job exceeded its deadline')))
+    return lost
+
+
+def _lost_record(stored: StoredJob, status: Text, error: Text) -> Dict:
+    return {'name': stored.job.name, 'status': status, 'wall_time': None, 'results': None, 'error': error}
+
+
+def _job_done(finished: queue.Queue, stored: StoredJob, record: Dict) -> None:
+    finished.put((stored, record))
+
+
+def _job_failed(finished: queue.Queue, stored: StoredJob, error: BaseException) -> None:
+    finished.put((stored, _lost_record(stored, STATUS_ERROR, str(error) or type(error).__name__)))
@@ -1,5 +1,22 @@
-from dolabra.analysis.module.modules.payable import Payable
-from dolabra.analysis.module.modules.storage_caller_check import StorageCallerCheck
-from dolabra.analysis.module.modules.getter import Getter
-from dolabra.analysis.module.modules.setter import Setter
-from dolabra.analysis.module.modules.ether_handling import EtherHandling
\ No newline at end of file
+from importlib import import_module
+
+# Detection modules shipped with dolabra, in the order they run. The classes are imported on first use only,
+# further modules can be registered under the 'dolabra.modules' entry point group.
+BUILTIN_MODULES = {
+    'Payable': 'dolabra.analysis.module.modules.payable:Payable',
+    'StorageCallerCheck': 'dolabra.analysis.module.modules.storage_caller_check:StorageCallerCheck',
+    'Getter': 'dolabra.analysis.module.modules.getter:Getter',
+    'Setter': 'dolabra.analysis.module.modules.setter:Setter',
+}
+
+
+def load_class(reference: str):
+    """ Imports the class referenced as 'package.module:Class'. """
+    module_name, _, class_name = reference.partition(':')
+    return getattr(import_module(module_name), class_name)
+
+
+def __getattr__(name: str):
+    if name in BUILTIN_MODULES:
+        return load_class(BUILTIN_MODULES[name])
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
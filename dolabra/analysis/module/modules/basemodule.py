@@ -1,13 +1,18 @@
 import logging
 
 from abc import ABC, abstractmethod
-from typing import List, Optional, Set, Text, Type, Dict
+from typing import Callable, List, Optional, Set, Text, Type, Dict
 
 from mythril.laser.ethereum.state.global_state import GlobalState
 from mythril.laser.smt.bitvec import BitVec
 
 log = logging.getLogger(__name__)
 
+def previous_state(state: GlobalState) -> Optional[GlobalState]:
+    """ Returns the state preceding *state* on its path, i.e. the state that executed the instruction of a post hook. """
+    states = state.node.states
+    return states[-1] if len(states) > 0 and state is not states[-1] else None
+
 class BaseModule(ABC):
     """
     Base class for contract analysis modules.
@@ -21,10 +26,16 @@ class BaseModule(ABC):
 
     pre_hooks: List[Text] = []
     post_hooks: List[Text] = []
+    # Whether the dispatcher may replay the steps of the module for blocks it has seen (see block_memo.BlockMemo).
+    # Only for modules whose steps just read taints of the stack written by memoizable modules, and whose reports
+    # only depend on those taints and on state the module never removes from
+    memoizable = False
 
     def __init__(self):
         self.cache: Set[Text] = set()
         self.results: List[Dict[Text, Text]] = []
+        # Set by the analysis running the module, e.g. to label and stream its findings
+        self.on_result: Optional[Callable[[Dict[Text, Text]], None]] = None
 
     def reset(self) -> None:
         self.cache = set()
@@ -34,19 +45,37 @@ class BaseModule(ABC):
 
     def execute(self, state: GlobalState):
         """ Execute analysis strategy on the given state. """
-        if state.environment.active_function_name in self.cache:
+        prev_state = previous_state(state)
+        return self.execute_step(state, prev_state, state.instruction['opcode'],
+                                 prev_state.instruction['opcode'] if prev_state else None,
+                                 state.environment.active_function_name)
+
+    def execute_step(self, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text,
+                     prev_opcode: Optional[Text], function_name: Text):
+        """ Execute analysis strategy on the given state, with the per-step values already computed by the caller. """
+        if function_name in self.cache:
             return None
         log.debug('Executing analysis module %s', type(self).__name__)
-        result = self._analyze(state, state.node.states[-1] if len(state.node.states) > 0 and state is not state.node.states[-1] else None)
+        result = self._analyze(state, prev_state, opcode, prev_opcode)
         if result is not None:
             log.info('Analysis strategy %s got a hit in function %s', type(self).__name__, result['function_name'])
-            self.results.append(result)            
-            self.cache.add(state.environment.active_function_name)
+            if self.on_result is not None:
+                self.on_result(result)
+            self.results.append(result)
+            self.cache.add(function_name)
         return result
 
+    def is_settled(self, function_name: Text) -> bool:
+        """ Whether further states of *function_name* cannot change the results of this module. """
+        return function_name in self.cache
+
     @abstractmethod
-    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState] = None):
-        """ Actual implementation of the analysis module. Override this when inheriting BaseModule. """
+    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text, prev_opcode: Optional[Text]):
+        """
+        Actual implementation of the analysis module. Override this when inheriting BaseModule.
+
+        *opcode* is the opcode of the current instruction of *state*, *prev_opcode* the one of *prev_state* (None without a previous state).
+        """
         pass
 
     def _has_annotation(self, bitvec: BitVec, annotation_type: Type) -> bool:
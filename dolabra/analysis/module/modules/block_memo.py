@@ -0,0 +1,200 @@
+import logging
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Text, Tuple
+
+from mythril.laser.ethereum.state.global_state import GlobalState
+
+from dolabra.analysis.module.modules.basemodule import BaseModule
+from dolabra.analysis.module.modules.taints import taint_mask
+from dolabra.constants import BLOCK_MEMO_MAX_ENTRIES
+
+log = logging.getLogger(__name__)
+
+# Instructions pushing values whose taints do not come from the stack, but from memory or other code
+OPAQUE_OPCODES = frozenset({'MLOAD', 'SHA3', 'KECCAK256', 'CALL', 'CALLCODE', 'DELEGATECALL', 'STATICCALL',
+                            'CREATE', 'CREATE2'})
+
+# Taints a module added to the stack element at a position counted from the top, e.g. -1
+Effect = Tuple[int, Tuple]
+
+
+def stack_signature(stack: Sequence) -> Tuple[int, ...]:
+    """
+    Abstract taint state of *stack*: the taint mask of every element, bottom first. Elements sharing their
+    annotations with a deeper element, e.g. after a DUP, are given as the complement of its position instead.
+    """
+    first_positions: Dict[int, int] = {}
+    signature = []
+    for position, element in enumerate(stack):
+        annotations = element.annotations
+        first = first_positions.setdefault(id(annotations), position)
+        signature.append(taint_mask(annotations) if first == position else ~first)
+    return tuple(signature)
+
+
+def snapshot(stack: Sequence) -> List[Set]:
+    return [set(element.annotations) for element in stack]
+
+
+def added_taints(before: List[Set], stack: Sequence) -> Tuple[Effect, ...]:
+    """ The annotations added to *stack* since *before* was taken, per position from the top. """
+    depth = len(stack)
+    return tuple((position - depth, tuple(element.annotations - before[position]))
+                 for position, element in enumerate(stack) if len(element.annotations) != len(before[position]))
+
+
+class BlockRecord:
+    """ The effects of the memoizable modules on each dispatched step of a basic block, in execution order. """
+
+    __slots__ = ('code', 'steps', 'closed')
+
+    def __init__(self, code):
+        # Keeps the disassembly alive, records are keyed by its id
+        self.code = code
+        # (order, effects per module of the step) of every dispatched step, see *BlockMemo.order*
+        self.steps: List[Tuple[int, Tuple[Optional[Tuple[Effect, ...]], ...]]] = []
+        # Set once the recording path got past what a record can replay, later steps are run live
+        self.closed = False
+
+
+class BlockTrace:
+    """ Progress of one path through a basic block, recording its record or replaying it. """
+
+    __slots__ = ('record', 'replaying', 'index', 'opaque', 'epoch')
+
+    def __init__(self, record: Optional[BlockRecord], replaying: bool, opaque: int, epoch: int):
+        self.record = record
+        self.replaying = replaying
+        # Next step to replay
+        self.index = 0
+        # Opaque instructions in front of the start of the block, see *BlockMemo.opaque_counts*
+        self.opaque = opaque
+        self.epoch = epoch
+
+
+class BlockMemo:
+    """
+    Memoizes the steps of the memoizable modules (see *BaseModule.memoizable*) per basic block.
+
+    A block is the straight-line run of a path through one laser CFG node, starting at its first dispatched
+    step. Records are keyed by the code, that step, the active function, which memoizable modules already
+    reported the function, and the stack signature (see *stack_signature*) at that step. The first path
+    through a block records the taints each module added on each step; later paths entering the block with
+    an equal key get the taints applied instead of running the modules. Non-memoizable modules always run.
+
+    A path falls back to running the modules when it leaves the recorded steps, executes an opaque
+    instruction (see *OPAQUE_OPCODES*), or when a memoizable module reported a function meanwhile.
+    """
+
+    def __init__(self, modules: Sequence[BaseModule], max_entries: int = BLOCK_MEMO_MAX_ENTRIES):
+        self.modules = [module for module in modules if module.memoizable]
+        self.max_entries = max_entries
+        self.records: Dict[Tuple, BlockRecord] = {}
+        self.stats = Counter()
+        # Bumped by every report of a memoizable module, the reports change which steps the modules skip
+        self.epoch = 0
+        self._traces = weakref.WeakKeyDictionary()
+        self._opaque_counts: Dict[int, Tuple[object, List[int]]] = {}
+
+    @staticmethod
+    def order(state: GlobalState, pre_hook: bool) -> int:
+        """ Position of a step within its block: a post hook at a pc runs before the pre hook at the same pc. """
+        return 2 * state.mstate.pc + pre_hook
+
+    def opaque_counts(self, code) -> List[int]:
+        """ The number of opaque instructions in front of every instruction index of *code*. """
+        entry = self._opaque_counts.get(id(code))
+        if entry is None or entry[0] is not code:
+            counts = [0]
+            for instruction in code.instruction_list:
+                counts.append(counts[-1] + (instruction['opcode'] in OPAQUE_OPCODES))
+            # The disassembly is kept alive with its counts, so its id is not reused meanwhile
+            entry = self._opaque_counts[id(code)] = (code, counts)
+        return entry[1]
+
+    def trace(self, state: GlobalState, pre_hook: bool, function_name: Text) -> Optional[BlockTrace]:
+        """ The trace to replay or to record the step of *state* with, None when the modules just run. """
+        node = state.node
+        trace = self._traces.get(node)
+        if trace is None:
+            return self._enter(state, node, pre_hook, function_name)
+        record = trace.record
+        if record is None:
+            return None
+        counts = self.opaque_counts(record.code)
+        pc = state.mstate.pc
+        if (state.environment.code is not record.code or pc >= len(counts) or counts[pc] != trace.opaque
+                or trace.epoch != self.epoch):
+            self._stop(trace)
+            return None
+        order = self.order(state, pre_hook)
+        if trace.replaying:
+            if trace.index >= len(record.steps) or record.steps[trace.index][0] != order:
+                self._stop(trace)
+                return None
+        elif record.closed or (record.steps and record.steps[-1][0] >= order):
+            # Paths forked within the node share the trace, none of them can extend the record anymore
+            self._stop(trace)
+            return None
+        return trace
+
+    def _enter(self, state: GlobalState, node, pre_hook: bool, function_name: Text) -> Optional[BlockTrace]:
+        code = state.environment.code
+        counts = self.opaque_counts(code)
+        pc = state.mstate.pc
+        if pc >= len(counts):
+            self._traces[node] = BlockTrace(None, False, 0, self.epoch)
+            return None
+        start = self.order(state, pre_hook)
+        key = (id(code), start, function_name, tuple(function_name in module.cache for module in self.modules),
+               stack_signature(state.mstate.stack))
+        record = self.records.get(key)
+        if record is not None:
+            self.stats['hits'] += 1
+            trace = BlockTrace(record, True, counts[pc], self.epoch)
+            if not record.steps:
+                # The recording path reported on the first step
+                self._traces[node] = trace
+                self._stop(trace)
+                return None
+        else:
+            self.stats['misses'] += 1
+            if len(self.records) >= self.max_entries:
+                self.records.clear()
+            record = self.records[key] = BlockRecord(code)
+            trace = BlockTrace(record, False, counts[pc], self.epoch)
+        self._traces[node] = trace
+        return trace
+
+    def _stop(self, trace: BlockTrace) -> None:
+        if trace.replaying:
+            self.stats['diverged'] += 1
+        else:
+            trace.record.closed = True
+        trace.record = None
+
+    def replay(self, trace: BlockTrace) -> Tuple[Optional[Tuple[Effect, ...]], ...]:
+        """ The recorded effects of the next step of *trace*, one entry per module of the step. """
+        effects = trace.record.steps[trace.index][1]
+        trace.index += 1
+        self.stats['replayed_steps'] += 1
+        return effects
+
+    def record(self, trace: BlockTrace, order: int, effects: Tuple[Optional[Tuple[Effect, ...]], ...]) -> None:
+        if trace.record is not None:
+            trace.record.steps.append((order, effects))
+            self.stats['recorded_steps'] += 1
+
+    def reported(self, trace: Optional[BlockTrace]) -> None:
+        """ A memoizable module reported a function, the step of *trace* and the ones after it are not recorded. """
+        self.epoch += 1
+        if trace is not None and trace.record is not None and not trace.replaying:
+            self._stop(trace)
+
+    def report(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {'hits': self.stats['hits'], 'misses': self.stats['misses'],
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'diverged': self.stats['diverged'], 'entries': len(self.records),
+                'replayed_steps': self.stats['replayed_steps'], 'recorded_steps': self.stats['recorded_steps']}
@@ -0,0 +1,159 @@
+import logging
+from collections import Counter
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Text, Tuple
+
+from mythril.laser.ethereum.svm import LaserEVM
+from mythril.laser.ethereum.state.global_state import GlobalState
+
+from dolabra.analysis.module.modules.basemodule import BaseModule, previous_state
+from dolabra.analysis.module.modules.block_memo import BlockMemo, Effect, added_taints, snapshot
+from dolabra.analysis.profiler import ModuleProfiler
+
+log = logging.getLogger(__name__)
+
+
+class ModuleDispatcher:
+    """
+    Routes hooked instructions to the analysis modules through a single laser hook per opcode.
+
+    The opcode -> module table is built once. For every dispatched state the previous state, the opcodes and the
+    active function are computed once and shared by all modules interested in the instruction.
+    With *block_memo*, the steps of memoizable modules are replayed for blocks already seen with equal taints.
+    """
+
+    def __init__(self, modules: List[BaseModule], profiler: Optional[ModuleProfiler] = None, block_memo: bool = True):
+        self.modules = modules
+        self.profiler = profiler
+        self.pre_table = self._build_table(modules, 'pre_hooks')
+        self.post_table = self._build_table(modules, 'post_hooks')
+        self.dispatch_counts: Dict[Text, Counter] = {'pre': Counter(), 'post': Counter()}
+        self.block_memo = BlockMemo(modules) if block_memo and any(module.memoizable for module in modules) else None
+
+    @staticmethod
+    def _build_table(modules: List[BaseModule], hook_attribute: Text) -> Dict[Text, Tuple[BaseModule, ...]]:
+        table: Dict[Text, List[BaseModule]] = {}
+        for module in modules:
+            for opcode in getattr(module, hook_attribute):
+                table.setdefault(opcode, []).append(module)
+        return {opcode: tuple(interested) for opcode, interested in table.items()}
+
+    def register_hooks(self, laser: LaserEVM) -> None:
+        for opcode, modules in self.pre_table.items():
+            laser.register_hooks('pre', {opcode: [self._pre_hook(opcode, modules)]})
+        for opcode, modules in self.post_table.items():
+            laser.register_hooks('post', {opcode: [self._post_hook(opcode, modules)]})
+
+    def _memoized(self, modules: Tuple[BaseModule, ...]) -> bool:
+        return self.block_memo is not None and any(module.memoizable for module in modules)
+
+    def _pre_hook(self, opcode: Text, modules: Tuple[BaseModule, ...]) -> Callable[[GlobalState], None]:
+        counts = self.dispatch_counts['pre']
+
+        def memo_dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            self._memo_dispatch(state, opcode, modules, 'pre', opcode)
+
+        def dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            # The hooked instruction is the one about to be executed by *state*
+            self._dispatch(state, opcode, modules)
+
+        def profiled_dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            self._profiled_dispatch(state, opcode, modules, 'pre', opcode)
+
+        if self._memoized(modules):
+            return memo_dispatch
+        return dispatch if self.profiler is None else profiled_dispatch
+
+    def _post_hook(self, opcode: Text, modules: Tuple[BaseModule, ...]) -> Callable[[GlobalState], None]:
+        counts = self.dispatch_counts['post']
+
+        def memo_dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            self._memo_dispatch(state, state.instruction['opcode'], modules, 'post', opcode)
+
+        def dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            self._dispatch(state, state.instruction['opcode'], modules)
+
+        def profiled_dispatch(state: GlobalState) -> None:
+            counts[opcode] += 1
+            self._profiled_dispatch(state, state.instruction['opcode'], modules, 'post', opcode)
+
+        if self._memoized(modules):
+            return memo_dispatch
+        return dispatch if self.profiler is None else profiled_dispatch
+
+    @staticmethod
+    def _dispatch(state: GlobalState, opcode: Text, modules: Tuple[BaseModule, ...]) -> None:
+        prev_state = previous_state(state)
+        prev_opcode = prev_state.instruction['opcode'] if prev_state else None
+        function_name = state.environment.active_function_name
+        for module in modules:
+            module.execute_step(state, prev_state, opcode, prev_opcode, function_name)
+
+    def _profiled_dispatch(self, state: GlobalState, opcode: Text, modules: Tuple[BaseModule, ...],
+                           hook_type: Text, hooked_opcode: Text) -> None:
+        """ Same as *_dispatch*, measuring every module step under the hook type and opcode it was registered for. """
+        prev_state = previous_state(state)
+        prev_opcode = prev_state.instruction['opcode'] if prev_state else None
+        function_name = state.environment.active_function_name
+        for module in modules:
+            with self.profiler.measure(type(module).__name__, hook_type, hooked_opcode):
+                module.execute_step(state, prev_state, opcode, prev_opcode, function_name)
+
+    def _memo_dispatch(self, state: GlobalState, opcode: Text, modules: Tuple[BaseModule, ...],
+                       hook_type: Text, hooked_opcode: Text) -> None:
+        """ Same as *_dispatch*, replaying the steps of the memoizable modules for blocks the memo recorded. """
+        memo = self.block_memo
+        prev_state = previous_state(state)
+        prev_opcode = prev_state.instruction['opcode'] if prev_state else None
+        function_name = state.environment.active_function_name
+        pre_hook = hook_type == 'pre'
+        trace = memo.trace(state, pre_hook, function_name)
+        stack = state.mstate.stack
+        if trace is not None and trace.replaying:
+            for module, effects in zip(modules, memo.replay(trace)):
+                if effects is None:
+                    self._step(module, state, prev_state, opcode, prev_opcode, function_name, hook_type, hooked_opcode)
+                else:
+                    self._apply(module, stack, effects, hook_type, hooked_opcode)
+            return
+
+        step_effects: List[Optional[Tuple[Effect, ...]]] = []
+        for module in modules:
+            before = snapshot(stack) if trace is not None and module.memoizable else None
+            result = self._step(module, state, prev_state, opcode, prev_opcode, function_name, hook_type, hooked_opcode)
+            if module.memoizable and result is not None:
+                memo.reported(trace)
+            step_effects.append(added_taints(before, stack) if before is not None else None)
+        if trace is not None:
+            memo.record(trace, memo.order(state, pre_hook), tuple(step_effects))
+
+    def _measure(self, module: BaseModule, hook_type: Text, hooked_opcode: Text, replay: bool = False):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.measure(type(module).__name__, hook_type, hooked_opcode, replay=replay)
+
+    def _step(self, module: BaseModule, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text,
+              prev_opcode: Optional[Text], function_name: Text, hook_type: Text, hooked_opcode: Text):
+        with self._measure(module, hook_type, hooked_opcode):
+            return module.execute_step(state, prev_state, opcode, prev_opcode, function_name)
+
+    def _apply(self, module: BaseModule, stack, effects: Tuple[Effect, ...], hook_type: Text,
+               hooked_opcode: Text) -> None:
+        """ Annotates *stack* like the recorded step of *module* did. """
+        with self._measure(module, hook_type, hooked_opcode, replay=True):
+            for index, taints in effects:
+                for taint in taints:
+                    stack[index].annotate(taint)
+
+    def report_memo(self) -> Optional[Dict]:
+        """ Returns the hit/miss statistics of the block memo, None without a memo. """
+        return self.block_memo.report() if self.block_memo is not None else None
+
+    def report_counts(self) -> Dict[Text, Dict[Text, int]]:
+        """ Returns the number of dispatches per hook type and opcode, most frequent first. """
+        return {hook_type: dict(counts.most_common()) for hook_type, counts in self.dispatch_counts.items()}
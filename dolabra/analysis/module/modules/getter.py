@@ -1,10 +1,10 @@
 import logging
-from typing import Optional
+from typing import Optional, Text
 
 from mythril.laser.ethereum.state.global_state import GlobalState
 
 from dolabra.analysis.module.modules.basemodule import BaseModule
-from dolabra.analysis.module.modules.taints import PushOneTaint, DupOneTaint, StorageLoadTaint
+from dolabra.analysis.module.modules.taints import PUSH_ONE, DUP_ONE, STORAGE_LOAD
 
 log = logging.getLogger(__name__)
 
@@ -12,25 +12,30 @@ class Getter(BaseModule):
     pattern_name = "Getter"
 
     post_hooks = ['PUSH1', 'DUP1', 'SLOAD'] 
+    memoizable = True
 
     def __init__(self):
         self.already_storage_tainted_sign = []
         super().__init__()
 
-    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState] = None) -> Optional[dict]:
-        if prev_state and prev_state.instruction['opcode'] == 'PUSH1':
-            state.mstate.stack[-1].annotate(PushOneTaint())
+    def reset(self) -> None:
+        super().reset()
+        self.already_storage_tainted_sign = []
+
+    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text, prev_opcode: Optional[Text]) -> Optional[dict]:
+        if prev_opcode == 'PUSH1':
+            state.mstate.stack[-1].annotate(PUSH_ONE)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'DUP1' and PushOneTaint() in state.mstate.stack[-1].annotations:
-            state.mstate.stack[-1].annotate(DupOneTaint())
+        elif prev_opcode == 'DUP1' and PUSH_ONE in state.mstate.stack[-1].annotations:
+            state.mstate.stack[-1].annotate(DUP_ONE)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'SLOAD':            
+        elif prev_opcode == 'SLOAD':            
             if len(state.mstate.stack) >= 1:
                 current_function = state.environment.active_function_name
                 # loop through the stack to find the DUP1 element, there can be mulitple PUSH1s setting the indexes
                 for stack_index in range(len(state.mstate.stack)):                                        
-                    if DupOneTaint() in state.mstate.stack[stack_index].annotations and current_function not in self.already_storage_tainted_sign:                        
-                        state.mstate.stack[stack_index].annotate(StorageLoadTaint())
+                    if DUP_ONE in state.mstate.stack[stack_index].annotations and current_function not in self.already_storage_tainted_sign:                        
+                        state.mstate.stack[stack_index].annotate(STORAGE_LOAD)
                         self.already_storage_tainted_sign.append(current_function)
                         return {'contract': state.environment.active_account.contract_name, 'pattern': self.pattern_name, 'function_name': current_function}             
 
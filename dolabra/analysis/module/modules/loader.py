@@ -1,52 +1,94 @@
-from typing import Optional, List
+import logging
+from typing import Dict, Optional, List
 
-from mythril.analysis.module.base import DetectionModule, EntryPoint
+from mythril.analysis.module.base import DetectionModule
 from mythril.support.support_utils import Singleton
 from mythril.exceptions import DetectorNotFoundError
 
 from dolabra.analysis.module.modules.basemodule import BaseModule
-from dolabra.analysis.module.modules import Payable, StorageCallerCheck, Getter, Setter, EtherHandling
+from dolabra.analysis.module.modules import BUILTIN_MODULES, load_class
+
+log = logging.getLogger(__name__)
+
+MODULE_ENTRY_POINT_GROUP = 'dolabra.modules'
 
 class ModuleLoader(object, metaclass=Singleton):
+    """
+    Registry of the detection modules. Modules are imported and instantiated the first time they are
+    requested; the instances are shared by all analyses of the process. Entry points of third-party
+    modules are only looked up for names that are not built in, or when every module is requested.
+    """
+
     def __init__(self):
-        self._modules = []
-        self._register_modules()
+        self._modules: Dict[str, BaseModule] = {}
+        self._registry: Dict[str, Optional[str]] = dict(BUILTIN_MODULES)
+        self._entry_points = None
 
     def register_module(self, detection_module: BaseModule):
         """Registers a detection module with the module loader"""
         if not isinstance(detection_module, DetectionModule):
             raise ValueError(
                 "The passed variable is not a valid detection module")
-        self._modules.append(detection_module)
+        name = type(detection_module).__name__
+        self._registry.setdefault(name, None)
+        self._modules[name] = detection_module
+
+    def available_modules(self) -> List[str]:
+        """ Returns the names of all known modules, built in, registered or installed, without loading them. """
+        self._discover_entry_points()
+        return list(self._registry)
+
+    def loaded_modules(self) -> List[BaseModule]:
+        """ Returns the modules instantiated so far. """
+        return [self._modules[name] for name in self._registry if name in self._modules]
 
     def get_detection_modules(self,
                               white_list: Optional[List[str]] = None
         ) -> List[BaseModule]:
 
-        result = self._modules[:]
-
-        if white_list:
-            available_names = [type(module).__name__ for module in result]
-
-            for name in white_list:
-                if name not in available_names:
-                    raise DetectorNotFoundError(
-                        "Invalid detection module: {}".format(name)
-                    )
-
-            result = [
-                module for module in result if type(module).__name__ in white_list
-            ]
-
-        return result
-
-    def _register_modules(self):
-        self._modules.extend(
-            [
-                Payable(),
-                StorageCallerCheck(),
-                Getter(),
-                Setter(),
-                EtherHandling()
-            ]
-        )
+        if not white_list:
+            return [self._module(name) for name in self.available_modules()]
+
+        if any(name not in self._registry for name in white_list):
+            self._discover_entry_points()
+        for name in white_list:
+            if name not in self._registry:
+                raise DetectorNotFoundError(
+                    "Invalid detection module: {}".format(name)
+                )
+
+        return [self._module(name) for name in self._registry if name in white_list]
+
+    def _module(self, name: str) -> BaseModule:
+        module = self._modules.get(name)
+        if module is None:
+            module = self._modules[name] = self._load(name)
+        return module
+
+    def _load(self, name: str) -> BaseModule:
+        reference = self._registry[name]
+        entry_point = self._entry_points.get(name) if self._entry_points else None
+        module_class = entry_point.load() if entry_point is not None and reference is None else load_class(reference)
+        module = module_class()
+        if not isinstance(module, BaseModule):
+            raise ValueError('{} is not a dolabra analysis module'.format(name))
+        return module
+
+    def _discover_entry_points(self) -> None:
+        if self._entry_points is not None:
+            return
+        try:
+            from importlib import metadata
+        except ImportError:  # Python 3.7
+            import importlib_metadata as metadata
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, 'select'):
+            group = entry_points.select(group=MODULE_ENTRY_POINT_GROUP)
+        else:
+            group = entry_points.get(MODULE_ENTRY_POINT_GROUP, [])
+        self._entry_points = {entry_point.name: entry_point for entry_point in group}
+        for name in self._entry_points:
+            if name in self._registry:
+                log.warning('Ignoring entry point of module %s, a module with this name is already registered', name)
+            else:
+                self._registry[name] = None
@@ -1,10 +1,10 @@
 import logging
-from typing import Optional
+from typing import Optional, Text
 
 from mythril.laser.ethereum.state.global_state import GlobalState
 
 from dolabra.analysis.module.modules.basemodule import BaseModule
-from dolabra.analysis.module.modules.taints import CallValueTaint
+from dolabra.analysis.module.modules.taints import CALL_VALUE
 
 log = logging.getLogger(__name__)
 
@@ -13,20 +13,30 @@ class Payable(BaseModule):
 
     pre_hooks = ['JUMPI', 'RETURN', 'STOP', 'REVERT', 'INVALID']
     post_hooks = ['CALLVALUE']
+    memoizable = True
 
     def __init__(self):
         self.payable_functions = set()
         self.non_payable_functions = set()
         super().__init__()
 
-    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState] = None) -> Optional[dict]:
-        if prev_state and prev_state.instruction['opcode'] == 'CALLVALUE':
-            state.mstate.stack[-1].annotate(CallValueTaint())
+    def reset(self) -> None:
+        super().reset()
+        self.payable_functions = set()
+        self.non_payable_functions = set()
+
+    def is_settled(self, function_name: Text) -> bool:
+        # Functions guarded by a CALLVALUE check are never reported as payable anymore
+        return super().is_settled(function_name) or function_name in self.non_payable_functions
+
+    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text, prev_opcode: Optional[Text]) -> Optional[dict]:
+        if prev_opcode == 'CALLVALUE':
+            state.mstate.stack[-1].annotate(CALL_VALUE)
 
-        if state.instruction['opcode'] == 'JUMPI' and CallValueTaint() in state.mstate.stack[-2].annotations:
+        if opcode == 'JUMPI' and CALL_VALUE in state.mstate.stack[-2].annotations:
             self.non_payable_functions.add(state.environment.active_function_name)
 
-        elif state.instruction['opcode'] in ['RETURN', 'STOP', 'REVERT', 'INVALID']:
+        elif opcode in ['RETURN', 'STOP', 'REVERT', 'INVALID']:
             if state.environment.active_function_name not in self.non_payable_functions:
                 self.payable_functions.add(state.environment.active_function_name)
                 return {'contract': state.environment.active_account.contract_name,
@@ -1,10 +1,15 @@
 import logging
-from typing import Optional
+from typing import Optional, Text
 
 from mythril.laser.ethereum.state.global_state import GlobalState
 
 from dolabra.analysis.module.modules.basemodule import BaseModule
-from dolabra.analysis.module.modules.taints import DupOneTaint, PushOneTaint, DupTwoTaint, SwapOneTaint, StorageSaveTaint
+from dolabra.analysis.module.modules.taints import (
+    DUP_ONE, PUSH_ONE, DUP_TWO, SWAP_ONE, STORAGE_SAVE,
+    SETTER_PUSHED_TAINTS as PUSHED_TAINTS,
+    SETTER_DUPLICATED_TAINTS as DUPLICATED_TAINTS,
+    SETTER_SWAPPED_TAINTS as SWAPPED_TAINTS
+)
 
 log = logging.getLogger(__name__)
 
@@ -12,32 +17,38 @@ class Setter(BaseModule):
     pattern_name = "Setter"
 
     post_hooks = ['DUP1', 'PUSH1', 'DUP2', 'SWAP1', 'SSTORE'] 
+    memoizable = True
 
     def __init__(self):
         self.already_storage_tainted_sign = []
         super().__init__()
 
-    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState] = None) -> Optional[dict]:
-        if prev_state and prev_state.instruction['opcode'] == 'DUP1':
-            state.mstate.stack[-1].annotate(DupOneTaint())
+    def reset(self) -> None:
+        super().reset()
+        self.already_storage_tainted_sign = []
+
+    def _analyze(self, state: GlobalState, prev_state: Optional[GlobalState], opcode: Text, prev_opcode: Optional[Text]) -> Optional[dict]:
+        if prev_opcode == 'DUP1':
+            state.mstate.stack[-1].annotate(DUP_ONE)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'PUSH1':
-            if len(state.mstate.stack) > 1 and DupOneTaint() in state.mstate.stack[-2].annotations:
-                state.mstate.stack[-2].annotate(PushOneTaint())
+        elif prev_opcode == 'PUSH1':
+            if len(state.mstate.stack) > 1 and DUP_ONE in state.mstate.stack[-2].annotations:
+                state.mstate.stack[-2].annotate(PUSH_ONE)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'DUP2' and {DupOneTaint(), PushOneTaint()}.issubset(state.mstate.stack[-1].annotations):
-            state.mstate.stack[-1].annotate(DupTwoTaint())
+        elif prev_opcode == 'DUP2' and PUSHED_TAINTS <= state.mstate.stack[-1].annotations:
+            state.mstate.stack[-1].annotate(DUP_TWO)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'SWAP1' and {DupOneTaint(), PushOneTaint(), DupTwoTaint()}.issubset(state.mstate.stack[-1].annotations):
-            state.mstate.stack[-1].annotate(SwapOneTaint())    
+        elif prev_opcode == 'SWAP1' and DUPLICATED_TAINTS <= state.mstate.stack[-2].annotations:
+            # SWAP1 moves the duplicated value below the slot, where SSTORE takes its value from
+            state.mstate.stack[-2].annotate(SWAP_ONE)
 
-        elif prev_state and prev_state.instruction['opcode'] == 'SSTORE':            
+        elif prev_opcode == 'SSTORE':            
             if len(state.mstate.stack) >= 1:
                 current_function = state.environment.active_function_name
                 # loop through the stack to find the DUP1 element, there can be mulitple PUSH1s setting the indexes
                 for stack_index in range(len(state.mstate.stack)):                                        
-                    if {DupOneTaint(), PushOneTaint(), DupTwoTaint(), SwapOneTaint()}.issubset(state.mstate.stack[stack_index].annotations) and current_function not in self.already_storage_tainted_sign:                        
-                        state.mstate.stack[stack_index].annotate(StorageSaveTaint())
+                    if SWAPPED_TAINTS <= state.mstate.stack[stack_index].annotations and current_function not in self.already_storage_tainted_sign:                        
+                        state.mstate.stack[stack_index].annotate(STORAGE_SAVE)
                         self.already_storage_tainted_sign.append(current_function)
                         return {'contract': state.environment.active_account.contract_name, 'pattern': self.pattern_name, 'function_name': current_function}             
 
@@ -1,136 +1,170 @@
-from typing import Optional
+from typing import Iterable, Optional
+from weakref import WeakValueDictionary
 
-class PushOneTaint:
-    """ Class to be used as annotation for PUSH1 elements. """
+class FlagTaint:
+    """
+    Base class for taint annotations without payload.
 
-    def __hash__(self):
-        return hash(type(self))
+    Every subclass has exactly one instance, so checking for a taint never allocates and equality and hashing
+    are plain identity. The *bit* of a taint identifies it in taint masks (see *taint_mask*).
+    """
 
-    def __eq__(self, other: 'PushOneTaint'):
-        return isinstance(other, PushOneTaint)        
-    
-class PushTwoTaint:
-    """ Class to be used as annotation for PUSH2 elements. """
+    __slots__ = ()
+    bit = 0
 
-    def __hash__(self):
-        return hash(type(self))
+    def __new__(cls):
+        instance = cls.__dict__.get('_instance')
+        if instance is None:
+            instance = super().__new__(cls)
+            cls._instance = instance
+        return instance
 
-    def __eq__(self, other: 'PushTwoTaint'):
-        return isinstance(other, PushTwoTaint) 
-    
-class PushFourTaint:
-    """ Class to be used as annotation for PUSH4 elements. """
+    def __copy__(self):
+        return self
 
-    def __init__(self, function_signature: Optional[int] = None):
-        self.function_signature = function_signature
+    def __deepcopy__(self, memo):
+        return self
 
-    def __hash__(self):
-        return hash(type(self))
-    
-    def __eq__(self, other: 'PushFourTaint'):
-        return isinstance(other, PushFourTaint) and self.function_signature == other.function_signature
-    
-class DupOneTaint:
-    """ Class to be used as annotation for DUP1 elements. """
+    def __reduce__(self):
+        return type(self), ()
 
-    def __hash__(self):
-        return hash(type(self))
+class PayloadTaint:
+    """
+    Base class for taint annotations carrying a payload, such as a storage slot or a function selector.
 
-    def __eq__(self, other: 'DupOneTaint'):
-        return isinstance(other, DupOneTaint)
-    
-class DupTwoTaint:
-    """ Class to be used as annotation for DUP1 elements. """
+    Instances are interned per payload for as long as they are referenced, so equal taints are identical objects
+    and the taints of payloads no state carries any more are freed.
+    """
 
-    def __hash__(self):
-        return hash(type(self))
+    __slots__ = ('_payload', '__weakref__')
+    bit = 0
 
-    def __eq__(self, other: 'DupTwoTaint'):
-        return isinstance(other, DupTwoTaint)
-    
-class CallValueTaint:
-    """ Class to be used as annotation for CALLVALUE elements. """
+    def __new__(cls, payload: Optional[int] = None):
+        interned = cls.__dict__.get('_interned')
+        if interned is None:
+            interned = cls._interned = WeakValueDictionary()
+        instance = interned.get(payload)
+        if instance is None:
+            instance = super().__new__(cls)
+            instance._payload = payload
+            interned[payload] = instance
+        return instance
 
-    def __hash__(self):
-        return hash(type(self))
+    def __copy__(self):
+        return self
 
-    def __eq__(self, other: 'CallValueTaint'):
-        return isinstance(other, CallValueTaint)  
+    def __deepcopy__(self, memo):
+        return self
 
-class IsZeroTaint:
-    """ Class to be used as annotation for ISZERO elements. """
+    def __reduce__(self):
+        return type(self), (self._payload,)
 
-    def __hash__(self):
-        return hash(type(self))
+class PushOneTaint(FlagTaint):
+    """ Class to be used as annotation for PUSH1 elements. """
+    __slots__ = ()
+    bit = 1 << 0
 
-    def __eq__(self, other: 'IsZeroTaint'):
-        return isinstance(other, IsZeroTaint)       
+class PushTwoTaint(FlagTaint):
+    """ Class to be used as annotation for PUSH2 elements. """
+    __slots__ = ()
+    bit = 1 << 1
 
-class SwapOneTaint:
-    """ Class to be used as annotation for SWAP1 elements. """
+class PushFourTaint(PayloadTaint):
+    """ Class to be used as annotation for PUSH4 elements. """
+    __slots__ = ()
+    bit = 1 << 2
 
-    def __hash__(self):
-        return hash(type(self))
+    @property
+    def function_signature(self) -> Optional[int]:
+        return self._payload
 
-    def __eq__(self, other: 'SwapOneTaint'):
-        return isinstance(other, SwapOneTaint)   
-    
-class StorageLoadTaint:
-    """ Class to be used as annotation for SLOAD elements. """
+class DupOneTaint(FlagTaint):
+    """ Class to be used as annotation for DUP1 elements. """
+    __slots__ = ()
+    bit = 1 << 3
 
-    def __init__(self, storage_address: Optional[int] = None):
-        self.storage_address = storage_address
+class DupTwoTaint(FlagTaint):
+    """ Class to be used as annotation for DUP2 elements. """
+    __slots__ = ()
+    bit = 1 << 4
 
-    def __hash__(self):
-        return hash((type(self), self.storage_address))
+class CallValueTaint(FlagTaint):
+    """ Class to be used as annotation for CALLVALUE elements. """
+    __slots__ = ()
+    bit = 1 << 5
 
-    def __eq__(self, other: 'StorageLoadTaint'):
-        return isinstance(other, StorageLoadTaint) and self.storage_address == other.storage_address
-    
-class StorageSaveTaint:
-    """ Class to be used as annotation for SSTORE elements. """
+class IsZeroTaint(FlagTaint):
+    """ Class to be used as annotation for ISZERO elements. """
+    __slots__ = ()
+    bit = 1 << 6
 
-    def __init__(self, storage_address: Optional[int] = None):
-        self.storage_address = storage_address
+class SwapOneTaint(FlagTaint):
+    """ Class to be used as annotation for SWAP1 elements. """
+    __slots__ = ()
+    bit = 1 << 7
 
-    def __hash__(self):
-        return hash((type(self), self.storage_address))
+class StorageLoadTaint(PayloadTaint):
+    """ Class to be used as annotation for SLOAD elements. """
+    __slots__ = ()
+    bit = 1 << 8
 
-    def __eq__(self, other: 'StorageSaveTaint'):
-        return isinstance(other, StorageSaveTaint) and self.storage_address == other.storage_address
-    
-class EqualTaint:
-    """ Class to be used as annotation for EQ elements. """
+    @property
+    def storage_address(self) -> Optional[int]:
+        return self._payload
 
-    def __hash__(self):
-        return hash(type(self))
+class StorageSaveTaint(PayloadTaint):
+    """ Class to be used as annotation for SSTORE elements. """
+    __slots__ = ()
+    bit = 1 << 9
 
-    def __eq__(self, other: 'EqualTaint'):
-        return isinstance(other, EqualTaint)  
-    
-class CalldataTaint:
-    """ Class to be used as annotation for CALLDATALOAD elements. """
+    @property
+    def storage_address(self) -> Optional[int]:
+        return self._payload
 
-    def __hash__(self):
-        return hash(type(self))
+class EqualTaint(FlagTaint):
+    """ Class to be used as annotation for EQ elements. """
+    __slots__ = ()
+    bit = 1 << 10
 
-    def __eq__(self, other: 'CalldataTaint'):
-        return isinstance(other, CalldataTaint)
-    
-class CallerTaint:
-    """ Class to be used as annotation for CALLER elements. """
+class CalldataTaint(FlagTaint):
+    """ Class to be used as annotation for CALLDATALOAD elements. """
+    __slots__ = ()
+    bit = 1 << 11
 
-    def __hash__(self):
-        return hash(type(self))
+class CallerTaint(FlagTaint):
+    """ Class to be used as annotation for CALLER elements. """
+    __slots__ = ()
+    bit = 1 << 12
 
-    def __eq__(self, other: 'CallerTaint'):
-        return isinstance(other, CallerTaint)
-    
-class JumpiTaint:
+class JumpiTaint(FlagTaint):
     """ Class to be used as annotation for JUMPI elements. """
-
-    def __hash__(self):
-        return hash(type(self))
-
-    def __eq__(self, other: 'JumpiTaint'):
-        return isinstance(other, JumpiTaint)
\ No newline at end of file
+    __slots__ = ()
+    bit = 1 << 13
+
+# Interned instances, use these instead of instantiating the flag taints during analysis
+PUSH_ONE = PushOneTaint()
+PUSH_TWO = PushTwoTaint()
+DUP_ONE = DupOneTaint()
+DUP_TWO = DupTwoTaint()
+CALL_VALUE = CallValueTaint()
+IS_ZERO = IsZeroTaint()
+SWAP_ONE = SwapOneTaint()
+EQUAL = EqualTaint()
+CALLDATA = CalldataTaint()
+CALLER = CallerTaint()
+JUMPI = JumpiTaint()
+STORAGE_LOAD = StorageLoadTaint()
+STORAGE_SAVE = StorageSaveTaint()
+
+# Taints collected by a storage write value along DUP1 -> PUSH1 -> DUP2 -> SWAP1, see the Setter module
+SETTER_PUSHED_TAINTS = frozenset({DUP_ONE, PUSH_ONE})
+SETTER_DUPLICATED_TAINTS = SETTER_PUSHED_TAINTS | {DUP_TWO}
+SETTER_SWAPPED_TAINTS = SETTER_DUPLICATED_TAINTS | {SWAP_ONE}
+
+def taint_mask(annotations: Iterable) -> int:
+    """ Returns the union of the bits of all taints in *annotations*, other annotations are ignored. """
+    mask = 0
+    for annotation in annotations:
+        if isinstance(annotation, (FlagTaint, PayloadTaint)):
+            mask |= annotation.bit
+    return mask
@@ -0,0 +1,127 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set, Text
+
+from mythril.laser.ethereum.svm import LaserEVM
+from mythril.laser.ethereum.state.global_state import GlobalState
+from mythril.laser.ethereum.transaction.transaction_models import MessageCallTransaction
+from mythril.laser.plugin.interface import LaserPlugin
+from mythril.laser.plugin.signals import PluginSkipState
+from mythril.laser.smt import Concat, Not, Or, symbol_factory
+
+from dolabra.analysis.module.modules.basemodule import BaseModule
+
+log = logging.getLogger(__name__)
+
+FUNCTION_SELECTOR_BYTES = 4
+# Names laser gives the states outside of the dispatched functions
+UNDISPATCHED_FUNCTIONS = ('constructor', 'fallback')
+
+
+class SelectorConstraintPlugin(LaserPlugin):
+    """
+    Restricts every message call to the contract under analysis to the given function selectors, or with *exclude*
+    to calldata matching none of them (the fallback function).
+
+    The constraint is added once per transaction, to the state about to execute its first instruction, so branches
+    of the dispatcher leading to other functions become infeasible and are pruned by laser.
+    """
+
+    def __init__(self, selectors: List[int], exclude: bool = False):
+        self.selectors = selectors
+        self.exclude = exclude
+
+    def initialize(self, symbolic_vm: LaserEVM) -> None:
+        @symbolic_vm.laser_hook('execute_state')
+        def constrain_selector(global_state: GlobalState):
+            if global_state.mstate.pc != 0 or len(global_state.transaction_stack) != 1:
+                return
+            transaction = global_state.current_transaction
+            if not isinstance(transaction, MessageCallTransaction):
+                return
+            calldata = transaction.call_data
+            selector = Concat([calldata[index] for index in range(FUNCTION_SELECTOR_BYTES)])
+            matches = [selector == symbol_factory.BitVecVal(value, 8 * FUNCTION_SELECTOR_BYTES)
+                       for value in self.selectors]
+            constraint = Or(*matches) if matches else symbol_factory.Bool(False)
+            if self.exclude:
+                constraint = Not(constraint)
+            global_state.world_state.constraints.append(constraint)
+
+
+class SaturationPlugin(LaserPlugin):
+    """
+    Stops exploring functions every module has already made up its mind about.
+
+    A function is saturated once each module is settled on it (see *BaseModule.is_settled*). In the last
+    transaction, states of saturated functions are dropped; earlier transactions keep them, as their end states
+    seed the following transactions. Once every dispatched function is saturated nothing is left to learn and
+    the execution is ended.
+    """
+
+    def __init__(self, modules: List[BaseModule], functions: Iterable[Text], timeout: Optional[float] = None):
+        self.modules = modules
+        self.functions = set(functions) - set(UNDISPATCHED_FUNCTIONS)
+        self.timeout = timeout
+        self.saturated: Set[Text] = set()
+        self.dropped_states = 0
+        self.stopped_early = False
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self._transaction = 0
+
+    def _is_saturated(self, function_name: Text) -> bool:
+        # The constructor and the fallback also name the states of the dispatcher on the way to every function
+        if function_name not in self.functions:
+            return False
+        if function_name in self.saturated:
+            return True
+        if all(module.is_settled(function_name) for module in self.modules):
+            self.saturated.add(function_name)
+            return True
+        return False
+
+    def resume(self, transaction: int) -> None:
+        """ Continues the execution of a checkpoint, *transaction* message call transactions having been started. """
+        self._transaction = transaction
+
+    def initialize(self, symbolic_vm: LaserEVM) -> None:
+        @symbolic_vm.laser_hook('start_sym_exec')
+        def start_sym_exec():
+            self.start_time = time.time()
+
+        @symbolic_vm.laser_hook('stop_sym_exec')
+        def stop_sym_exec():
+            self.end_time = time.time()
+            log.info('Saturation: %s', self.report())
+
+        @symbolic_vm.laser_hook('start_sym_trans')
+        def start_sym_trans():
+            self._transaction += 1
+
+        @symbolic_vm.laser_hook('execute_state')
+        def drop_saturated(global_state: GlobalState):
+            if self.stopped_early:
+                raise PluginSkipState
+            if not self._is_saturated(global_state.environment.active_function_name):
+                return
+            if self.functions and self.functions <= self.saturated:
+                log.info('All %d functions are saturated, ending symbolic execution.', len(self.functions))
+                self.stopped_early = True
+                del symbolic_vm.work_list[:]
+                del symbolic_vm.open_states[:]
+                raise PluginSkipState
+            if self._transaction >= symbolic_vm.transaction_count:
+                self.dropped_states += 1
+                raise PluginSkipState
+
+    def report(self) -> Dict:
+        """ Pruning statistics of the run, the saved time is the part of the timeout budget left unused. """
+        elapsed = (self.end_time or time.time()) - (self.start_time or time.time())
+        saved = max(self.timeout - elapsed, 0) if self.stopped_early and self.timeout else 0
+        return {'saturated_functions': len(self.saturated),
+                'functions': len(self.functions),
+                'dropped_states': self.dropped_states,
+                'stopped_early': self.stopped_early,
+                'elapsed': round(elapsed, 3),
+                'saved': round(saved, 3)}
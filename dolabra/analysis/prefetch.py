@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from mythril.disassembler.disassembly import Disassembly
+
+from dolabra.analysis.static import StaticScanner
+from dolabra.constants import RPC_BATCH_SIZE, RPC_PREFETCH_AHEAD, RPC_PREFETCH_CONCURRENCY, RPC_PREFETCH_SLOTS
+from dolabra.contract_loaders.jsonrpc_client import AsyncHttpTransport, PooledJsonRpc
+from dolabra.contract_loaders.jsonrpc_loader import rpc_client
+from dolabra.contract_loaders.loader import LoaderType
+
+log = logging.getLogger(__name__)
+
+
+def likely_slots(code: str) -> Set[int]:
+    """ The constant storage slots the hex encoded *code* reads, besides the lowest ones loaded anyway. """
+    code = code[2:] if code.startswith('0x') else code
+    if not code:
+        return set()
+    slots = StaticScanner(Disassembly(code)).storage_slots()
+    return {slot for slot in slots if slot >= RPC_PREFETCH_SLOTS}
+
+
+class PrefetchPipeline:
+    """
+    asyncio stage loading the code, balance and likely storage slots (see *likely_slots*) of the JSON-RPC
+    contracts of a batch while earlier contracts are analyzed, so the workers start on fully loaded contracts
+    instead of waiting for the node.
+
+    The stage runs its event loop in a thread of its own. Jobs are handed over in their input order, jobs of
+    other loaders included. At most *concurrency* contracts are loaded or wait for an earlier one at once, and
+    handing over pauses while *ahead* loaded contracts are waiting on top of the *workers* being analyzed; each
+    finished analysis is reported with *finished*. Loaded values travel with the job (see *JsonRpcLoader*), the
+    RPC cache of the job is filled as well. Contracts that fail to load are handed over as they are, so their
+    error is reported by the analysis.
+    """
+
+    def __init__(self, workers: int, ahead: int = RPC_PREFETCH_AHEAD, concurrency: int = RPC_PREFETCH_CONCURRENCY):
+        self.ahead = ahead
+        self.concurrency = concurrency
+        self.stats = Counter()
+        self._window = threading.Semaphore(workers + ahead)
+        self._clients: Dict[Tuple, asyncio.Future] = {}
+        self._transports: List[AsyncHttpTransport] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+
+    def jobs(self, jobs: Iterable) -> Iterator:
+        """ Yields *jobs* as they are loaded, waiting for *finished* once the window of loaded jobs is full. """
+        thread = threading.Thread(target=self._run, args=(list(jobs),), name='prefetch', daemon=True)
+        thread.start()
+        self._started.wait()
+        try:
+            while True:
+                self._window.acquire()
+                job = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+                if job is None:
+                    break
+                yield job
+        finally:
+            self._loop.call_soon_threadsafe(self._drained.set)
+        thread.join()
+        log.info('Prefetched %d values of %d contracts in %d requests, %d contracts failed to load',
+                 self.stats['values'], self.stats['contracts'], self.stats['requests'], self.stats['failed'])
+
+    def finished(self) -> None:
+        """ An analysis is done, another loaded job may be handed over. """
+        self._window.release()
+
+    def _run(self, jobs: List) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(self.ahead)
+        self._drained = asyncio.Event()
+        self._started.set()
+        try:
+            self._loop.run_until_complete(self._produce(jobs))
+        finally:
+            for transport in self._transports:
+                self.stats['requests'] += transport.requests
+                transport.close()
+            self._loop.close()
+
+    async def _produce(self, jobs: List) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loading: asyncio.Queue = asyncio.Queue()
+        handing_over = asyncio.ensure_future(self._hand_over(loading, semaphore))
+        try:
+            for job in jobs:
+                await semaphore.acquire()
+                await loading.put(asyncio.ensure_future(self._prepare(job)))
+        finally:
+            await loading.put(None)
+            await handing_over
+            await self._queue.put(None)
+            # The loop serves the handing over until the last job is taken
+            await self._drained.wait()
+
+    async def _hand_over(self, loading: asyncio.Queue, semaphore: asyncio.Semaphore) -> None:
+        """ Hands the jobs over in the order their loads were started. """
+        while True:
+            load = await loading.get()
+            if load is None:
+                return
+            try:
+                # Waits for room among the loaded jobs before another contract is loaded
+                await self._queue.put(await load)
+            finally:
+                semaphore.release()
+
+    async def _prepare(self, job):
+        if job.loader_type == LoaderType.JSON_RPC:
+            return await self._load(job)
+        return job
+
+    async def _client(self, options: Dict) -> Tuple[PooledJsonRpc, AsyncHttpTransport]:
+        key = (options.get('rpc'), options.get('rpc_cache'), options.get('block'))
+        if key not in self._clients:
+            # Loads sharing a node wait for the first one to set up its client
+            self._clients[key] = asyncio.ensure_future(self._connect(key))
+        return await self._clients[key]
+
+    async def _connect(self, key: Tuple) -> Tuple[PooledJsonRpc, AsyncHttpTransport]:
+        client = rpc_client(*key)
+        # Pins the chain and the block once, the workers read at the same block
+        await asyncio.get_event_loop().run_in_executor(None, lambda: (client.chain_id, client.block_number))
+        transport = AsyncHttpTransport(client.url, self.concurrency)
+        self._transports.append(transport)
+        return client, transport
+
+    async def _fetch(self, client: PooledJsonRpc, transport: AsyncHttpTransport, address: str, slots: Iterable[int],
+                     code: bool = True, balance: bool = True) -> None:
+        missing = client.prefetch_calls(address, slots, code, balance)
+        for start in range(0, len(missing), RPC_BATCH_SIZE):
+            calls = missing[start:start + RPC_BATCH_SIZE]
+            requests_by_id = client.batch_requests([(method, params) for _, method, params in calls])
+            values = client.batch_results(requests_by_id, await transport.post(list(requests_by_id.values())))
+            if values is None:
+                responses = [await transport.post(request) for request in requests_by_id.values()]
+                values = client.batch_results(requests_by_id, responses)
+            client.store(calls, values)
+            self.stats['values'] += len(calls)
+
+    async def _load(self, job):
+        try:
+            client, transport = await self._client(job.options)
+            address = job.options['address']
+            # Values read ahead, e.g. by *resolve_proxy_jobs*, are not read again
+            client.preload(job.options.get('prefetched') or ())
+            await self._fetch(client, transport, address, range(RPC_PREFETCH_SLOTS))
+            code = client.cached(client.prefetch_keys(address, balance=False)[0]) or ''
+            slots = await asyncio.get_event_loop().run_in_executor(None, likely_slots, code)
+            await self._fetch(client, transport, address, slots, code=False, balance=False)
+        except Exception as e:
+            log.debug('Could not prefetch %s: %s', job.name, e)
+            self.stats['failed'] += 1
+            return job
+
+        self.stats['contracts'] += 1
+        keys = client.prefetch_keys(address, slots.union(range(RPC_PREFETCH_SLOTS)))
+        return job._replace(options=dict(job.options, block=client.block_number,
+                                         prefetched=[(key, client.cached(key)) for key in keys]))
@@ -0,0 +1,158 @@
+import json
+import logging
+import math
+import time
+import tracemalloc
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Text, Tuple
+
+from mythril.laser.plugin.loader import LaserPluginLoader
+from mythril.laser.smt.solver.solver_statistics import SolverStatistics
+
+log = logging.getLogger(__name__)
+
+INSTRUCTION_PROFILER = 'instruction-profiler'
+# tracemalloc.reset_peak is new in Python 3.9
+HAS_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+
+class HookProfile:
+    """ Call count, durations and allocations of one module on one hooked opcode. """
+
+    __slots__ = ('durations', 'allocated', 'peak')
+
+    def __init__(self):
+        self.durations = array('d')
+        self.allocated = 0
+        self.peak = 0
+
+    def record(self, duration: float, allocated: int, peak: int) -> None:
+        self.durations.append(duration)
+        self.allocated += max(allocated, 0)
+        self.peak = max(self.peak, peak)
+
+    def as_dict(self) -> Dict:
+        durations = sorted(self.durations)
+        count = len(durations)
+        total = sum(durations)
+        return {'count': count,
+                'total_time': total,
+                'mean_time': total / count if count else 0,
+                'p99_time': durations[max(math.ceil(0.99 * count) - 1, 0)] if count else 0,
+                'max_time': durations[-1] if count else 0,
+                'allocated_bytes': self.allocated,
+                'peak_bytes': self.peak}
+
+
+class ModuleProfiler:
+    """
+    Profiles the analysis modules per hooked opcode, together with solver and instruction statistics.
+
+    Durations are wall-clock times of the module steps. Allocations are measured with tracemalloc: the net
+    growth of traced memory over a step, and the highest peak a single step reached above its starting point.
+    Before Python 3.9 the peak of a step cannot be told apart from earlier ones, its net growth is reported.
+    Steps the block memo replays instead of executing are profiled apart, so the hooks only show executed steps.
+    """
+
+    def __init__(self, trace_allocations: bool = True):
+        self.trace_allocations = trace_allocations
+        self.hooks: Dict[Tuple[Text, Text, Text], HookProfile] = {}
+        # Steps replayed by the block memo, by the same keys
+        self.replays: Dict[Tuple[Text, Text, Text], HookProfile] = {}
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self._solver_start: Tuple[int, float] = (0, 0.0)
+        # Whether tracemalloc was started by this profiler rather than by its caller
+        self._started_tracing = False
+        # Statistics of the SMT query cache of the profiled run, if it had one
+        self.smt_cache: Optional[Dict] = None
+        # Statistics of the block memo of the profiled run
+        self.block_memo: Optional[Dict] = None
+
+    def start(self) -> None:
+        statistics = SolverStatistics()
+        statistics.enabled = True
+        self._solver_start = (statistics.query_count, statistics.solver_time)
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.start_time = time.time()
+
+    def stop(self) -> None:
+        self.end_time = time.time()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def measure(self, module_name: Text, hook_type: Text, opcode: Text, replay: bool = False) -> Iterator[None]:
+        """ Profiles the module step run in the body, *replay* telling a step the block memo replayed. """
+        profiles = self.replays if replay else self.hooks
+        key = (module_name, hook_type, opcode)
+        profile = profiles.get(key)
+        if profile is None:
+            profile = profiles[key] = HookProfile()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if HAS_RESET_PEAK:
+                tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                profile.record(duration, current - before, peak - before if HAS_RESET_PEAK else current - before)
+            else:
+                profile.record(duration, 0, 0)
+
+    def report(self) -> Dict:
+        modules: Dict[Text, Dict] = {}
+        for (module_name, hook_type, opcode), profile in sorted(self.hooks.items()):
+            module = modules.setdefault(module_name, self._module_totals())
+            hook = profile.as_dict()
+            module['hooks']['{}:{}'.format(hook_type, opcode)] = hook
+            module['count'] += hook['count']
+            module['total_time'] += hook['total_time']
+            module['allocated_bytes'] += hook['allocated_bytes']
+        for (module_name, hook_type, opcode), profile in sorted(self.replays.items()):
+            module = modules.setdefault(module_name, self._module_totals())
+            replay = profile.as_dict()
+            module['replays']['{}:{}'.format(hook_type, opcode)] = replay
+            module['replay_count'] += replay['count']
+            module['replay_time'] += replay['total_time']
+
+        statistics = SolverStatistics()
+        return {'wall_time': (self.end_time or time.time()) - (self.start_time or time.time()),
+                'modules': modules,
+                'solver': {'query_count': statistics.query_count - self._solver_start[0],
+                           'solver_time': statistics.solver_time - self._solver_start[1]},
+                'smt_cache': self.smt_cache,
+                'block_memo': self.block_memo,
+                'instructions': self._instruction_report()}
+
+    @staticmethod
+    def _module_totals() -> Dict:
+        return {'count': 0, 'total_time': 0.0, 'allocated_bytes': 0, 'hooks': {},
+                'replay_count': 0, 'replay_time': 0.0, 'replays': {}}
+
+    @staticmethod
+    def _instruction_report() -> Optional[Dict]:
+        """ Totals of the records of mythril's instruction profiler from the last instrumented laser run. """
+        plugin = LaserPluginLoader().plugin_list.get(INSTRUCTION_PROFILER)
+        if plugin is None or not plugin.records:
+            return None
+        opcodes = {}
+        for op, records in sorted(plugin.records.items()):
+            times = [(record.end_time - record.start_time).total_seconds() for record in records]
+            opcodes[op] = {'count': len(times), 'total_time': sum(times), 'min_time': min(times),
+                           'max_time': max(times)}
+        return {'total_time': sum(opcode['total_time'] for opcode in opcodes.values()), 'opcodes': opcodes}
+
+    def write(self, path: Text) -> None:
+        with open(path, 'w') as profile_file:
+            json.dump(self.report(), profile_file, indent=2)
+        log.info('Wrote profile to %s', path)
@@ -0,0 +1,355 @@
+import logging
+import os
+import queue
+import re
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+from multiprocessing import Pool, Queue
+from pathlib import Path
+from typing import Dict, List, Optional, Text, Tuple
+
+from dolabra.analysis.batch import (
+    ADDRESS_PATTERN,
+    STATUS_ERROR,
+    BatchJob,
+    _alive,
+    _init_worker,
+    _run_job,
+    job_from_address
+)
+from dolabra.analysis.cache import ResultCache
+from dolabra.analysis.findings import FindingsWriter
+from dolabra.constants import (
+    BATCH_JOB_TIMEOUT,
+    ENGINE_STATIC,
+    ENGINE_SYMBOLIC,
+    SERVE_DEADLINE_GRACE,
+    SERVE_LIVENESS_INTERVAL,
+    SERVE_MAX_FINISHED_JOBS,
+    SERVE_MAX_TASKS_PER_CHILD
+)
+from dolabra.contract_loaders.loader import LoaderType
+
+log = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+
+HEX_PATTERN = re.compile(r'^(0x)?([0-9a-fA-F]{2})+$')
+
+# Queue the workers of this process send their events to, see *_init_service_worker*
+_events = None
+
+
+class QueueWriter(FindingsWriter):
+    """ Findings writer sending the findings of a service job to the service process as they are found. """
+
+    def __init__(self, events: Queue, job_id: Text, contract: Optional[Text] = None):
+        super().__init__(output=None, contract=contract)
+        self.events = events
+        self.job_id = job_id
+
+    def _write(self, record: Dict) -> None:
+        self.events.put((self.job_id, os.getpid(), record))
+
+
+def _init_service_worker(events: Queue) -> None:
+    """ Warms the worker up like a batch worker and announces it to the service. """
+    global _events
+    _events = events
+    _init_worker()
+    events.put((None, os.getpid(), {'type': 'ready'}))
+
+
+def _run_service_job(job_id: Text, job: BatchJob, job_timeout: Optional[float], result_cache: Optional[ResultCache],
+                     engine: Text, symbolic_fallback: bool, adaptive: bool, smt_cache: Optional[Text],
+                     signatures: Optional[Text]) -> None:
+    # Everything goes through the event queue, so the result never overtakes the findings of its job
+    _events.put((job_id, os.getpid(), {'type': 'started'}))
+    findings_writer = QueueWriter(_events, job_id, contract=job.name)
+    record = _run_job(job, job_timeout=job_timeout, result_cache=result_cache, engine=engine,
+                      symbolic_fallback=symbolic_fallback, adaptive=adaptive, findings_writer=findings_writer,
+                      smt_cache=smt_cache, signatures=signatures)
+    findings_writer.summary(status=record['status'], error=record['error'])
+    _events.put((job_id, os.getpid(), {'type': 'result', 'record': record}))
+
+
+class ServiceJob:
+    """ A job submitted to the service, with the events its worker reported so far. """
+
+    def __init__(self, job_id: Text, job: BatchJob, spool_path: Optional[Path] = None,
+                 timeout: Optional[float] = None):
+        self.id = job_id
+        self.job = job
+        self.spool_path = spool_path
+        self.timeout = timeout
+        self.status = JOB_QUEUED
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.worker: Optional[int] = None
+        self.events: List[Dict] = []
+        self.record: Optional[Dict] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """ When the running job is given up, well past the timeout its worker enforces itself. """
+        if self.started is None or not self.timeout:
+            return None
+        return self.started + self.timeout + SERVE_DEADLINE_GRACE
+
+    def describe(self, with_record: bool = False) -> Dict:
+        description = {'id': self.id, 'name': self.job.name, 'status': self.status, 'worker': self.worker,
+                       'submitted': self.submitted, 'started': self.started, 'finished': self.finished}
+        if with_record:
+            description['record'] = self.record
+        return description
+
+
+class WorkerStats:
+    """ Jobs and busy time of one worker process. """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.started = time.time()
+        self.jobs = 0
+        self.busy_time = 0.0
+        self.current_job: Optional[Text] = None
+        self.busy_since: Optional[float] = None
+
+    def describe(self, now: float) -> Dict:
+        busy_time = self.busy_time + (now - self.busy_since if self.busy_since is not None else 0.0)
+        lifetime = now - self.started
+        return {'jobs': self.jobs, 'current_job': self.current_job, 'busy_time': round(busy_time, 3),
+                'utilization': round(busy_time / lifetime, 4) if lifetime > 0 else 0.0}
+
+
+class AnalysisService:
+    """
+    Analyzes submitted contracts on a pool of worker processes, each warmed up once and replaced after
+    *SERVE_MAX_TASKS_PER_CHILD* jobs. Jobs whose worker died, or that overran their deadline, are failed
+    (see *_check_workers*); an overrunning worker is killed and replaced. Jobs are described by a request dictionary holding either 'bytecode' (creation code),
+    'address' or 'sol' (path of a Solidity file, optionally with 'contract'), and optionally 'name', 'engine',
+    'fallback', 'adaptive' and 'job_timeout' overriding the defaults of the service.
+    """
+
+    def __init__(self, workers: Optional[int] = None, job_timeout: Optional[float] = BATCH_JOB_TIMEOUT,
+                 result_cache: Optional[ResultCache] = None, engine: Text = ENGINE_SYMBOLIC,
+                 symbolic_fallback: bool = False, adaptive: bool = False, rpc: Optional[Text] = None,
+                 rpc_cache: Optional[Text] = None, block: Optional[int] = None, solc: Optional[Text] = None,
+                 compile_cache: Optional[Text] = None, smt_cache: Optional[Text] = None,
+                 max_finished_jobs: int = SERVE_MAX_FINISHED_JOBS, signatures: Optional[Text] = None):
+        self.workers = workers or os.cpu_count()
+        self.job_timeout = job_timeout
+        self.result_cache = result_cache
+        self.engine = engine
+        self.symbolic_fallback = symbolic_fallback
+        self.adaptive = adaptive
+        self.rpc = rpc
+        self.rpc_cache = rpc_cache
+        self.block = block
+        self.solc = solc
+        self.compile_cache = compile_cache
+        self.smt_cache = smt_cache
+        self.max_finished_jobs = max_finished_jobs
+        self.signatures = signatures
+        self.started: Optional[float] = None
+        self._jobs: Dict[Text, ServiceJob] = OrderedDict()
+        self._worker_stats: Dict[int, WorkerStats] = {}
+        self._condition = threading.Condition()
+        self._spool_dir = Path(tempfile.mkdtemp(prefix='dolabra-serve-'))
+        self._events: Optional[Queue] = None
+        self._pool = None
+        self._collector: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # Import the engine before forking, so the workers inherit it instead of importing it each
+        import dolabra.analysis.symbolic  # noqa: F401
+        self.started = time.time()
+        self._events = Queue()
+        self._pool = Pool(processes=self.workers, initializer=_init_service_worker, initargs=(self._events,),
+                          maxtasksperchild=SERVE_MAX_TASKS_PER_CHILD)
+        self._collector = threading.Thread(target=self._collect_events, name='dolabra-events', daemon=True)
+        self._collector.start()
+        log.info('Analysis service started with %d worker processes', self.workers)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._events.put(None)
+            self._collector.join()
+            self._pool = None
+        for path in self._spool_dir.glob('*'):
+            path.unlink()
+        self._spool_dir.rmdir()
+
+    def _job_from_request(self, job_id: Text, request: Dict) -> Tuple[BatchJob, Optional[Path]]:
+        if request.get('bytecode'):
+            bytecode = str(request['bytecode']).strip()
+            if not HEX_PATTERN.match(bytecode):
+                raise ValueError('"bytecode" must be hex encoded creation code')
+            spool_path = self._spool_dir / (job_id + '.bin')
+            spool_path.write_text(bytecode)
+            return BatchJob(request.get('name') or job_id, LoaderType.BINARY, {'path': str(spool_path)}), spool_path
+        if request.get('address'):
+            if not ADDRESS_PATTERN.match(str(request['address'])):
+                raise ValueError('Invalid contract address: "%s"' % request['address'])
+            job = job_from_address(request['address'], rpc=self.rpc, rpc_cache=self.rpc_cache,
+                                   block=request.get('block', self.block))
+            return job._replace(name=request.get('name') or job.name), None
+        if request.get('sol'):
+            if not Path(request['sol']).is_file():
+                raise ValueError('Solidity file not found: "%s"' % request['sol'])
+            options = {'path': request['sol'], 'solc': self.solc, 'contract_name': request.get('contract'),
+                       'compile_cache': self.compile_cache}
+            return BatchJob(request.get('name') or request['sol'], LoaderType.SOLIDITY, options), None
+        raise ValueError('A job needs "bytecode", "address" or "sol"')
+
+    def submit(self, request: Dict) -> ServiceJob:
+        """ Queues the analysis described by *request*, raises ValueError for invalid requests. """
+        engine = request.get('engine', self.engine)
+        if engine not in (ENGINE_SYMBOLIC, ENGINE_STATIC):
+            raise ValueError('Unknown engine: "%s"' % engine)
+        job_timeout = float(request['job_timeout']) if request.get('job_timeout') else self.job_timeout
+        job_id = uuid.uuid4().hex
+        job, spool_path = self._job_from_request(job_id, request)
+        service_job = ServiceJob(job_id, job, spool_path, timeout=job_timeout)
+        with self._condition:
+            self._jobs[job_id] = service_job
+        self._pool.apply_async(_run_service_job,
+                               (job_id, job, job_timeout, self.result_cache,
+                                engine, bool(request.get('fallback', self.symbolic_fallback)),
+                                bool(request.get('adaptive', self.adaptive)), self.smt_cache, self.signatures),
+                               error_callback=partial(self._job_failed, job_id))
+        log.info('Queued job %s for %s', job_id, job.name)
+        return service_job
+
+    def job(self, job_id: Text) -> Optional[ServiceJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ServiceJob]:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def describe(self, job_id: Text, with_record: bool = False) -> Optional[Dict]:
+        """ The description of a job, taken while the event collector cannot update it. """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return job.describe(with_record) if job is not None else None
+
+    def describe_jobs(self) -> List[Dict]:
+        with self._condition:
+            return [job.describe() for job in self._jobs.values()]
+
+    def wait_events(self, job_id: Text, start: int = 0, timeout: Optional[float] = None) -> Tuple[List[Dict], bool]:
+        """ Waits up to *timeout* seconds for events of the job after the first *start* ones; tells if it is done. """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return [], True
+            self._condition.wait_for(lambda: len(job.events) > start or job.done, timeout)
+            return job.events[start:], job.done
+
+    def status(self) -> Dict:
+        now = time.time()
+        with self._condition:
+            statuses = [job.status for job in self._jobs.values()]
+            return {'uptime': round(now - self.started, 3) if self.started else 0.0,
+                    'queue_depth': statuses.count(JOB_QUEUED),
+                    'running': statuses.count(JOB_RUNNING),
+                    'finished': sum(1 for job in self._jobs.values() if job.done),
+                    'workers': {str(pid): stats.describe(now) for pid, stats in self._worker_stats.items()}}
+
+    def _collect_events(self) -> None:
+        checked = time.time()
+        while True:
+            try:
+                item = self._events.get(timeout=SERVE_LIVENESS_INTERVAL)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                return
+            with self._condition:
+                if item:
+                    self._handle_event(*item)
+                if time.time() - checked >= SERVE_LIVENESS_INTERVAL:
+                    checked = time.time()
+                    self._check_workers(checked)
+                self._condition.notify_all()
+
+    def _check_workers(self, now: float) -> None:
+        """
+        Fails the running jobs whose worker died, as the pool never reports tasks lost with their worker, and
+        the jobs past their deadline, killing their worker so the pool replaces it.
+        """
+        # Finishing forgets the oldest finished jobs
+        for job in list(self._jobs.values()):
+            if job.status != JOB_RUNNING or job.done:
+                continue
+            # The worker the job was assigned to by its 'started' event
+            pid = job.worker
+            if not _alive(pid):
+                log.error('Worker %d running job %s died', pid, job.id)
+                self._finish(job, {'name': job.job.name, 'status': STATUS_ERROR,
+                                   'error': 'Worker process {} died'.format(pid)})
+            elif job.deadline is not None and now > job.deadline:
+                self._finish(job, {'name': job.job.name, 'status': STATUS_ERROR,
+                                   'error': 'Job exceeded its deadline'})
+                # Only kill a worker still running the job, not one that moved on or a reused pid
+                stats = self._worker_stats.get(pid)
+                if stats is not None and stats.current_job == job.id:
+                    log.error('Job %s overran its deadline, killing worker %d', job.id, pid)
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+        for pid in [pid for pid in self._worker_stats if not _alive(pid)]:
+            del self._worker_stats[pid]
+
+    def _handle_event(self, job_id: Optional[Text], pid: int, event: Dict) -> None:
+        now = time.time()
+        stats = self._worker_stats.setdefault(pid, WorkerStats(pid))
+        job = self._jobs.get(job_id)
+        if event['type'] == 'started':
+            stats.current_job, stats.busy_since = job_id, now
+            if job is not None:
+                job.status, job.started, job.worker = JOB_RUNNING, now, pid
+        elif event['type'] == 'result':
+            stats.jobs += 1
+            stats.busy_time += now - (stats.busy_since or now)
+            stats.current_job, stats.busy_since = None, None
+            if job is not None and not job.done:
+                self._finish(job, event['record'])
+        elif job is not None and event['type'] != 'ready':
+            job.events.append(event)
+
+    def _job_failed(self, job_id: Text, error: BaseException) -> None:
+        log.error('Job %s failed: %s', job_id, error)
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.done:
+                self._finish(job, {'name': job.job.name, 'status': STATUS_ERROR,
+                                   'error': str(error) or type(error).__name__})
+            self._condition.notify_all()
+
+    def _finish(self, job: ServiceJob, record: Dict) -> None:
+        job.record = record
+        job.status = record['status']
+        job.finished = time.time()
+        if job.spool_path is not None and job.spool_path.exists():
+            job.spool_path.unlink()
+        # Forget the oldest finished jobs, jobs are kept in submission order
+        finished = [job_id for job_id, kept in self._jobs.items() if kept.done]
+        for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
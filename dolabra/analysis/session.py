@@ -0,0 +1,133 @@
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Text, Union
+
+from dolabra.analysis.cache import ResultCache
+from dolabra.constants import (
+    TIMEOUT,
+    MAX_DEPTH,
+    BOUNDED_LOOPS_LIMIT,
+    DEFAULT_MODULES,
+    ENGINE_SYMBOLIC,
+    ENGINE_STATIC
+)
+
+log = logging.getLogger(__name__)
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+
+class Finding(NamedTuple):
+    """ A function of the analyzed contract matching the pattern of a module. """
+    pattern: Text
+    function_name: Text
+    # Text signature of the function, when the signature index of the session knows it
+    signature: Optional[Text] = None
+
+
+class AnalysisResult(NamedTuple):
+    """ Outcome of the analysis of one contract by an *AnalysisSession*. """
+    name: Optional[Text]
+    status: Text
+    findings: List[Finding]
+    wall_time: float
+    error: Optional[Text] = None
+    # Functions the static engine could not decide, per function the undecided patterns
+    undecided: Optional[Dict[Text, List[Text]]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+    def functions(self, pattern: Text) -> List[Text]:
+        """ Names of the functions matching *pattern*. """
+        return [finding.function_name for finding in self.findings if finding.pattern == pattern]
+
+
+class AnalysisSession:
+    """
+    Analyzes any number of contracts in this process. Every analysis starts from fresh module state, while
+    the imports, the module instances, mythril's plugin builders and the z3 context are set up once and
+    reused, so a long-lived process gives the same results for a contract as a fresh one.
+
+        session = AnalysisSession(['Getter', 'Setter'])
+        for result in session.analyze_all(Loader.get_contract(LoaderType.BINARY, path=path) for path in paths):
+            print(result.name, result.functions('Getter'))
+
+    Failing analyses do not raise, their result has the status 'error'.
+    """
+
+    def __init__(self, white_list: Optional[List[Text]] = None, engine: Text = ENGINE_SYMBOLIC,
+                 symbolic_fallback: bool = False, result_cache: Optional[ResultCache] = None, timeout: int = TIMEOUT,
+                 max_depth: int = MAX_DEPTH, bounded_loops_limit: int = BOUNDED_LOOPS_LIMIT, adaptive: bool = False,
+                 saturation: bool = True, smt_cache=None, signatures: Optional[Text] = None):
+        from dolabra.analysis.module.modules.loader import ModuleLoader
+
+        if engine not in (ENGINE_SYMBOLIC, ENGINE_STATIC):
+            raise ValueError('Unknown engine: "%s"' % engine)
+        self.white_list = list(white_list or DEFAULT_MODULES)
+        self.engine = engine
+        self.symbolic_fallback = symbolic_fallback
+        self.result_cache = result_cache
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.bounded_loops_limit = bounded_loops_limit
+        self.adaptive = adaptive
+        self.saturation = saturation
+        # A dolabra.analysis.smt_cache.SolverCache shared by the analyses of this session
+        self.smt_cache = smt_cache
+        # Path of a signature index to label the findings with
+        self.signatures = signatures
+        self.analyses = 0
+        # Load the modules up front, an unknown module fails here instead of in every analysis
+        self.module_loader = ModuleLoader()
+        self.module_loader.get_detection_modules(self.white_list)
+        if engine == ENGINE_SYMBOLIC or symbolic_fallback:
+            import dolabra.analysis.symbolic  # noqa: F401
+
+    def analyze(self, contract, name: Optional[Text] = None) -> AnalysisResult:
+        """ Analyzes the contract of the contract loader *contract*. """
+        start_time = time.time()
+        undecided = None
+        try:
+            if self.engine == ENGINE_STATIC:
+                from dolabra.analysis.static import StaticWrapper
+                analysis = StaticWrapper(contract, self.white_list, symbolic_fallback=self.symbolic_fallback,
+                                         result_cache=self.result_cache, signatures=self.signatures)
+                report = analysis.run_analysis()
+                undecided = analysis.undecided
+            else:
+                from dolabra.analysis.symbolic import SymbolicWrapper
+                analysis = SymbolicWrapper(contract, module_loader=self.module_loader, result_cache=self.result_cache,
+                                           saturation=self.saturation, timeout=self.timeout, max_depth=self.max_depth,
+                                           bounded_loops_limit=self.bounded_loops_limit, adaptive=self.adaptive,
+                                           smt_cache=self.smt_cache, signatures=self.signatures)
+                analysis.white_list = self.white_list
+                report = analysis.run_analysis()
+        except Exception as e:
+            log.exception('Analysis of %s failed', name or 'the contract')
+            return AnalysisResult(name, STATUS_ERROR, [], round(time.time() - start_time, 3),
+                                  error=str(e) or type(e).__name__)
+        finally:
+            self.analyses += 1
+        findings = [Finding(result['pattern'], result['function_name'], result.get('signature'))
+                    for results in report for result in results]
+        return AnalysisResult(name, STATUS_OK, findings, round(time.time() - start_time, 3), undecided=undecided)
+
+    def analyze_path(self, path: Union[Text, Path], solc: Optional[Text] = None,
+                     contract_name: Optional[Text] = None) -> AnalysisResult:
+        """ Analyzes a .bin file of creation code, or a contract of a .sol file. """
+        from dolabra.analysis.batch import job_from_path
+        from dolabra.contract_loaders.loader import Loader
+
+        job = job_from_path(Path(path), solc)
+        if contract_name is not None:
+            job.options['contract_name'] = contract_name
+        return self.analyze(Loader.get_contract(job.loader_type, **job.options), name=job.name)
+
+    def analyze_all(self, contracts: Iterable) -> Iterator[AnalysisResult]:
+        """ Analyzes the contract loaders of *contracts* one after the other. """
+        for contract in contracts:
+            yield self.analyze(contract)
@@ -0,0 +1,188 @@
+import logging
+import mmap
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Text, Tuple, Union
+
+# eth_hash rather than mythril's sha3, so looking up signatures does not import mythril
+from eth_hash.auto import keccak
+
+log = logging.getLogger(__name__)
+
+# Layout: header | concatenated signatures | index sorted by selector, then by the order the signatures were added
+# header: magic, number of index records, offset of the index
+# index record: selector, offset and length of the signature
+SIGNATURES_MAGIC = b'DLBSIG01'
+HEADER = struct.Struct('<8sQQ')
+RECORD = struct.Struct('<4sIH')
+SELECTOR_SIZE = 4
+# Largest offset and length the fields of an index record hold
+MAX_OFFSET = (1 << 32) - 1
+MAX_LENGTH = (1 << 16) - 1
+
+# Name laser gives the functions of the dispatcher, see mythril's Disassembly
+FUNCTION_NAME_PATTERN = re.compile(r'^_function_0x([0-9a-fA-F]{8})$')
+# A text signature such as transfer(address,uint256) or f((uint256,bytes)[]), anywhere on a line of a dump
+SIGNATURE_PATTERN = re.compile(r'(?<![\w$])[A-Za-z_$][\w$]*\([\w$,()\[\]]*\)')
+
+
+def selector(signature: Text) -> int:
+    return int.from_bytes(keccak(signature.encode())[:SELECTOR_SIZE], 'big')
+
+
+def function_selector(function_name: Optional[Text]) -> Optional[int]:
+    """ The selector of a function named by laser after its selector, None for other names. """
+    match = FUNCTION_NAME_PATTERN.match(function_name or '')
+    return int(match.group(1), 16) if match else None
+
+
+class SignatureIndex:
+    """
+    Read-only view of a selector to signature index built by *build_signature_index*.
+
+    The file is memory-mapped and lookups binary search its fixed-width index records, so opening it costs
+    nothing whatever its size, and only the pages a lookup touches are read. Selectors several signatures
+    hash to keep all of them, in the order they were added.
+    """
+
+    def __init__(self, path: Union[Text, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != SIGNATURES_MAGIC:
+            raise ValueError('Not a signature index: "%s"' % self.path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _selector_at(self, position: int) -> bytes:
+        start = self._index_offset + position * RECORD.size
+        return self._map[start:start + SELECTOR_SIZE]
+
+    def _signature_at(self, position: int) -> Text:
+        _, offset, length = RECORD.unpack_from(self._map, self._index_offset + position * RECORD.size)
+        return self._map[offset:offset + length].decode()
+
+    def _find(self, key: bytes) -> Optional[int]:
+        """ Position of the first record of *key*. """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._selector_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._selector_at(low) == key:
+            return low
+        return None
+
+    def signature(self, selector_value: int) -> Optional[Text]:
+        """ The first signature added for the selector *selector_value*. """
+        position = self._find(selector_value.to_bytes(SELECTOR_SIZE, 'big'))
+        return self._signature_at(position) if position is not None else None
+
+    def signatures(self, selector_value: int) -> List[Text]:
+        """ Every signature of the selector *selector_value*, in the order they were added. """
+        key = selector_value.to_bytes(SELECTOR_SIZE, 'big')
+        position = self._find(key)
+        found = []
+        while position is not None and position < self.count and self._selector_at(position) == key:
+            found.append(self._signature_at(position))
+            position += 1
+        return found
+
+    def label(self, result: Dict) -> Dict:
+        """
+        Adds the signature of the function of the module result *result*, when the index knows it. A signature
+        of another index is dropped.
+        """
+        selector_of_function = function_selector(result.get('function_name'))
+        signature = self.signature(selector_of_function) if selector_of_function is not None else None
+        if signature is not None:
+            result['signature'] = signature
+        else:
+            result.pop('signature', None)
+        return result
+
+    def label_report(self, report: List[List[Dict]]) -> List[List[Dict]]:
+        for results in report:
+            for result in results:
+                self.label(result)
+        return report
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def unlabelled(report: List[List[Dict]]) -> List[List[Dict]]:
+    """ A copy of *report* without signatures, as the result cache stores it: its keys ignore the index. """
+    return [[{key: value for key, value in result.items() if key != 'signature'} for result in results]
+            for results in report]
+
+
+# One mapping per index and process, shared by all analyses of the process
+_open_indexes: Dict[Text, SignatureIndex] = {}
+
+
+def open_signature_index(path: Union[Text, Path]) -> SignatureIndex:
+    key = os.path.realpath(str(path))
+    index = _open_indexes.get(key)
+    if index is None:
+        index = _open_indexes[key] = SignatureIndex(key)
+    return index
+
+
+def build_signature_index(output: Union[Text, Path], signatures: Iterable[Text]) -> int:
+    """
+    Packs text signatures into a signature index at *output*, computing their selectors. Signatures added
+    more than once are stored once. Returns the number of signatures in the index.
+    """
+    records: List[Tuple[bytes, int, int, int]] = []
+    seen = set()
+    tmp_path = Path(str(output) + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(HEADER.pack(SIGNATURES_MAGIC, 0, 0))
+            offset = HEADER.size
+            for signature in signatures:
+                if signature in seen:
+                    continue
+                seen.add(signature)
+                encoded = signature.encode()
+                if len(encoded) > MAX_LENGTH:
+                    log.warning('Skipping signature of %d bytes', len(encoded))
+                    continue
+                if offset > MAX_OFFSET:
+                    raise ValueError('Too many signatures for an index: they exceed %d bytes' % MAX_OFFSET)
+                index_file.write(encoded)
+                # The rank keeps the order of signatures sharing a selector
+                records.append((selector(signature).to_bytes(SELECTOR_SIZE, 'big'), len(records), offset,
+                                len(encoded)))
+                offset += len(encoded)
+
+            records.sort()
+            for key, _, signature_offset, length in records:
+                index_file.write(RECORD.pack(key, signature_offset, length))
+            index_file.seek(0)
+            index_file.write(HEADER.pack(SIGNATURES_MAGIC, len(records), offset))
+    except BaseException:
+        tmp_path.unlink()
+        raise
+    os.replace(tmp_path, output)
+    log.info('Packed %d signatures into %s', len(records), output)
+    return len(records)
+
+
+def signatures_from_dump(dump: Union[Text, Path]) -> Iterator[Text]:
+    """
+    Yields the text signature of every line of a 4byte-style dump: plain signatures, CSV or JSON lines with
+    the signature in any column. Selectors of the dump are ignored, they are computed from the signatures.
+    """
+    with open(dump) as dump_file:
+        for line in dump_file:
+            match = SIGNATURE_PATTERN.search(line)
+            if match:
+                yield match.group(0)
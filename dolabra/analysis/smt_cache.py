@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Text, Tuple, Union
+
+import z3
+from mythril.exceptions import SolverTimeOutException, UnsatError
+from mythril.laser.ethereum.state.constraints import Constraints
+from mythril.laser.ethereum.time_handler import time_handler
+from mythril.support.model import get_model
+
+from dolabra.constants import SMT_CACHE_MAX_ENTRIES, SMT_CACHE_FLUSH_INTERVAL, SMT_CACHE_MEMORY_ENTRIES
+
+log = logging.getLogger(__name__)
+
+# Bump whenever the canonical form of the constraints changes
+SMT_CACHE_FORMAT_VERSION = 1
+# mythril's get_model gives up as unsat, without solving, once less than this many milliseconds are left
+SOLVER_TIME_MARGIN_MS = 500
+
+DECLARATION_PATTERN = re.compile(r'^\(declare-(?:fun|const) (\|[^|]*\||[^\s()]+)', re.MULTILINE)
+TOKEN_PATTERN = re.compile(r'\|[^|]*\||[^\s()|]+|[^|]')
+
+
+def canonical_form(constraints: Constraints) -> Text:
+    """
+    Prints *constraints*, together with mythril's keccak axioms, as SMT-LIB with every declared symbol renamed
+    by its first occurrence. Constraint sets that only differ in the names laser gave their variables, e.g. the
+    transaction ids in calldata names, print the same.
+    """
+    solver = z3.Solver()
+    for constraint in constraints.get_all_constraints():
+        solver.add(constraint.raw if not isinstance(constraint, bool) else z3.BoolVal(constraint))
+    text = solver.sexpr()
+    names: Set[Text] = set(DECLARATION_PATTERN.findall(text))
+    lines = text.splitlines()
+    head = [line for line in lines if line.startswith('(declare-')]
+    body = [line for line in lines if not line.startswith('(declare-')]
+    # Number the symbols in the order the assertions use them, the declarations are then sorted
+    renamed: Dict[Text, Text] = {}
+
+    def rename(tokens: List[Text]) -> Text:
+        for index, token in enumerate(tokens):
+            if token in names:
+                tokens[index] = renamed.setdefault(token, 'v{}'.format(len(renamed)))
+        return ''.join(tokens)
+
+    body_text = rename(TOKEN_PATTERN.findall('\n'.join(body)))
+    head_text = '\n'.join(sorted(rename(TOKEN_PATTERN.findall(line)) for line in head))
+    return head_text + '\n' + body_text
+
+
+def constraints_key(constraints: Constraints) -> Text:
+    return hashlib.sha256('{}\n{}'.format(SMT_CACHE_FORMAT_VERSION, canonical_form(constraints)).encode()).hexdigest()
+
+
+class SolverCache:
+    """
+    Persistent cache of the feasibility verdicts laser asks z3 for, keyed by the canonical form of the constraints.
+
+    Only definite sat/unsat verdicts are stored: timeouts, and unsat answers mythril gives when the execution
+    time is up, are not. Entries carry the solver time they took, which a hit counts as saved. The least
+    recently used entries are evicted beyond *max_entries*. Hits, misses and times are counted in *stats*.
+    """
+
+    def __init__(self, path: Union[Text, Path], max_entries: int = SMT_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._connection = None
+        self._memory: Dict[Text, Tuple[bool, float]] = {}
+        self._pending: Dict[Text, Tuple[bool, float]] = {}
+        self._touched: Set[Text] = set()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), timeout=30)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS smt_verdicts (key TEXT PRIMARY KEY, sat INTEGER, '
+                                     'solver_time REAL, last_used REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS smt_verdicts_last_used ON smt_verdicts (last_used)')
+        return self._connection
+
+    def __getstate__(self):
+        # Workers open their own connection and start with empty statistics
+        return {'path': self.path, 'max_entries': self.max_entries, 'stats': Counter(), '_connection': None,
+                '_memory': {}, '_pending': {}, '_touched': set()}
+
+    def get(self, key: Text) -> Optional[Tuple[bool, float]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            row = self.connection.execute('SELECT sat, solver_time FROM smt_verdicts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            entry = (bool(row[0]), row[1])
+            self._remember(key, entry)
+        self._touched.add(key)
+        return entry
+
+    def _remember(self, key: Text, entry: Tuple[bool, float]) -> None:
+        # Long-lived workers would otherwise keep every verdict they ever saw in memory
+        if len(self._memory) >= SMT_CACHE_MEMORY_ENTRIES:
+            self._memory.clear()
+        self._memory[key] = entry
+
+    def put(self, key: Text, sat: bool, solver_time: float) -> None:
+        self._pending[key] = (sat, solver_time)
+        self._remember(key, (sat, solver_time))
+        if len(self._pending) >= SMT_CACHE_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Writes the new verdicts and the use of the old ones, then evicts the least recently used entries. """
+        if not self._pending and not self._touched:
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO smt_verdicts VALUES (?, ?, ?, ?)',
+                                        [(key, int(sat), solver_time, now)
+                                         for key, (sat, solver_time) in self._pending.items()])
+            self.connection.executemany('UPDATE smt_verdicts SET last_used = ? WHERE key = ?',
+                                        [(now, key) for key in self._touched - self._pending.keys()])
+            count = self.connection.execute('SELECT COUNT(*) FROM smt_verdicts').fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute('DELETE FROM smt_verdicts WHERE key IN (SELECT key FROM smt_verdicts '
+                                        'ORDER BY last_used LIMIT ?)', (count - self.max_entries,))
+                self.stats['evicted'] += count - self.max_entries
+        self._pending = {}
+        self._touched = set()
+
+    def is_possible(self, constraints: Constraints, solver_timeout: Optional[int] = None) -> bool:
+        """ Drop-in replacement of *Constraints.is_possible* answering from the cache when it can. """
+        start = time.perf_counter()
+        try:
+            key = constraints_key(constraints)
+        except z3.Z3Exception as e:
+            log.debug('Could not canonicalize constraints: %s', e)
+            key = None
+        self.stats['key_time'] += time.perf_counter() - start
+        if key is not None:
+            entry = self.get(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+                self.stats['saved_time'] += entry[1]
+                return entry[0]
+        self.stats['misses'] += 1
+
+        start = time.perf_counter()
+        try:
+            get_model(constraints, solver_timeout=solver_timeout)
+            sat = True
+        except SolverTimeOutException:
+            self.stats['uncacheable'] += 1
+            # Like mythril, a short custom timeout errs on the feasible side
+            return solver_timeout is not None
+        except UnsatError:
+            if time_handler.time_remaining() <= SOLVER_TIME_MARGIN_MS:
+                self.stats['uncacheable'] += 1
+                return False
+            sat = False
+        solver_time = time.perf_counter() - start
+        self.stats['solver_time'] += solver_time
+        if key is not None:
+            self.put(key, sat, solver_time)
+        return sat
+
+    @contextmanager
+    def installed(self) -> Iterator['SolverCache']:
+        """ Answers laser's feasibility checks from this cache while the context is active. """
+        original = Constraints.is_possible
+        cache = self
+
+        def is_possible(constraints, solver_timeout=None):
+            return cache.is_possible(constraints, solver_timeout)
+
+        self.stats = Counter()
+        Constraints.is_possible = is_possible
+        try:
+            yield self
+        finally:
+            Constraints.is_possible = original
+            self.flush()
+
+    def report(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {'hits': self.stats['hits'], 'misses': self.stats['misses'],
+                'uncacheable': self.stats['uncacheable'], 'evicted': self.stats['evicted'],
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'saved_time': round(self.stats['saved_time'], 3),
+                'solver_time': round(self.stats['solver_time'], 3),
+                'key_time': round(self.stats['key_time'], 3)}
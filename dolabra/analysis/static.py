@@ -0,0 +1,392 @@
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Text, Tuple
+
+from mythril.disassembler.disassembly import Disassembly
+from mythril.support.opcodes import OPCODES
+
+from dolabra.analysis.module.modules.taints import (
+    DUP_ONE,
+    DUP_TWO,
+    PUSH_ONE,
+    SETTER_DUPLICATED_TAINTS,
+    SETTER_PUSHED_TAINTS,
+    SETTER_SWAPPED_TAINTS,
+    SWAP_ONE
+)
+from dolabra.analysis.signatures import open_signature_index
+
+log = logging.getLogger(__name__)
+
+TERMINATING_OPCODES = frozenset({'STOP', 'RETURN', 'REVERT', 'INVALID', 'SELFDESTRUCT', 'SUICIDE'})
+JUMP_OPCODES = frozenset({'JUMP', 'JUMPI'})
+SELECTOR_PUSHES = frozenset({'PUSH1', 'PUSH2', 'PUSH3', 'PUSH4'})
+
+# Storage slots pushed as a single byte, the same bound StorageCallerCheck applies to its SLOAD taints
+MAX_SMALL_SLOT = 0xFF
+# Stack effects mythril's opcode table gets wrong, as (pops, pushes)
+STACK_EFFECT_FIXES = {'ADDMOD': (3, 1), 'EXTCODESIZE': (1, 1), 'SSTORE': (2, 0)}
+
+
+def push_value(instruction: Dict) -> Optional[int]:
+    """ Returns the constant pushed by a PUSH instruction, None for other instructions and truncated pushes. """
+    if not instruction['opcode'].startswith('PUSH'):
+        return None
+    try:
+        return int(instruction['argument'], 16)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def function_name(disassembly: Disassembly, selector: int, entry: int) -> Text:
+    """ Returns the name laser assigns to the function at *entry*, so that static and symbolic results line up. """
+    return disassembly.address_to_function_name.get(entry, '_function_0x%08x' % selector)
+
+
+class BasicBlock:
+    """ A straight-line run of instructions together with its statically known successors. """
+
+    __slots__ = ('start', 'end', 'opcodes', 'push_values', 'successors', 'dynamic_jump', 'pushed_targets')
+
+    def __init__(self, instructions: List[Dict], start: int, end: int, jumpdests: Dict[int, int]):
+        self.start = start
+        self.end = end
+        self.opcodes = [instruction['opcode'] for instruction in instructions[start:end + 1]]
+        # The constant pushed by each instruction, None for other instructions
+        self.push_values = [push_value(instruction) for instruction in instructions[start:end + 1]]
+        self.successors: List[int] = []
+        self.dynamic_jump = False
+        # Jump targets pushed in this block may be jumped to dynamically later, e.g. return addresses of internal calls
+        self.pushed_targets = [jumpdests[value] for value in self.push_values if value in jumpdests]
+
+        last = self.opcodes[-1]
+        if last in JUMP_OPCODES:
+            target = self.push_values[-2] if end > start else None
+            if target in jumpdests:
+                self.successors.append(jumpdests[target])
+            else:
+                self.dynamic_jump = True
+        if last not in TERMINATING_OPCODES and last != 'JUMP' and end + 1 < len(instructions):
+            self.successors.append(end + 1)
+
+
+class FunctionScan:
+    """ Static verdicts for a single dispatched function. A verdict of None means the scan could not decide. """
+
+    def __init__(self, name: Text, selector: int, entry: int):
+        self.name = name
+        self.selector = selector
+        self.entry = entry
+        self.verdicts: Dict[Text, Optional[bool]] = {}
+
+    @property
+    def undecided(self) -> List[Text]:
+        return [pattern for pattern, verdict in self.verdicts.items() if verdict is None]
+
+
+class StaticScanner:
+    """
+    Pattern-based scan of runtime bytecode for the shapes the symbolic modules detect.
+
+    The dispatcher is recovered from its PUSH4/EQ/PUSH/JUMPI comparisons. The body of each function is the set of
+    basic blocks reachable from its entry; dynamic jumps (internal function returns) over-approximate their targets
+    by every jump destination pushed within the function. Each pattern is answered with True, False or None when
+    the shape is neither clearly present nor clearly absent. All passes are linear in the size of the code per function.
+    """
+
+    def __init__(self, disassembly: Disassembly):
+        self.disassembly = disassembly
+        self.instructions = disassembly.instruction_list
+        self.jumpdests = {instruction['address']: index for index, instruction in enumerate(self.instructions)
+                          if instruction['opcode'] == 'JUMPDEST'}
+        self.blocks = self._build_blocks()
+
+    def _build_blocks(self) -> Dict[int, BasicBlock]:
+        blocks = {}
+        start = 0
+        count = len(self.instructions)
+        for index, instruction in enumerate(self.instructions):
+            opcode = instruction['opcode']
+            if (opcode in TERMINATING_OPCODES or opcode in JUMP_OPCODES or index + 1 == count
+                    or self.instructions[index + 1]['opcode'] == 'JUMPDEST'):
+                blocks[start] = BasicBlock(self.instructions, start, index, self.jumpdests)
+                start = index + 1
+        return blocks
+
+    def _selector_comparisons(self) -> Iterable[Tuple[int, int, int]]:
+        """ Yields the instruction index, selector and entry address of every PUSH <selector> EQ PUSH <entry> JUMPI. """
+        instructions = self.instructions
+        for index in range(len(instructions) - 3):
+            if (instructions[index]['opcode'] in SELECTOR_PUSHES and instructions[index + 1]['opcode'] == 'EQ'
+                    and instructions[index + 3]['opcode'] == 'JUMPI'):
+                selector = push_value(instructions[index])
+                entry = push_value(instructions[index + 2])
+                if selector is not None and entry in self.jumpdests:
+                    yield index, selector, entry
+
+    def dispatcher(self) -> Dict[int, int]:
+        """ Returns the entry address of every function selector compared against in the dispatcher. """
+        entries = {}
+        for _, selector, entry in self._selector_comparisons():
+            entries.setdefault(selector, entry)
+        return entries
+
+    def storage_slots(self) -> Set[int]:
+        """ Returns the constant storage slots read anywhere in the code, i.e. pushed right before an SLOAD. """
+        slots = set()
+        for index, instruction in enumerate(self.instructions):
+            if instruction['opcode'] != 'SLOAD' or index == 0:
+                continue
+            operand = index - 1
+            if self.instructions[operand]['opcode'] == 'DUP1' and operand > 0:
+                operand -= 1
+            value = push_value(self.instructions[operand])
+            if value is not None:
+                slots.add(value)
+        return slots
+
+    def reachable_blocks(self, entry: int) -> List[BasicBlock]:
+        """ Returns the basic blocks reachable from the instruction at address *entry*, in code order. """
+        start = self.jumpdests.get(entry)
+        if start is None:
+            return []
+        visited: Set[int] = set()
+        pushed: Set[int] = set()
+        dynamic = False
+        work_list = [start]
+        while work_list:
+            block_start = work_list.pop()
+            if block_start in visited:
+                continue
+            visited.add(block_start)
+            block = self.blocks[block_start]
+            for target in block.pushed_targets:
+                if target not in pushed:
+                    pushed.add(target)
+                    if dynamic:
+                        work_list.append(target)
+            if block.dynamic_jump and not dynamic:
+                dynamic = True
+                work_list.extend(pushed)
+            work_list.extend(block.successors)
+        return [self.blocks[block_start] for block_start in sorted(visited)]
+
+    def scan(self, patterns: Iterable[Text]) -> List[FunctionScan]:
+        """ Decides each of *patterns* (module pattern names) for every dispatched function. """
+        patterns = [pattern for pattern in patterns if pattern in PATTERN_MATCHERS]
+        dispatcher = self.dispatcher()
+        # A CALLVALUE guard ahead of the first selector comparison makes the whole contract non-payable
+        prologue_end = next((index for index, _, _ in self._selector_comparisons()), 0)
+        prologue = [block for block in self.blocks.values() if block.end < prologue_end]
+        non_payable_contract = guarded_by_callvalue(prologue)
+
+        functions = []
+        for selector, entry in sorted(dispatcher.items(), key=lambda item: item[1]):
+            function = FunctionScan(function_name(self.disassembly, selector, entry), selector, entry)
+            blocks = self.reachable_blocks(entry)
+            for pattern in patterns:
+                if pattern == 'Payable' and non_payable_contract:
+                    function.verdicts[pattern] = False
+                else:
+                    function.verdicts[pattern] = PATTERN_MATCHERS[pattern](blocks)
+            functions.append(function)
+        return functions
+
+
+def guarded_by_callvalue(blocks: Iterable[BasicBlock]) -> bool:
+    """ Whether a CALLVALUE of *blocks* only feeds a JUMPI, i.e. the blocks check msg.value == 0. """
+    return any(_callvalue_guard(block.opcodes, index)
+               for block in blocks for index, opcode in enumerate(block.opcodes) if opcode == 'CALLVALUE')
+
+
+def _callvalue_guard(opcodes: List[Text], index: int) -> bool:
+    """ Whether the CALLVALUE at *index* only feeds the JUMPI ending its block, i.e. a msg.value == 0 check. """
+    if opcodes[-1] != 'JUMPI':
+        return False
+    between = opcodes[index + 1:-1]
+    return all(opcode == 'ISZERO' or opcode[:3] in ('DUP', 'PUS', 'SWA') for opcode in between)
+
+
+def _stack_effect(opcode: Text) -> Optional[Tuple[int, int]]:
+    """ The number of stack elements *opcode* pops and pushes, None for unknown opcodes. """
+    if opcode in STACK_EFFECT_FIXES:
+        return STACK_EFFECT_FIXES[opcode]
+    description = OPCODES.get(opcode)
+    return description['stack'] if description is not None else None
+
+
+def _taint_flow(opcodes: List[Text], annotate: Callable[[Text, List[Set]], None], sink: Text,
+                hit: Callable[[Set], bool]) -> bool:
+    """
+    Replays the stack of a basic block with the taint rule *annotate* of a module, applied after every
+    instruction as its post hook would, and tells whether an element satisfies *hit* right after a *sink*.
+
+    Elements are sets of taints. DUP pushes the duplicated set itself, as laser pushes the same expression,
+    so annotating either copy annotates both. Other results start untainted, and so do the elements the block
+    finds on the stack: the replay under-approximates the taints of an execution of the block, a hit is one.
+    """
+    stack: List[Set] = []
+    for opcode in opcodes:
+        if opcode.startswith('DUP'):
+            depth = int(opcode[3:])
+            stack[:0] = [set() for _ in range(depth - len(stack))]
+            stack.append(stack[-depth])
+        elif opcode.startswith('SWAP'):
+            depth = int(opcode[4:]) + 1
+            stack[:0] = [set() for _ in range(depth - len(stack))]
+            stack[-1], stack[-depth] = stack[-depth], stack[-1]
+        else:
+            effect = _stack_effect(opcode)
+            if effect is None:
+                return False
+            pops, pushes = effect
+            stack[:0] = [set() for _ in range(pops - len(stack))]
+            del stack[len(stack) - pops:]
+            stack.extend(set() for _ in range(pushes))
+        annotate(opcode, stack)
+        if opcode == sink and any(hit(element) for element in stack):
+            return True
+    return False
+
+
+def _annotate_getter(opcode: Text, stack: List[Set]) -> None:
+    """ The taint rule of the Getter module: PUSH1, then DUP1 of the pushed value. """
+    if opcode == 'PUSH1':
+        stack[-1].add(PUSH_ONE)
+    elif opcode == 'DUP1' and PUSH_ONE in stack[-1]:
+        stack[-1].add(DUP_ONE)
+
+
+def _annotate_setter(opcode: Text, stack: List[Set]) -> None:
+    """ The taint rule of the Setter module: DUP1, PUSH1 above it, DUP2 and SWAP1 below of the duplicated value. """
+    if opcode == 'DUP1':
+        stack[-1].add(DUP_ONE)
+    elif opcode == 'PUSH1':
+        if len(stack) > 1 and DUP_ONE in stack[-2]:
+            stack[-2].add(PUSH_ONE)
+    elif opcode == 'DUP2' and SETTER_PUSHED_TAINTS <= stack[-1]:
+        stack[-1].add(DUP_TWO)
+    elif opcode == 'SWAP1' and SETTER_DUPLICATED_TAINTS <= stack[-2]:
+        stack[-2].add(SWAP_ONE)
+
+
+def _match_payable(blocks: List[BasicBlock]) -> Optional[bool]:
+    if guarded_by_callvalue(blocks):
+        return False
+    if any('CALLVALUE' in block.opcodes for block in blocks):
+        # msg.value is used, but not in a plain guard; only symbolic execution can tell whether a JUMPI depends on it
+        return None
+    return True
+
+
+def _match_getter(blocks: List[BasicBlock]) -> Optional[bool]:
+    loads = False
+    for block in blocks:
+        if 'SLOAD' in block.opcodes:
+            loads = True
+            if _taint_flow(block.opcodes, _annotate_getter, 'SLOAD', lambda taints: DUP_ONE in taints):
+                return True
+    return None if loads else False
+
+
+def _match_setter(blocks: List[BasicBlock]) -> Optional[bool]:
+    stores = False
+    for block in blocks:
+        if 'SSTORE' in block.opcodes:
+            stores = True
+            if _taint_flow(block.opcodes, _annotate_setter, 'SSTORE',
+                           lambda taints: SETTER_SWAPPED_TAINTS <= taints):
+                return True
+    return None if stores else False
+
+
+def _match_storage_caller_check(blocks: List[BasicBlock]) -> Optional[bool]:
+    opcodes = [opcode for block in blocks for opcode in block.opcodes]
+    if 'CALLER' not in opcodes or 'SLOAD' not in opcodes:
+        return False
+    for block in blocks:
+        if block.opcodes[-1] != 'JUMPI' or 'EQ' not in block.opcodes:
+            continue
+        equal = len(block.opcodes) - 1 - block.opcodes[::-1].index('EQ')
+        caller = 'CALLER' in block.opcodes[:equal]
+        small_slot_load = any(
+            opcode == 'SLOAD' and any(value is not None and value <= MAX_SMALL_SLOT
+                                      for value in block.push_values[max(0, index - 3):index])
+            for index, opcode in enumerate(block.opcodes[:equal]))
+        if caller and small_slot_load:
+            return True
+    return None
+
+
+PATTERN_MATCHERS = {
+    'Getter': _match_getter,
+    'Setter': _match_setter,
+    'Payable': _match_payable,
+    'StorageCallerCheck': _match_storage_caller_check,
+}
+
+
+class StaticWrapper:
+    """
+    Analyzes a contract with the static scanner only, optionally handing functions it cannot decide
+    to symbolic execution.
+    """
+
+    def __init__(self, contract, white_list: List[Text], symbolic_fallback: bool = False,
+                 contract_name: Text = 'Unknown', result_cache=None, signatures: Optional[Text] = None):
+        self.contract = contract
+        self.white_list = white_list
+        self.symbolic_fallback = symbolic_fallback
+        self.contract_name = contract_name
+        self.result_cache = result_cache
+        # Path of a signature index (see dolabra.analysis.signatures) to label the findings with
+        self.signatures = signatures
+        self.undecided: Dict[Text, List[Text]] = {}
+
+    def run_analysis(self) -> List[List[Dict]]:
+        start_time = time.time()
+        disassembly = self.contract.disassembly()
+        if disassembly is None or not disassembly.instruction_list:
+            raise ValueError('No runtime code to scan')
+        functions = StaticScanner(disassembly).scan(self.white_list)
+        self.undecided = {function.name: function.undecided for function in functions if function.undecided}
+        log.info('Static scan of %d functions finished in %.3f seconds, %d undecided.',
+                 len(functions), time.time() - start_time, len(self.undecided))
+
+        report = []
+        for pattern in self.white_list:
+            report.append([{'contract': self.contract_name, 'pattern': pattern, 'function_name': function.name}
+                           for function in functions if function.verdicts.get(pattern)])
+
+        if self.symbolic_fallback and self.undecided:
+            report = self._merge_symbolic(report, functions)
+        if self.signatures is not None:
+            open_signature_index(self.signatures).label_report(report)
+        return report
+
+    def _merge_symbolic(self, report: List[List[Dict]], functions: List[FunctionScan]) -> List[List[Dict]]:
+        """
+        Replaces the verdicts of undecided functions by symbolic results. Symbolic execution only explores the
+        undecided functions (see *SelectorConstraintPlugin*) for the patterns some of them left undecided.
+        """
+        from dolabra.analysis.plugins import SelectorConstraintPlugin
+        from dolabra.analysis.symbolic import SymbolicWrapper
+
+        log.info('Sending %d undecided functions to symbolic execution...', len(self.undecided))
+        symbolic = SymbolicWrapper(self.contract, result_cache=self.result_cache, signatures=self.signatures)
+        symbolic.white_list = [pattern for pattern in self.white_list
+                               if any(pattern in undecided for undecided in self.undecided.values())]
+        symbolic.selector_constraint = SelectorConstraintPlugin(
+            sorted(function.selector for function in functions if function.undecided))
+        symbolic_report = symbolic.run_analysis()
+
+        decided = {function.name: function.verdicts for function in functions}
+        merged = []
+        for pattern, static_results in zip(self.white_list, report):
+            results = list(static_results)
+            results.extend(result for module_results in symbolic_report for result in module_results
+                           if result['pattern'] == pattern
+                           and decided.get(result['function_name'], {}).get(pattern) is None)
+            merged.append(results)
+        self.undecided = {}
+        return merged
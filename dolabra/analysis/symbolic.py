@@ -1,9 +1,13 @@
 import time
+import hashlib
 import logging
-from typing import Optional
+from contextlib import nullcontext
+from multiprocessing import Pool
+from typing import Callable, Dict, List, Optional, Text, Tuple
 
 # laser imports
 from mythril.laser.ethereum import svm
+from mythril.laser.ethereum.function_managers import keccak_function_manager
 from mythril.laser.ethereum.state.world_state import WorldState
 from mythril.laser.ethereum.strategy.extensions.bounded_loops import BoundedLoopsStrategy
 from mythril.laser.plugin.loader import LaserPluginLoader
@@ -15,23 +19,71 @@ from mythril.laser.plugin.plugins import (
     InstructionProfilerBuilder,
 )
 
+from dolabra.analysis.budget import AnalysisBudget, CostEstimate, estimate_cost, functions_to_deepen, plan_budget
+from dolabra.analysis.cache import ResultCache, analysis_variant
+from dolabra.analysis.checkpoint import Checkpoint, Checkpointer, read_checkpoint, resume_sym_exec
+from dolabra.analysis.findings import FindingsWriter
+from dolabra.analysis.plugins import SaturationPlugin, SelectorConstraintPlugin
+from dolabra.analysis.profiler import ModuleProfiler
+from dolabra.analysis.signatures import SignatureIndex, open_signature_index, unlabelled
+from dolabra.analysis.smt_cache import SolverCache
+from dolabra.analysis.static import StaticScanner, function_name
 from dolabra.analysis.module.modules.loader import ModuleLoader
-from dolabra.logger.log_manager import setup_logger
+from dolabra.analysis.module.modules.dispatcher import ModuleDispatcher
 from dolabra.contract_loaders.file_loader import FileLoader
 from dolabra.contract_loaders.jsonrpc_loader import JsonRpcLoader
+from dolabra.contract_loaders.corpus_loader import CorpusLoader
 
-from dolabra.constants import TIMEOUT, MAX_DEPTH, BOUNDED_LOOPS_LIMIT
+from dolabra.constants import TIMEOUT, MAX_DEPTH, BOUNDED_LOOPS_LIMIT, DEFAULT_MODULES
 
-setup_logger()
 log = logging.getLogger(__name__)
 
+LASER_PLUGIN_BUILDERS = (CoveragePluginBuilder, MutationPrunerBuilder, InstructionProfilerBuilder,
+                         DependencyPrunerBuilder)
+
 class SymbolicWrapper:
-    white_list=["Getter", "Setter"]
+    white_list=list(DEFAULT_MODULES)
     #white_list=["StorageCallerCheck"]
     
-    def __init__(self, contract, module_loader: Optional[ModuleLoader] = ModuleLoader()):
+    def __init__(self, contract, module_loader: Optional[ModuleLoader] = None,
+                 result_cache: Optional[ResultCache] = None, function_workers: Optional[int] = None,
+                 findings_writer: Optional[FindingsWriter] = None, saturation: bool = True,
+                 profiler: Optional[ModuleProfiler] = None, timeout: int = TIMEOUT, max_depth: int = MAX_DEPTH,
+                 bounded_loops_limit: int = BOUNDED_LOOPS_LIMIT, adaptive: bool = False,
+                 smt_cache: Optional[SolverCache] = None, block_memo: bool = True,
+                 checkpoint: Optional[Text] = None, resume: Optional[Text] = None,
+                 signatures: Optional[Text] = None):
         self.contract = contract
-        self.module_loader = module_loader
+        self.module_loader = module_loader or ModuleLoader()
+        self.result_cache = result_cache
+        # Whether the last report was read from the result cache rather than computed
+        self.cached = False
+        # When set, each function is explored by its own laser run on a pool of this many processes
+        self.function_workers = function_workers
+        self.selector_constraint: Optional[SelectorConstraintPlugin] = None
+        self.findings_writer = findings_writer
+        # Prune saturated functions and stop once every function is saturated
+        self.saturation = saturation
+        self.saturation_plugin: Optional[SaturationPlugin] = None
+        self.profiler = profiler
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.bounded_loops_limit = bounded_loops_limit
+        # Size the budget to the estimated cost of the contract, the limits above become upper bounds
+        self.adaptive = adaptive
+        self.cost: Optional[CostEstimate] = None
+        self.budget: Optional[AnalysisBudget] = None
+        self.dispatcher = None
+        # Answers laser's feasibility checks that were solved before, in this or an earlier run
+        self.smt_cache = smt_cache
+        # Replay the module steps for basic blocks already seen with the same taints
+        self.block_memo = block_memo
+        # Path to checkpoint the execution to on timeout or SIGUSR1, and of a checkpoint to continue from
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.checkpointer: Optional[Checkpointer] = None
+        # Path of a signature index (see dolabra.analysis.signatures) to label the findings with
+        self.signatures = signatures
 
     def _process_contract(self):
         contract = self.contract
@@ -45,11 +97,40 @@ class SymbolicWrapper:
             elif isinstance(contract, JsonRpcLoader):
                 contract_address = contract.address
                 dyn_loader = contract.dyn_loader
+                disassembly = contract.disassembly()
+                if disassembly is not None:
+                    # Fetch the statically known storage slots in one round trip instead of one per SLOAD
+                    contract.prefetch(StaticScanner(disassembly).storage_slots())
+            elif isinstance(contract, CorpusLoader):
+                contract_address = contract.address
             else:
                 raise ValueError('Invalid type for contract parameter')
 
         return bytecode, contract_address, dyn_loader
 
+    def _analyzed_code(self, bytecode, contract_address):
+        """ Returns the creation code, or the runtime code of a deployed contract, None when it has none. """
+        if contract_address is not None:
+            disassembly = self.contract.disassembly()
+            return disassembly.bytecode if disassembly is not None else None
+        return bytecode
+
+    def _cache_key(self, bytecode, contract_address):
+        bytecode = self._analyzed_code(bytecode, contract_address)
+        if bytecode is None:
+            return None
+        return ResultCache.key(bytecode, self.white_list,
+                               timeout=self.timeout, max_depth=self.max_depth,
+                               bounded_loops_limit=self.bounded_loops_limit,
+                               variant=analysis_variant(bool(self.function_workers), self.adaptive,
+                                                        *self._constraint()))
+
+    def _constraint(self) -> Tuple[Optional[List[int]], bool]:
+        """ The selectors every run of this analysis is constrained to, and whether they are excluded. """
+        if self.selector_constraint is None:
+            return None, False
+        return self.selector_constraint.selectors, self.selector_constraint.exclude
+
     def _initialize_laser(self, timeout, max_depth, creation_code, target_address, dyn_loader):
         world_state = None
 
@@ -59,10 +140,14 @@ class SymbolicWrapper:
                                  max_depth=max_depth, requires_statespace=False)
 
         elif creation_code is None and target_address is not None:
-            assert dyn_loader is not None, "Dynamic Loader has not been provided"
             log.info('Initializing symbolic execution for an existing contract...')
-            world_state = WorldState()
-            world_state.accounts_exist_or_load(target_address, dyn_loader)
+            if isinstance(self.contract, CorpusLoader):
+                # Offline code comes without chain state, nothing to load dynamically
+                world_state = self.contract.world_state()
+            else:
+                assert dyn_loader is not None, "Dynamic Loader has not been provided"
+                world_state = WorldState()
+                world_state.accounts_exist_or_load(target_address, dyn_loader)
             laser = svm.LaserEVM(dynamic_loader=dyn_loader, execution_timeout=timeout,
                                  max_depth=max_depth, requires_statespace=False)
 
@@ -72,59 +157,295 @@ class SymbolicWrapper:
 
         return laser, world_state
 
-    def _register_hooks_and_load_plugins(self, laser, bounded_loops_limit):
+    def _register_hooks_and_load_plugins(self, laser, bounded_loops_limit, timeout=TIMEOUT):
         log.info('Registering hooks and loading plugins...')     
 
-        for module in self.module_loader.get_detection_modules(self.white_list):
-            for hook in module.pre_hooks:
-                laser.register_hooks('pre', {hook: [module.execute]})
-            for hook in module.post_hooks:
-                laser.register_hooks('post', {hook: [module.execute]})    
+        # A single dispatcher hook per opcode fans out to every interested module
+        self.dispatcher = ModuleDispatcher(self.module_loader.get_detection_modules(self.white_list),
+                                           profiler=self.profiler, block_memo=self.block_memo)
+        self.dispatcher.register_hooks(laser)
+        if self.findings_writer is not None:
+            self.findings_writer.laser = laser
+        on_result = self._result_handler()
+        for module in self.dispatcher.modules:
+            module.on_result = on_result
 
         # Load laser plugins
         laser.extend_strategy(BoundedLoopsStrategy,
                               loop_bound=bounded_loops_limit)
         plugin_loader = LaserPluginLoader()
-        plugin_loader.load(CoveragePluginBuilder())
-        plugin_loader.load(MutationPrunerBuilder())
-        plugin_loader.load(InstructionProfilerBuilder())
-        plugin_loader.load(DependencyPrunerBuilder())
+        # The builders stay loaded for the lifetime of the process, only the plugins are created per run
+        for builder in LASER_PLUGIN_BUILDERS:
+            if builder.name not in plugin_loader.laser_plugin_builders:
+                plugin_loader.load(builder())
         plugin_loader.instrument_virtual_machine(laser, None)
+        if self.selector_constraint is not None:
+            self.selector_constraint.initialize(laser)
+        if self.saturation:
+            self.saturation_plugin = SaturationPlugin(self.dispatcher.modules, self._dispatched_functions(),
+                                                      timeout=timeout)
+            self.saturation_plugin.initialize(laser)
+
+    def _dispatched_functions(self) -> List[Text]:
+        """ Returns the names of the functions this run explores, as laser will name them. """
+        disassembly = self.contract.disassembly()
+        if disassembly is None:
+            return []
+        dispatcher = StaticScanner(disassembly).dispatcher()
+        if self.selector_constraint is not None:
+            if self.selector_constraint.exclude:
+                return []
+            dispatcher = {selector: entry for selector, entry in dispatcher.items()
+                          if selector in self.selector_constraint.selectors}
+        return [function_name(disassembly, selector, entry) for selector, entry in dispatcher.items()]
+
+    def _checkpoint_identity(self, bytecode, contract_address) -> Dict:
+        """ What a checkpoint has to match to be resumed: the analyzed code and the modules. """
+        code = self._analyzed_code(bytecode, contract_address)
+        return {'code': hashlib.sha256(code.encode()).hexdigest() if code else None,
+                'modules': list(self.white_list)}
+
+    def _install_checkpointer(self, laser, identity: Dict, dyn_loader) -> None:
+        self.checkpointer = Checkpointer(self.checkpoint, identity, self.dispatcher.modules,
+                                         LaserPluginLoader().plugin_list, externals={'dynamic_loader': dyn_loader})
+        self.checkpointer.initialize(laser)
 
-    def _run_symbolic_execution(self, laser, creation_code, target_address, world_state=None):
+    def _load_checkpoint(self, identity: Dict, dyn_loader) -> Checkpoint:
+        """ Reads the checkpoint to resume and puts the progress of its modules and plugins back. """
+        log.info('Resuming from checkpoint %s...', self.resume)
+        checkpoint = read_checkpoint(self.resume, identity, externals={'dynamic_loader': dyn_loader})
+        checkpoint.restore(self.dispatcher.modules, LaserPluginLoader().plugin_list)
+        # The resumed transaction has been started already, count it like the start hooks would have
+        if self.saturation_plugin is not None:
+            self.saturation_plugin.resume(checkpoint.transaction + 1)
+        if self.checkpointer is not None:
+            self.checkpointer.transaction = checkpoint.transaction + 1
+        restored = self._label([module.results for module in self.dispatcher.modules])
+        if self.findings_writer is not None:
+            self.findings_writer.emit_report(restored)
+        return checkpoint
+
+    def _run_symbolic_execution(self, laser, creation_code, target_address, world_state=None,
+                                checkpoint: Optional[Checkpoint] = None):
         log.info('Starting symbolic execution...')
         start_time = time.time()
-        laser.sym_exec(creation_code=creation_code,
-                       contract_name='Unknown',
-                       world_state=world_state,
-                       target_address=int(target_address, 16) if target_address else None)
+        if self.profiler is not None:
+            self.profiler.start()
+        try:
+            with self.checkpointer.signal_handler() if self.checkpointer is not None else nullcontext():
+                if checkpoint is not None:
+                    resume_sym_exec(laser, checkpoint)
+                else:
+                    laser.sym_exec(creation_code=creation_code,
+                                   contract_name='Unknown',
+                                   world_state=world_state,
+                                   target_address=int(target_address, 16) if target_address else None)
+        finally:
+            # The modules outlive this analysis, stop them from writing to this run's output
+            for module in self.dispatcher.modules:
+                module.on_result = None
+            if self.profiler is not None:
+                self.profiler.stop()
         log.info('Symbolic execution finished in %.2f seconds.',
                  time.time() - start_time)
+        log.info('Module dispatch counts: %s', self.dispatcher.report_counts())
+        if self.dispatcher.block_memo is not None:
+            log.info('Block memo statistics: %s', self.dispatcher.report_memo())
+            if self.profiler is not None:
+                self.profiler.block_memo = self.dispatcher.report_memo()
+        if isinstance(self.contract, JsonRpcLoader):
+            log.info('JSON-RPC statistics: %s', self.contract.rpc_stats)
         #return start_time, time.time()
 
         report = []
-        for module in self.module_loader.get_detection_modules(self.white_list):
+        for module in self.dispatcher.modules:
             report.append(module.results)
 
         return report    
 
+    def _signature_index(self) -> Optional[SignatureIndex]:
+        return open_signature_index(self.signatures) if self.signatures is not None else None
+
+    def _result_handler(self) -> Optional[Callable[[Dict], None]]:
+        """ The handler the modules pass each new finding to: labels it and streams it, as this run asks. """
+        signature_index = self._signature_index()
+        findings_writer = self.findings_writer
+        if signature_index is None and findings_writer is None:
+            return None
+
+        def on_result(result: Dict) -> None:
+            if signature_index is not None:
+                signature_index.label(result)
+            if findings_writer is not None:
+                findings_writer.emit(result)
+        return on_result
+
+    def _label(self, report: List[List[Dict]]) -> List[List[Dict]]:
+        """ Labels the findings of a report the modules of this process did not label, e.g. a cached one. """
+        signature_index = self._signature_index()
+        return signature_index.label_report(report) if signature_index is not None else report
+
+    def _function_runs(self) -> List[Tuple[List[int], bool]]:
+        """ Returns the selector constraints of the per-function runs: one run per selector plus one for the fallback. """
+        disassembly = self.contract.disassembly()
+        selectors = sorted(StaticScanner(disassembly).dispatcher()) if disassembly is not None else []
+        if not selectors:
+            return []
+        return [([selector], False) for selector in selectors] + [(selectors, True)]
+
+    def _run_per_function(self, runs: List[Tuple[List[int], bool]]) -> List[List[Dict]]:
+        log.info('Starting %d per-function symbolic executions on %d processes...', len(runs), self.function_workers)
+        start_time = time.time()
+        with Pool(processes=min(self.function_workers, len(runs))) as pool:
+            reports = pool.starmap(_analyze_function, [(self.contract, self.white_list, selectors, exclude,
+                                                        self.saturation, self.timeout, self.max_depth,
+                                                        self.bounded_loops_limit, self.smt_cache)
+                                                       for selectors, exclude in runs])
+        log.info('Per-function symbolic executions finished in %.2f seconds.', time.time() - start_time)
+        return merge_reports(reports)
+
     def run_analysis(self):
         log.info('Processing the contract and preparing for analysis...')
         bytecode, contract_address, dyn_loader = self._process_contract()
 
-        laser, world_state = self._initialize_laser(timeout=TIMEOUT,
-                                                    max_depth=MAX_DEPTH,
+        cache_key = None
+        self.cached = False
+        # A resumed execution explored more than its settings tell, its report is not cached
+        if self.result_cache is not None and self.resume is None:
+            cache_key = self._cache_key(bytecode, contract_address)
+            # An execution to checkpoint is run even when cached, to have its checkpoint written on timeout
+            report = self.result_cache.get(cache_key) if cache_key and self.checkpoint is None else None
+            if report is not None:
+                log.info('Found cached analysis results for this bytecode.')
+                self.cached = True
+                report = self._label(report)
+                if self.findings_writer is not None:
+                    self.findings_writer.emit_report(report)
+                return report
+
+        self._reset_run_state()
+        checkpointing = self.checkpoint is not None or self.resume is not None
+        if self.function_workers and self.profiler is not None:
+            log.warning('Profiling needs a single symbolic execution, ignoring the per-function mode.')
+        if (self.function_workers or self.adaptive) and checkpointing:
+            log.warning('Checkpoints need a single symbolic execution, ignoring the per-function and adaptive modes.')
+        single = self.profiler is not None or checkpointing
+        runs = self._function_runs() if self.function_workers and not single else []
+        if runs:
+            report = self._label(self._run_per_function(runs))
+            if self.findings_writer is not None:
+                self.findings_writer.emit_report(report)
+            if cache_key is not None:
+                self.result_cache.put(cache_key, unlabelled(report))
+            return report
+
+        with self.smt_cache.installed() if self.smt_cache is not None else nullcontext():
+            if self.adaptive and not checkpointing:
+                report = self._run_adaptive(bytecode, contract_address, dyn_loader)
+            else:
+                report = self._run_pass(bytecode, contract_address, dyn_loader, timeout=self.timeout,
+                                        max_depth=self.max_depth, bounded_loops_limit=self.bounded_loops_limit)
+        if self.smt_cache is not None:
+            log.info('SMT cache statistics: %s', self.smt_cache.report())
+            if self.profiler is not None:
+                self.profiler.smt_cache = self.smt_cache.report()
+
+        # report = Report(start_time=start_time, end_time=end_time)
+
+        # An execution ended to checkpoint explored less than its settings tell
+        if cache_key is not None and not (self.checkpointer is not None and self.checkpointer.taken):
+            self.result_cache.put(cache_key, unlabelled(report))
+
+        return report
+
+    def _reset_run_state(self) -> None:
+        """ Clears the state earlier analyses of this process left in the modules and in mythril's keccak model. """
+        for module in self.module_loader.get_detection_modules(self.white_list):
+            module.reset()
+        keccak_function_manager.reset()
+
+    def _run_pass(self, bytecode, contract_address, dyn_loader, timeout, max_depth, bounded_loops_limit):
+        laser, world_state = self._initialize_laser(timeout=timeout,
+                                                    max_depth=max_depth,
                                                     creation_code=bytecode,
                                                     target_address=contract_address,
                                                     dyn_loader=dyn_loader)
 
-        self._register_hooks_and_load_plugins(laser, bounded_loops_limit=BOUNDED_LOOPS_LIMIT)
+        self._register_hooks_and_load_plugins(laser, bounded_loops_limit=bounded_loops_limit, timeout=timeout)
 
-        report = self._run_symbolic_execution(laser,
-                                                            creation_code=bytecode,
-                                                            target_address=contract_address,
-                                                            world_state=world_state)
+        checkpoint = None
+        if self.checkpoint is not None or self.resume is not None:
+            identity = self._checkpoint_identity(bytecode, contract_address)
+            if self.checkpoint is not None:
+                self._install_checkpointer(laser, identity, dyn_loader)
+            if self.resume is not None:
+                checkpoint = self._load_checkpoint(identity, dyn_loader)
 
-        # report = Report(start_time=start_time, end_time=end_time)
+        return self._run_symbolic_execution(laser,
+                                            creation_code=bytecode,
+                                            target_address=contract_address,
+                                            world_state=world_state,
+                                            checkpoint=checkpoint)
 
-        return report
+    def _run_adaptive(self, bytecode, contract_address, dyn_loader):
+        """
+        Runs a shallow pass within the budget estimated for the contract, then spends the rest of the budget
+        on a deeper pass over the functions the shallow one left unclassified or poorly covered.
+        The modules keep their results across both passes.
+        """
+        disassembly = self.contract.disassembly()
+        if disassembly is None or not disassembly.instruction_list:
+            log.warning('No runtime code to estimate the cost of, using the fixed budget.')
+            return self._run_pass(bytecode, contract_address, dyn_loader, timeout=self.timeout,
+                                  max_depth=self.max_depth, bounded_loops_limit=self.bounded_loops_limit)
+
+        self.cost = estimate_cost(disassembly)
+        self.budget = plan_budget(self.cost, self.timeout, self.max_depth, self.bounded_loops_limit)
+        log.info('Estimated cost %s, budget %s', self.cost._asdict(), self.budget._asdict())
+
+        start_time = time.time()
+        report = self._run_pass(bytecode, contract_address, dyn_loader, timeout=self.budget.shallow_timeout,
+                                max_depth=self.budget.shallow_max_depth,
+                                bounded_loops_limit=self.budget.shallow_loops_limit)
+        remaining = int(self.budget.timeout - (time.time() - start_time))
+        selectors = functions_to_deepen(disassembly, self.dispatcher.modules)
+        if not selectors or remaining < 1:
+            log.info('Shallow pass settled the contract, skipping the deep pass.' if not selectors else
+                     'Budget exhausted by the shallow pass.')
+            return report
+
+        log.info('Deepening %d functions for %d seconds...', len(selectors), remaining)
+        self.selector_constraint = SelectorConstraintPlugin(selectors)
+        try:
+            return self._run_pass(bytecode, contract_address, dyn_loader, timeout=remaining,
+                                  max_depth=self.budget.max_depth, bounded_loops_limit=self.budget.bounded_loops_limit)
+        finally:
+            self.selector_constraint = None
+
+
+def _analyze_function(contract, white_list: List, selectors: List[int], exclude: bool,
+                      saturation: bool = True, timeout: int = TIMEOUT, max_depth: int = MAX_DEPTH,
+                      bounded_loops_limit: int = BOUNDED_LOOPS_LIMIT,
+                      smt_cache: Optional[SolverCache] = None) -> List[List[Dict]]:
+    """ Worker side of a per-function run. """
+    wrapper = SymbolicWrapper(contract, saturation=saturation, timeout=timeout,
+                              max_depth=max_depth, bounded_loops_limit=bounded_loops_limit, smt_cache=smt_cache)
+    wrapper.white_list = white_list
+    wrapper.selector_constraint = SelectorConstraintPlugin(selectors, exclude=exclude)
+    return wrapper.run_analysis()
+
+
+def merge_reports(reports: List[List[List[Dict]]]) -> List[List[Dict]]:
+    """ Merges the module results of several runs over the same modules, dropping duplicate findings. """
+    merged: List[List[Dict]] = []
+    seen = set()
+    for report in reports:
+        for index, results in enumerate(report):
+            if index == len(merged):
+                merged.append([])
+            for result in results:
+                finding = (index, result['pattern'], result['function_name'])
+                if finding not in seen:
+                    seen.add(finding)
+                    merged[index].append(result)
+    return merged
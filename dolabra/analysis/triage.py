@@ -0,0 +1,264 @@
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Text, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Triage is optional, see the 'triage' extra
+    np = None
+
+from mythril.disassembler.disassembly import Disassembly
+
+from dolabra.analysis.static import PATTERN_MATCHERS, StaticScanner
+from dolabra.constants import (
+    DEFAULT_MODULES,
+    TRIAGE_BAND_SIZE,
+    TRIAGE_SELECTOR_PERMUTATIONS,
+    TRIAGE_SHINGLE_PERMUTATIONS,
+    TRIAGE_SHINGLE_SIZE,
+    TRIAGE_THRESHOLD
+)
+from dolabra.contract_loaders.corpus_loader import open_corpus
+from dolabra.contract_loaders.loader import LoaderType
+
+log = logging.getLogger(__name__)
+
+PUSH1 = 0x60
+PUSH4 = 0x63
+PUSH5 = 0x64
+PUSH32 = 0x7f
+# Opcodes counted per function, a near-duplicate touching storage or the caller differently is not verified
+COUNTED_OPCODES = {'SLOAD': 0x54, 'SSTORE': 0x55, 'CALLER': 0x33, 'CALLVALUE': 0x34}
+# Solidity appends the CBOR encoded metadata, whose length is given by the last two bytes of the code
+METADATA_MARKERS = (0xa1, 0xa2)
+# Mersenne-like prime above every 32 bit value, see *MinHasher*
+MINHASH_PRIME = (1 << 32) + 15
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError('Triage requires NumPy, install it with "pip install dolabra[triage]"')
+
+
+def strip_metadata(code: bytes) -> bytes:
+    """ *code* without its trailing Solidity metadata, so contracts differing only in their sources compare equal. """
+    if len(code) < 2:
+        return code
+    length = int.from_bytes(code[-2:], 'big')
+    start = len(code) - length - 2
+    if 0 <= start < len(code) - 2 and code[start] in METADATA_MARKERS:
+        return code[:start]
+    return code
+
+
+def instruction_starts(code: 'np.ndarray') -> 'np.ndarray':
+    """
+    The offsets of the instructions of *code*, skipping PUSH data. The instruction following every offset is
+    known at once; the ones reachable from offset 0 are found by pointer doubling in a logarithmic number of passes.
+    """
+    size = len(code)
+    push_sizes = np.where((code >= PUSH1) & (code <= PUSH32), code.astype(np.int64) - PUSH1 + 1, 0)
+    following = np.minimum(np.arange(size, dtype=np.int64) + 1 + push_sizes, size)
+    # Offset *size* is the end of the code, it leads to itself
+    jump = np.append(following, size)
+    reached = np.zeros(size + 1, dtype=bool)
+    reached[0] = True
+    steps = 1
+    while steps <= size:
+        reached[jump[np.flatnonzero(reached)]] = True
+        jump = jump[jump]
+        steps *= 2
+    return np.flatnonzero(reached[:size])
+
+
+class Features(NamedTuple):
+    """ Vectorized features of the runtime bytecode of a contract. """
+    # Number of instructions per opcode
+    histogram: 'np.ndarray'
+    # Sorted distinct PUSH4 immediates, the function selectors of the dispatcher among them
+    selectors: 'np.ndarray'
+    # Sorted distinct runs of *TRIAGE_SHINGLE_SIZE* opcodes, packed one byte per opcode
+    shingles: 'np.ndarray'
+    # Hash of the code with the data of PUSH5 and wider zeroed, equal for contracts differing only in constants
+    skeleton: Text
+
+    @property
+    def counts(self) -> Dict[Text, int]:
+        return {name: int(self.histogram[opcode]) for name, opcode in COUNTED_OPCODES.items()}
+
+
+def extract_features(code: bytes, shingle_size: int = TRIAGE_SHINGLE_SIZE) -> Features:
+    _require_numpy()
+    code = np.frombuffer(strip_metadata(bytes(code)), dtype=np.uint8)
+    starts = instruction_starts(code)
+    opcodes = code[starts]
+    histogram = np.bincount(opcodes, minlength=256)
+
+    # Immediates running past the end of the code read zeros, as the EVM does
+    padded = np.concatenate([code, np.zeros(32, dtype=np.uint8)]).astype(np.uint64)
+    push4 = starts[opcodes == PUSH4]
+    selectors = np.zeros(len(push4), dtype=np.uint64)
+    for byte in range(4):
+        selectors = (selectors << np.uint64(8)) | padded[push4 + 1 + byte]
+    selectors = np.unique(selectors)
+
+    count = len(opcodes) - shingle_size + 1
+    shingles = np.zeros(max(count, 0), dtype=np.uint64)
+    for position in range(shingle_size):
+        shingles = (shingles << np.uint64(8)) | opcodes[position:position + count].astype(np.uint64)
+    shingles = np.unique(shingles)
+
+    skeleton = code.copy()
+    wide_pushes = starts[(opcodes >= PUSH5) & (opcodes <= PUSH32)]
+    for push in wide_pushes:
+        skeleton[push + 1:push + 1 + int(code[push]) - PUSH1 + 1] = 0
+    return Features(histogram, selectors, shingles, hashlib.sha256(skeleton.tobytes()).hexdigest())
+
+
+class MinHasher:
+    """
+    MinHash signatures of the selector set and the shingle set of contracts. Every permutation is a universal
+    hash (a * x + b) mod p of the 32 bit members, the signature keeps the minimum of each; the share of equal
+    entries of two signatures estimates the Jaccard similarity of the sets.
+    """
+
+    def __init__(self, selector_permutations: int = TRIAGE_SELECTOR_PERMUTATIONS,
+                 shingle_permutations: int = TRIAGE_SHINGLE_PERMUTATIONS, seed: int = 0):
+        _require_numpy()
+        random = np.random.RandomState(seed)
+        permutations = selector_permutations + shingle_permutations
+        self.selector_permutations = selector_permutations
+        # a * x + b stays below 2 ** 64 for 32 bit members
+        self.a = random.randint(1, 1 << 31, size=permutations).astype(np.uint64)
+        self.b = random.randint(0, 1 << 31, size=permutations).astype(np.uint64)
+
+    def _minimums(self, members: 'np.ndarray', a: 'np.ndarray', b: 'np.ndarray') -> 'np.ndarray':
+        if not len(members):
+            return np.full(len(a), MINHASH_PRIME, dtype=np.uint64)
+        members = members & np.uint64(0xffffffff)
+        return ((np.outer(a, members) + b[:, None]) % np.uint64(MINHASH_PRIME)).min(axis=1)
+
+    def signature(self, features: Features) -> 'np.ndarray':
+        split = self.selector_permutations
+        return np.concatenate([self._minimums(features.selectors, self.a[:split], self.b[:split]),
+                               self._minimums(features.shingles, self.a[split:], self.b[split:])])
+
+
+def similarity(first: 'np.ndarray', second: 'np.ndarray') -> float:
+    return float(np.mean(first == second))
+
+
+def cluster(signatures: 'np.ndarray', threshold: float = TRIAGE_THRESHOLD,
+            band_size: int = TRIAGE_BAND_SIZE) -> List[List[int]]:
+    """
+    Groups the rows of *signatures* whose estimated similarity reaches *threshold*. Locality-sensitive hashing
+    buckets rows sharing all entries of a band; only rows sharing a bucket are compared. Clusters and their
+    members are in input order, the first member being the representative of its cluster.
+    """
+    count = len(signatures)
+    parents = list(range(count))
+
+    def find(row: int) -> int:
+        while parents[row] != row:
+            parents[row] = parents[parents[row]]
+            row = parents[row]
+        return row
+
+    for start in range(0, signatures.shape[1] - band_size + 1, band_size):
+        _, buckets = np.unique(signatures[:, start:start + band_size], axis=0, return_inverse=True)
+        buckets = buckets.reshape(-1)
+        order = np.argsort(buckets, kind='stable')
+        bounds = np.flatnonzero(np.diff(buckets[order])) + 1
+        for members in np.split(order, bounds):
+            first = int(members[0])
+            for member in members[1:]:
+                member = int(member)
+                root, member_root = find(first), find(member)
+                if root != member_root and similarity(signatures[first], signatures[member]) >= threshold:
+                    parents[max(root, member_root)] = min(root, member_root)
+
+    clusters: Dict[int, List[int]] = {}
+    for row in range(count):
+        clusters.setdefault(find(row), []).append(row)
+    return list(clusters.values())
+
+
+class StaticShape:
+    """
+    The static verdicts and counts of *COUNTED_OPCODES* of every dispatched function of a contract, by selector.
+    A shape is decided when the scan decided every pattern of every function; only equal decided shapes verify
+    a follower against its representative, as undecided verdicts may hide different behaviour.
+    """
+
+    def __init__(self, code: bytes, patterns: Sequence[Text]):
+        scanner = StaticScanner(Disassembly(bytes(code).hex()))
+        self.functions: Dict[int, Tuple[Dict[Text, Optional[bool]], Counter]] = {}
+        for function in scanner.scan(patterns):
+            counts = Counter(opcode for block in scanner.reachable_blocks(function.entry)
+                             for opcode in block.opcodes if opcode in COUNTED_OPCODES)
+            self.functions[function.selector] = (function.verdicts, counts)
+        # Patterns without a static matcher are never decided
+        self.decided = (bool(self.functions) and all(pattern in PATTERN_MATCHERS for pattern in patterns)
+                        and all(None not in verdicts.values() for verdicts, _ in self.functions.values()))
+
+    def __eq__(self, other) -> bool:
+        return self.decided and other.decided and self.functions == other.functions
+
+
+class TriagePlan(NamedTuple):
+    """ The jobs left to analyze, and the jobs taking the results of each representative. """
+    jobs: List
+    followers: Dict[Text, List]
+    clusters: int
+
+
+def verified(representative: Features, follower: Features, shape: StaticShape, follower_code: bytes,
+             patterns: Sequence[Text]) -> bool:
+    """ Whether *follower* can take the results of *representative*, whose static shape is *shape*. """
+    if follower.skeleton == representative.skeleton:
+        return True
+    return shape.decided and StaticShape(follower_code, patterns) == shape
+
+
+def triage_jobs(jobs: List, threshold: float = TRIAGE_THRESHOLD, patterns: Optional[Sequence[Text]] = None,
+                seed: int = 0) -> TriagePlan:
+    """
+    Clusters the near-duplicate contracts of the corpus jobs among *jobs*, so that only one representative of
+    each cluster is analyzed. A member of a cluster is verified against its representative: either their code
+    is equal but for constants, or their functions have the same decided static verdicts (see *StaticScanner*)
+    for *patterns* and counts of *COUNTED_OPCODES*, function by function. Members failing verification keep
+    their job. Followers of a representative whose analysis does not succeed are analyzed themselves, see
+    *run_batch*.
+    Jobs of other loaders are kept as they are.
+    """
+    _require_numpy()
+    patterns = list(patterns or DEFAULT_MODULES)
+    triaged = [job for job in jobs if job.loader_type == LoaderType.CORPUS]
+    if not triaged:
+        return TriagePlan(jobs, {}, 0)
+
+    codes = [open_corpus(job.options['corpus']).code(job.options['address']) or b'' for job in triaged]
+    features = [extract_features(code) for code in codes]
+    hasher = MinHasher(seed=seed)
+    signatures = np.stack([hasher.signature(contract) for contract in features])
+
+    followers: Dict[Text, List] = {}
+    skipped = set()
+    clusters = cluster(signatures, threshold)
+    for members in clusters:
+        representative = members[0]
+        if len(members) == 1:
+            continue
+        shape = StaticShape(codes[representative], patterns)
+        for member in members[1:]:
+            if verified(features[representative], features[member], shape, codes[member], patterns):
+                followers.setdefault(triaged[representative].name, []).append(triaged[member])
+                skipped.add(triaged[member].name)
+            else:
+                log.debug('%s is similar to %s, but failed verification', triaged[member].name,
+                          triaged[representative].name)
+
+    log.info('Triaged %d contracts into %d clusters, %d take the results of their representative',
+             len(triaged), len(clusters), len(skipped))
+    return TriagePlan([job for job in jobs if job.name not in skipped], followers, len(clusters))
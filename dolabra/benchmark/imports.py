@@ -0,0 +1,36 @@
+import logging
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Text
+
+log = logging.getLogger(__name__)
+
+# Modules whose import time bounds the startup of the CLI and of the worker processes
+IMPORT_TARGETS = [
+    'dolabra.cli.main',
+    'dolabra.analysis.static',
+    'dolabra.analysis.symbolic',
+]
+TIMING_SNIPPET = 'import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)'
+
+
+def _import_time(module: Text) -> Optional[float]:
+    """ Seconds a fresh interpreter takes to import *module*, or None if the import fails. """
+    process = subprocess.run([sys.executable, '-c', TIMING_SNIPPET.format(module)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        log.warning('Importing %s failed: %s', module, process.stderr.decode().strip().splitlines()[-1:])
+        return None
+    return float(process.stdout.decode().strip())
+
+
+def measure_imports(modules: Optional[List[Text]] = None, repeat: int = 1) -> Dict[Text, Optional[float]]:
+    """ Median import time of each of *modules*, every run in a fresh interpreter so nothing is imported yet. """
+    times = {}
+    for module in modules or IMPORT_TARGETS:
+        runs = [_import_time(module) for _ in range(repeat)]
+        runs = [run for run in runs if run is not None]
+        times[module] = round(statistics.median(runs), 4) if runs else None
+        log.info('Importing %s takes %s s', module, times[module])
+    return times
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import platform
+import resource
+import statistics
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Text
+
+from mythril.__version__ import __version__ as mythril_version
+
+from dolabra.analysis.batch import BatchJob, expand_solidity_jobs, job_from_path, jobs_from_directory
+from dolabra.analysis.findings import FindingsWriter
+from dolabra.benchmark.synthetic import SyntheticSpec, write_family
+from dolabra.constants import (
+    TIMEOUT,
+    MAX_DEPTH,
+    BOUNDED_LOOPS_LIMIT,
+    ENGINE_SYMBOLIC,
+    ENGINE_STATIC,
+    BENCH_FORMAT_VERSION
+)
+from dolabra.contract_loaders.loader import Loader
+
+log = logging.getLogger(__name__)
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+# Metrics compared against the baseline and whether a higher value is worse
+COMPARED_METRICS = {
+    'wall_time': True,
+    'peak_rss': True,
+    'states_per_second': False,
+}
+
+
+class HitRecorder(FindingsWriter):
+    """ Findings writer keeping the time to the first hit of every module instead of writing the findings. """
+
+    def __init__(self):
+        super().__init__(output=None)
+        self.first_hits: Dict[Text, float] = {}
+
+    def emit(self, result: Dict[Text, Text]) -> None:
+        self.first_hits.setdefault(result.get('pattern'), self.elapsed)
+        super().emit(result)
+
+    def _write(self, record: Dict) -> None:
+        pass
+
+
+def _peak_rss() -> int:
+    """ Peak resident set size of this process in bytes. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _code_hash(path: Text) -> Text:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def benchmark_jobs(contracts: Optional[Text] = None, specs: Optional[List[SyntheticSpec]] = None,
+                   work_dir: Optional[Text] = None, solc: Optional[Text] = None,
+                   compile_cache: Optional[Text] = None) -> List[BatchJob]:
+    """ Collects the contracts below *contracts* and writes the synthetic contracts of *specs* to *work_dir*. """
+    # Cases are named independently of where they are found, so that results of different checkouts compare
+    jobs = []
+    if contracts:
+        if Path(contracts).is_dir():
+            jobs.extend(expand_solidity_jobs([job._replace(name=str(Path(job.name).relative_to(contracts)))
+                                              for job in jobs_from_directory(contracts, solc=solc)],
+                                             solc=solc, compile_cache=compile_cache))
+        else:
+            log.warning('Benchmark contracts directory %s does not exist, skipping it', contracts)
+    if specs:
+        jobs.extend(job_from_path(path)._replace(name=path.stem) for path in write_family(work_dir, specs))
+    return jobs
+
+
+def _run_case(job: BatchJob, white_list: List[Text], engine: Text = ENGINE_SYMBOLIC,
+              symbolic_fallback: bool = False, saturation: bool = True) -> Dict:
+    """ Analyzes one contract, in a process of its own so that the peak RSS belongs to this case alone. """
+    from dolabra.analysis.static import StaticWrapper
+    from dolabra.analysis.symbolic import SymbolicWrapper
+
+    record = {'name': job.name, 'status': STATUS_OK, 'code_hash': _code_hash(job.options['path']),
+              'wall_time': None, 'states': None, 'states_per_second': None, 'peak_rss': None,
+              'time_to_first_hit': {}, 'findings': [], 'error': None}
+    recorder = HitRecorder()
+    start_time = time.time()
+    try:
+        contract_loader = Loader.get_contract(job.loader_type, **job.options)
+        if engine == ENGINE_STATIC:
+            report = StaticWrapper(contract_loader, white_list, symbolic_fallback=symbolic_fallback).run_analysis()
+            recorder.emit_report(report)
+        else:
+            analysis = SymbolicWrapper(contract_loader, findings_writer=recorder, saturation=saturation)
+            analysis.white_list = white_list
+            report = analysis.run_analysis()
+        record['findings'] = sorted([result['pattern'], result['function_name']]
+                                    for results in report for result in results)
+    except Exception as e:
+        log.exception('Benchmark case %s failed', job.name)
+        record['status'] = STATUS_ERROR
+        record['error'] = str(e) or type(e).__name__
+    wall_time = time.time() - start_time
+    record['wall_time'] = round(wall_time, 3)
+    record['states'] = recorder.states
+    if recorder.states is not None and wall_time > 0:
+        record['states_per_second'] = round(recorder.states / wall_time, 1)
+    record['peak_rss'] = _peak_rss()
+    record['time_to_first_hit'] = recorder.first_hits
+    return record
+
+
+def _median_run(runs: List[Dict]) -> Dict:
+    """ Picks the run with the median wall time and keeps the wall times of all runs. """
+    ordered = sorted(runs, key=lambda run: run['wall_time'])
+    record = dict(ordered[(len(ordered) - 1) // 2])
+    if len(runs) > 1:
+        record['wall_times'] = [run['wall_time'] for run in runs]
+        record['wall_time_stdev'] = round(statistics.stdev(record['wall_times']), 3)
+    return record
+
+
+def run_benchmark(jobs: List[BatchJob], white_list: List[Text], engine: Text = ENGINE_SYMBOLIC,
+                  symbolic_fallback: bool = False, saturation: bool = True, repeat: int = 1) -> Dict:
+    """ Runs every job *repeat* times, each run in a fresh worker process, and returns the benchmark document. """
+    settings = {'modules': sorted(white_list), 'engine': engine, 'symbolic_fallback': symbolic_fallback,
+                'saturation': saturation, 'timeout': TIMEOUT, 'max_depth': MAX_DEPTH,
+                'bounded_loops_limit': BOUNDED_LOOPS_LIMIT, 'repeat': repeat}
+    cases = []
+    log.info('Benchmarking %d contracts, %d run(s) each...', len(jobs), repeat)
+    with Pool(processes=1, maxtasksperchild=1) as pool:
+        for job in jobs:
+            runs = [pool.apply(_run_case, (job, white_list, engine, symbolic_fallback, saturation))
+                    for _ in range(repeat)]
+            case = _median_run(runs)
+            log.info('%s: %s in %.2f s, %s states', case['name'], case['status'], case['wall_time'], case['states'])
+            cases.append(case)
+    return {'version': BENCH_FORMAT_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': {'python': platform.python_version(), 'mythril': mythril_version,
+                            'platform': platform.platform()},
+            'settings': settings,
+            'cases': cases}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> Dict:
+    """
+    Compares the cases of two benchmark documents. A metric regresses when it got worse by more than *threshold*
+    (a fraction) relative to the baseline; cases whose findings differ or that stopped succeeding are regressions too.
+    Cases whose contract changed since the baseline are not compared. Import times, when both documents have them,
+    are compared the same way.
+    """
+    baseline_cases = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+    changes = {}
+    for case in current['cases']:
+        old = baseline_cases.get(case['name'])
+        if old is None or old.get('code_hash') != case['code_hash']:
+            continue
+        if case['status'] != STATUS_OK:
+            if old['status'] == STATUS_OK:
+                regressions.append({'case': case['name'], 'metric': 'status', 'baseline': old['status'],
+                                    'current': case['status']})
+            continue
+        if case['findings'] != old.get('findings'):
+            regressions.append({'case': case['name'], 'metric': 'findings', 'baseline': old.get('findings'),
+                                'current': case['findings']})
+
+        case_changes = {}
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            old_value, new_value = old.get(metric), case.get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value
+            case_changes[metric] = round(change, 4)
+            if (change if higher_is_worse else -change) > threshold:
+                regressions.append({'case': case['name'], 'metric': metric, 'baseline': old_value,
+                                    'current': new_value, 'change': round(change, 4)})
+        changes[case['name']] = case_changes
+
+    # Import times only get worse, each module is compared like a case of its own
+    for module, new_value in current.get('imports', {}).items():
+        old_value = baseline.get('imports', {}).get(module)
+        if not old_value or new_value is None:
+            continue
+        change = (new_value - old_value) / old_value
+        changes['import ' + module] = {'import_time': round(change, 4)}
+        if change > threshold:
+            regressions.append({'case': 'import ' + module, 'metric': 'import_time', 'baseline': old_value,
+                                'current': new_value, 'change': round(change, 4)})
+
+    if baseline.get('settings') != current['settings']:
+        log.info('Benchmark settings differ from the baseline: %s -> %s', baseline.get('settings'), current['settings'])
+    return {'threshold': threshold, 'changes': changes, 'regressions': regressions}
@@ -0,0 +1,166 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Text, Tuple, Union
+
+from mythril.support.opcodes import ADDRESS, OPCODES
+from mythril.support.support_utils import sha3
+
+log = logging.getLogger(__name__)
+
+LABEL_SIZE = 2
+MARK = 'MARK'
+ADDRESS_MASK = (1 << 160) - 1
+
+
+class SyntheticSpec(NamedTuple):
+    """
+    Shape of a generated contract: the number of dispatched functions, of storage slots they read and write,
+    of functions running a calldata-bounded loop and of functions guarded by an owner check.
+    """
+    functions: int = 4
+    slots: int = 2
+    loops: int = 0
+    checks: int = 0
+
+    @property
+    def name(self) -> Text:
+        return 'synthetic-f{}-s{}-l{}-c{}'.format(*self)
+
+    @classmethod
+    def parse(cls, spec: Text) -> 'SyntheticSpec':
+        """ Parses 'FUNCTIONS,SLOTS,LOOPS,CHECKS', trailing values may be omitted. """
+        try:
+            values = [int(value) for value in spec.split(',')]
+        except ValueError:
+            raise ValueError('Invalid synthetic contract spec: "%s"' % spec)
+        if not 1 <= len(values) <= len(cls._fields) or min(values) < 0 or values[0] == 0:
+            raise ValueError('Invalid synthetic contract spec: "%s"' % spec)
+        return cls(*values)
+
+
+BASE_SPEC = SyntheticSpec()
+
+
+def default_family() -> List[SyntheticSpec]:
+    """ The base contract and variants of it scaling one dimension at a time. """
+    return ([BASE_SPEC]
+            + [BASE_SPEC._replace(functions=functions) for functions in (8, 16, 32)]
+            + [BASE_SPEC._replace(slots=slots) for slots in (8, 32)]
+            + [BASE_SPEC._replace(loops=loops) for loops in (1, 4)]
+            + [BASE_SPEC._replace(checks=checks) for checks in (1, 4)])
+
+
+class Assembler:
+    """ Minimal EVM assembler, labels are JUMPDESTs referenced through fixed size pushes. """
+
+    def __init__(self):
+        self.items: List[Tuple[Text, Union[int, Text, None], int]] = []
+
+    def op(self, *opcodes: Text) -> 'Assembler':
+        for opcode in opcodes:
+            self.items.append((opcode, None, 0))
+        return self
+
+    def push(self, value: int, size: int = 0) -> 'Assembler':
+        size = size or max(1, (value.bit_length() + 7) // 8)
+        self.items.append(('PUSH{}'.format(size), value, size))
+        return self
+
+    def push_label(self, label: Text) -> 'Assembler':
+        self.items.append(('PUSH{}'.format(LABEL_SIZE), label, LABEL_SIZE))
+        return self
+
+    def label(self, label: Text) -> 'Assembler':
+        self.items.append(('JUMPDEST', label, 0))
+        return self
+
+    def mark(self, label: Text) -> 'Assembler':
+        """ Defines *label* at the current offset without emitting a JUMPDEST. """
+        self.items.append((MARK, label, 0))
+        return self
+
+    def assemble(self) -> bytes:
+        labels: Dict[Text, int] = {}
+        offset = 0
+        for opcode, argument, size in self.items:
+            if opcode in ('JUMPDEST', MARK):
+                labels[argument] = offset
+            offset += size if opcode == MARK else 1 + size
+
+        code = bytearray()
+        for opcode, argument, size in self.items:
+            if opcode == MARK:
+                continue
+            code.append(OPCODES[opcode][ADDRESS])
+            if size:
+                value = labels[argument] if isinstance(argument, str) else argument
+                code.extend(value.to_bytes(size, 'big'))
+        return bytes(code)
+
+
+def selector(index: int) -> int:
+    return int.from_bytes(sha3('function{}(uint256)'.format(index).encode())[:4], 'big')
+
+
+def runtime_code(spec: SyntheticSpec) -> bytes:
+    """
+    Solidity-shaped runtime code: a selector dispatcher followed by the functions. Even functions are getters
+    returning a slot, odd ones setters writing their argument to it; each pair of functions shares one slot.
+    The first *checks* functions require the caller to be the owner stored after the data slots, the first
+    *loops* functions count up to their argument before doing their work.
+    """
+    owner_slot = spec.slots
+    code = Assembler()
+    code.push(0x80).push(0x40).op('MSTORE')
+    code.push(4).op('CALLDATASIZE', 'LT').push_label('fallback').op('JUMPI')
+    code.push(0).op('CALLDATALOAD').push(0xe0).op('SHR')
+    for index in range(spec.functions):
+        code.op('DUP1').push(selector(index), 4).op('EQ').push_label('function{}'.format(index)).op('JUMPI')
+    code.label('fallback').push(0).op('DUP1', 'REVERT')
+
+    for index in range(spec.functions):
+        # Unlike solc, drop the selector the dispatcher duplicated: left on the stack, the Getter would take
+        # the owner check of a setter for a storage read
+        code.label('function{}'.format(index)).op('POP')
+        if index < spec.checks:
+            code.push(owner_slot).op('SLOAD').push(ADDRESS_MASK).op('AND', 'CALLER', 'EQ')
+            code.push_label('authorized{}'.format(index)).op('JUMPI').push(0).op('DUP1', 'REVERT')
+            code.label('authorized{}'.format(index))
+        if index < spec.loops:
+            code.push(0).label('loop{}'.format(index))
+            code.op('DUP1').push(4).op('CALLDATALOAD', 'SWAP1', 'LT', 'ISZERO')
+            code.push_label('done{}'.format(index)).op('JUMPI')
+            code.push(1).op('ADD').push_label('loop{}'.format(index)).op('JUMP')
+            code.label('done{}'.format(index)).op('POP')
+        slot = (index // 2) % spec.slots if spec.slots else 0
+        # solc's unoptimized bodies of 'return slot;' and 'slot = argument;'
+        if index % 2 == 0:
+            code.push(slot, 1).op('DUP1', 'SLOAD', 'SWAP1', 'POP').push(0).op('MSTORE').push(0x20).push(0).op('RETURN')
+        else:
+            code.push(4).op('CALLDATALOAD', 'DUP1').push(slot, 1).op('DUP2', 'SWAP1', 'SSTORE', 'POP', 'POP', 'STOP')
+    return code.assemble()
+
+
+def creation_code(spec: SyntheticSpec) -> bytes:
+    """ Constructor storing the deployer as owner and returning the runtime code. """
+    runtime = runtime_code(spec)
+    constructor = Assembler()
+    if spec.checks:
+        constructor.op('CALLER').push(spec.slots).op('SSTORE')
+    constructor.push(len(runtime), 2).op('DUP1').push_label('runtime').push(0).op('CODECOPY')
+    constructor.push(0).op('RETURN', 'INVALID')
+    constructor.mark('runtime')
+    return constructor.assemble() + runtime
+
+
+def write_family(directory: Union[Text, Path], specs: List[SyntheticSpec]) -> List[Path]:
+    """ Writes the creation code of every spec to <directory>/<name>.bin. """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for spec in specs:
+        path = directory / (spec.name + '.bin')
+        path.write_text(creation_code(spec).hex())
+        paths.append(path)
+    log.info('Generated %d synthetic contracts in %s', len(paths), directory)
+    return paths
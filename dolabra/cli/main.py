@@ -1,15 +1,47 @@
 from argparse import ArgumentParser
-from typing import Text
+from typing import Dict, List, Optional, Text
+import json
+import os
+import tempfile
 import pprint
+import sys
 
-from dolabra.analysis.symbolic import SymbolicWrapper
-from dolabra.contract_loaders.loader import LoaderType, Loader
+# Only light modules are imported here, mythril and z3 are imported by the commands that need them
+from dolabra.analysis.cache import ResultCache, analysis_variant
+from dolabra.analysis.findings import FindingsWriter
+from dolabra.constants import (
+    BATCH_JOB_TIMEOUT,
+    BOUNDED_LOOPS_LIMIT,
+    BENCH_REGRESSION_THRESHOLD,
+    ENGINE_STATIC,
+    ENGINE_SYMBOLIC,
+    DEFAULT_MODULES,
+    JOB_STORE_LEASE,
+    JOB_STORE_MAX_ATTEMPTS,
+    SERVE_HOST,
+    SERVE_PORT,
+    RESULT_CACHE_MAX_SIZE,
+    RESULT_CACHE_MAX_AGE,
+    RPC_PREFETCH_AHEAD,
+    TRIAGE_THRESHOLD
+)
 
 # Default analysis arguments
 DEFAULT_MAX_DEPTH = 128
 DEFAULT_RPC = 'http://127.0.0.1:7545'
 DEFAULT_SOLC = 'solc'
 DEFAULT_TIMEOUT_ANALYSIS = 60
+DEFAULT_CACHE_MAX_SIZE_MB = RESULT_CACHE_MAX_SIZE // (1024 * 1024)
+DEFAULT_CACHE_MAX_AGE_HOURS = RESULT_CACHE_MAX_AGE // (60 * 60)
+DEFAULT_BENCH_CONTRACTS = 'test_contracts'
+DEFAULT_BENCH_THRESHOLD_PERCENT = BENCH_REGRESSION_THRESHOLD * 100
+
+# Output formats
+OUTPUT_TEXT = 'text'
+OUTPUT_JSONL = 'jsonl'
+
+# Job store statuses --retry makes pending again, see dolabra.analysis.job_store
+RETRY_STATUSES = ['failed', 'timeout']
 
 def init_parser() -> ArgumentParser:
     parser = ArgumentParser(description="Dolabra - an Ethereum Smart Contract Analyzer")
@@ -18,6 +50,25 @@ def init_parser() -> ArgumentParser:
     # Add analysis parser
     analysis_parser = subparsers.add_parser('analyze', help='begin analysis of a contract')
     init_analysis_parser(analysis_parser)
+    # Add batch analysis parser
+    batch_parser = subparsers.add_parser('analyze-batch', help='analyze many contracts in parallel')
+    init_batch_parser(batch_parser)
+    # Add corpus building parser
+    corpus_parser = subparsers.add_parser('build-corpus', help='pack runtime bytecode into an offline corpus')
+    init_corpus_parser(corpus_parser)
+    # Add signature index building parser
+    signatures_parser = subparsers.add_parser('build-signatures',
+                                              help='pack a function signature dump into an offline signature index')
+    init_signatures_parser(signatures_parser)
+    # Add benchmark parser
+    bench_parser = subparsers.add_parser('bench', help='benchmark the analysis on test and synthetic contracts')
+    init_bench_parser(bench_parser)
+    # Add analysis service parser
+    serve_parser = subparsers.add_parser('serve', help='analyze submitted contracts on warm worker processes')
+    init_serve_parser(serve_parser)
+    # Add campaign parser
+    campaign_parser = subparsers.add_parser('campaign', help='run a resumable campaign of jobs kept in a job store')
+    init_campaign_parser(campaign_parser)
     return parser
 
 def init_analysis_parser(parser: ArgumentParser) -> None:
@@ -27,44 +78,580 @@ def init_analysis_parser(parser: ArgumentParser) -> None:
     input_group.add_argument('-s', '--sol', metavar='PATH', type=Text, dest='sol_path', help='path to solidity contract')
     input_group.add_argument('-b', '--bin', metavar='PATH', type=Text, dest='bin_path',
                              help='path to file containing contract creation bytecode')
+    input_group.add_argument('--all', action='store_true', dest='all_addresses',
+                             help='analyze every contract of the corpus given with --corpus')
+    parser.add_argument('--corpus', metavar='PATH', type=Text,
+                        help='offline bytecode corpus to read --address or --all from instead of the RPC node')
 
     sym_exec_arguments = parser.add_argument_group('symbolic execution arguments')
     sym_exec_arguments.add_argument('--timeout', metavar='SEC', type=int, default=DEFAULT_TIMEOUT_ANALYSIS,
                                     help='symbolic execution timeout (default: {})'.format(DEFAULT_TIMEOUT_ANALYSIS))
     sym_exec_arguments.add_argument('--max-depth', metavar='DEPTH', type=int, default=DEFAULT_MAX_DEPTH,
                                     help='max graph depth (default: {})'.format(DEFAULT_MAX_DEPTH))
+    sym_exec_arguments.add_argument('--adaptive', action='store_true',
+                                    help='size the budget to the estimated cost of the contract, --timeout and '
+                                         '--max-depth become upper bounds')
+    sym_exec_arguments.add_argument('--per-function', action='store_true',
+                                    help='explore each function in its own symbolic execution, in parallel')
+    sym_exec_arguments.add_argument('-j', '--jobs', metavar='N', type=int, default=os.cpu_count(),
+                                    help='number of processes for --per-function (default: {})'.format(os.cpu_count()))
+    sym_exec_arguments.add_argument('--profile', metavar='PATH', type=Text,
+                                    help='write a JSON profile of the modules, the solver and the instructions to PATH')
+    sym_exec_arguments.add_argument('--no-saturation', action='store_false', dest='saturation',
+                                    help='keep exploring functions all modules have already classified')
+    sym_exec_arguments.add_argument('--no-block-memo', action='store_false', dest='block_memo',
+                                    help='run the modules on every path instead of replaying them for basic blocks '
+                                         'already seen with the same taints')
+    sym_exec_arguments.add_argument('--checkpoint', metavar='PATH', type=Text,
+                                    help='on timeout or SIGUSR1, write the open states and the module progress to PATH '
+                                         'and stop')
+    sym_exec_arguments.add_argument('--resume', metavar='CHECKPOINT', type=Text,
+                                    help='continue the symbolic execution a --checkpoint was written of, for another '
+                                         '--timeout seconds')
+
+    output_group = parser.add_argument_group('output arguments')
+    output_group.add_argument('--output', choices=[OUTPUT_TEXT, OUTPUT_JSONL], default=OUTPUT_TEXT,
+                              help='print the report at the end, or stream one JSON line per finding followed by '
+                                   'a summary line (default: {})'.format(OUTPUT_TEXT))
+    output_group.add_argument('--output-file', metavar='PATH', type=Text,
+                              help='file to write the JSON lines to (default: stdout)')
+
+    init_engine_arguments(parser)
+    init_signature_arguments(parser)
+    init_networking_arguments(parser)
+    init_proxy_arguments(parser)
+    init_compilation_arguments(parser)
+    init_cache_arguments(parser)
+
+def init_batch_parser(parser: ArgumentParser) -> None:
+
+    init_batch_input_arguments(parser, required=True)
+
+    batch_group = parser.add_argument_group('batch arguments')
+    batch_group.add_argument('-j', '--jobs', metavar='N', type=int, default=os.cpu_count(),
+                             help='number of worker processes (default: {})'.format(os.cpu_count()))
+    batch_group.add_argument('-o', '--output', metavar='PATH', type=Text,
+                             help='file to write one JSON record per contract to (default: stdout)')
+    batch_group.add_argument('--job-timeout', metavar='SEC', type=float, default=BATCH_JOB_TIMEOUT,
+                             help='wall-clock limit per contract (default: {})'.format(BATCH_JOB_TIMEOUT))
+    batch_group.add_argument('--adaptive', action='store_true',
+                             help='size the budget of each contract to its estimated cost and give the time saved '
+                                  'on cheap contracts to expensive ones')
+    batch_group.add_argument('--prefetch', metavar='N', type=int, default=RPC_PREFETCH_AHEAD,
+                             help='contracts read from the node ahead of their analysis, 0 reads each contract when '
+                                  'its analysis starts (default: {})'.format(RPC_PREFETCH_AHEAD))
+    batch_group.add_argument('--triage', action='store_true',
+                             help='cluster the near-duplicate contracts of a corpus and only analyze one contract '
+                                  'per cluster, the others take its results once verified statically (needs NumPy)')
+    batch_group.add_argument('--triage-threshold', metavar='SIMILARITY', type=float, default=TRIAGE_THRESHOLD,
+                             help='estimated similarity of the selectors and code of clustered contracts '
+                                  '(default: {})'.format(TRIAGE_THRESHOLD))
+
+    init_engine_arguments(parser)
+    init_signature_arguments(parser)
+    init_networking_arguments(parser)
+    init_proxy_arguments(parser)
+    init_compilation_arguments(parser)
+    init_cache_arguments(parser)
+
+def init_batch_input_arguments(parser: ArgumentParser, required: bool) -> None:
+    input_group = parser.add_mutually_exclusive_group(required=required)
+    input_group.add_argument('-m', '--manifest', metavar='PATH', type=Text,
+                             help='file listing one contract address or .bin/.sol path per line')
+    input_group.add_argument('-d', '--dir', metavar='PATH', type=Text, dest='directory',
+                             help='directory containing .bin/.sol files')
+    input_group.add_argument('-a', '--addresses', metavar='ADDRESS', type=Text, nargs='+',
+                             help='contract addresses to analyze')
+    input_group.add_argument('--corpus', metavar='PATH', type=Text,
+                             help='offline bytecode corpus, all of its contracts are analyzed')
+
+def init_corpus_parser(parser: ArgumentParser) -> None:
+    parser.add_argument('output', metavar='OUTPUT', type=Text, help='corpus file to write')
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('-d', '--dir', metavar='PATH', type=Text, dest='directory',
+                             help='directory of <address>.bin files containing runtime bytecode')
+    input_group.add_argument('--jsonl', metavar='PATH', type=Text,
+                             help='dump with one {"address": ..., "code": ...} object per line')
+
+def init_signatures_parser(parser: ArgumentParser) -> None:
+    parser.add_argument('output', metavar='OUTPUT', type=Text, help='signature index file to write')
+    parser.add_argument('dumps', metavar='DUMP', type=Text, nargs='+',
+                        help='4byte-style dump with a text signature per line, as plain text, CSV or JSON lines; '
+                             'the signatures of earlier dumps are preferred for colliding selectors')
+
+def init_bench_parser(parser: ArgumentParser) -> None:
+    input_group = parser.add_argument_group('benchmark contracts')
+    input_group.add_argument('--contracts', metavar='PATH', type=Text, default=DEFAULT_BENCH_CONTRACTS,
+                             help='directory of .bin/.sol contracts to benchmark (default: \'{}\')'
+                                  .format(DEFAULT_BENCH_CONTRACTS))
+    input_group.add_argument('--synthetic', metavar='F,S,L,C', type=Text, action='append',
+                             dest='synthetic_specs',
+                             help='synthetic contract with F functions, S storage slots, L loops and C access '
+                                  'checks, may be repeated (default: a family scaling each dimension)')
+    input_group.add_argument('--no-synthetic', action='store_false', dest='synthetic',
+                             help='only benchmark the contracts directory')
+    input_group.add_argument('--work-dir', metavar='PATH', type=Text,
+                             help='directory to write the synthetic contracts to (default: a temporary directory)')
+
+    run_group = parser.add_argument_group('benchmark arguments')
+    run_group.add_argument('--modules', metavar='MODULE', type=Text, nargs='+',
+                           help='analysis modules to run (default: {})'.format(' '.join(DEFAULT_MODULES)))
+    run_group.add_argument('--repeat', metavar='N', type=int, default=1,
+                           help='runs per contract, the run with the median wall time is reported (default: 1)')
+    run_group.add_argument('--no-saturation', action='store_false', dest='saturation',
+                           help='keep exploring functions all modules have already classified')
+    run_group.add_argument('--imports', action='store_true',
+                           help='also measure the time fresh interpreters take to import the CLI and the engines')
+    run_group.add_argument('-o', '--output', metavar='PATH', type=Text,
+                           help='file to write the JSON results to (default: stdout)')
+    run_group.add_argument('--baseline', metavar='PATH', type=Text,
+                           help='results of an earlier run to compare against, regressions exit with status 1')
+    run_group.add_argument('--threshold', metavar='PERCENT', type=float, default=DEFAULT_BENCH_THRESHOLD_PERCENT,
+                           help='relative change of wall time, peak RSS or states per second counted as a '
+                                'regression (default: {:g})'.format(DEFAULT_BENCH_THRESHOLD_PERCENT))
+    run_group.add_argument('--update-baseline', action='store_true',
+                           help='overwrite the baseline with the results of this run')
+
+    init_engine_arguments(parser)
+    init_compilation_arguments(parser)
+
+def init_serve_parser(parser: ArgumentParser) -> None:
+    listen_group = parser.add_argument_group('listening arguments')
+    listen_group.add_argument('--host', metavar='HOST', type=Text, default=SERVE_HOST,
+                              help='address to answer the HTTP API on (default: \'{}\')'.format(SERVE_HOST))
+    listen_group.add_argument('--port', metavar='PORT', type=int, default=SERVE_PORT,
+                              help='port to answer the HTTP API on (default: {})'.format(SERVE_PORT))
+    listen_group.add_argument('--socket', metavar='PATH', type=Text, dest='socket_path',
+                              help='answer the API on this Unix socket instead of --host and --port')
 
+    service_group = parser.add_argument_group('service arguments')
+    service_group.add_argument('-j', '--jobs', metavar='N', type=int, default=os.cpu_count(),
+                               help='number of worker processes (default: {})'.format(os.cpu_count()))
+    service_group.add_argument('--job-timeout', metavar='SEC', type=float, default=BATCH_JOB_TIMEOUT,
+                               help='default wall-clock limit per contract (default: {})'.format(BATCH_JOB_TIMEOUT))
+    service_group.add_argument('--adaptive', action='store_true',
+                               help='size the budget of each contract to its estimated cost by default')
+
+    init_engine_arguments(parser)
+    init_signature_arguments(parser)
+    init_networking_arguments(parser)
+    init_compilation_arguments(parser)
+    init_cache_arguments(parser)
+
+def init_campaign_parser(parser: ArgumentParser) -> None:
+    parser.add_argument('store', metavar='STORE', type=Text, help='SQLite job store of the campaign, created if missing')
+    init_batch_input_arguments(parser, required=False)
+
+    store_group = parser.add_argument_group('job store arguments')
+    store_group.add_argument('--status', action='store_true', help='print the number of jobs per status and exit')
+    store_group.add_argument('--export', metavar='PATH', type=Text,
+                             help='write the records of the finished jobs as JSON lines to PATH and exit')
+    store_group.add_argument('--retry', metavar='STATUS', nargs='+', choices=RETRY_STATUSES,
+                             help='make the jobs of these statuses pending again')
+    store_group.add_argument('--no-run', action='store_false', dest='run',
+                             help='only add or retry jobs, without running any')
+    store_group.add_argument('--lease', metavar='SEC', type=float, default=JOB_STORE_LEASE,
+                             help='seconds without heartbeat after which the jobs of a worker are claimed again '
+                                  '(default: {})'.format(JOB_STORE_LEASE))
+    store_group.add_argument('--max-attempts', metavar='N', type=int, default=JOB_STORE_MAX_ATTEMPTS,
+                             help='runs of a job lost with its worker before it is failed '
+                                  '(default: {})'.format(JOB_STORE_MAX_ATTEMPTS))
+
+    run_group = parser.add_argument_group('worker arguments')
+    run_group.add_argument('-j', '--jobs', metavar='N', type=int, default=os.cpu_count(),
+                           help='number of worker processes (default: {})'.format(os.cpu_count()))
+    run_group.add_argument('-o', '--output', metavar='PATH', type=Text,
+                           help='file to append the record of every job this worker runs to (default: none)')
+    run_group.add_argument('--job-timeout', metavar='SEC', type=float, default=BATCH_JOB_TIMEOUT,
+                           help='wall-clock limit per contract (default: {})'.format(BATCH_JOB_TIMEOUT))
+    run_group.add_argument('--adaptive', action='store_true',
+                           help='size the budget of each contract to its estimated cost and give the time saved '
+                                'on cheap contracts to expensive ones')
+    run_group.add_argument('--max-jobs', metavar='N', type=int, help='stop after running N jobs (default: all)')
+    run_group.add_argument('--worker-id', metavar='ID', type=Text,
+                           help='name of this worker in the store (default: <host>:<pid>)')
+
+    init_engine_arguments(parser)
+    init_signature_arguments(parser)
+    init_networking_arguments(parser)
+    init_compilation_arguments(parser)
+    init_cache_arguments(parser)
+
+def init_engine_arguments(parser: ArgumentParser) -> None:
+    engine_group = parser.add_argument_group('engine arguments')
+    engine_group.add_argument('--engine', choices=[ENGINE_SYMBOLIC, ENGINE_STATIC], default=ENGINE_SYMBOLIC,
+                              help='analysis engine, the static engine only pattern-matches the bytecode '
+                                   '(default: {})'.format(ENGINE_SYMBOLIC))
+    engine_group.add_argument('--fallback', action='store_true',
+                              help='run symbolic execution for the functions the static engine cannot decide')
+
+def init_signature_arguments(parser: ArgumentParser) -> None:
+    signature_group = parser.add_argument_group('signature arguments')
+    signature_group.add_argument('--signatures', metavar='PATH', type=Text,
+                                 help='signature index built with build-signatures, to label the findings with the '
+                                      'signatures of their functions')
+
+def init_proxy_arguments(parser: ArgumentParser) -> None:
+    proxy_group = parser.add_argument_group('proxy arguments')
+    proxy_group.add_argument('--no-proxies', action='store_false', dest='resolve_proxies',
+                             help='analyze the code of proxy contracts read from the node instead of the contracts '
+                                  'they delegate to')
+
+def init_networking_arguments(parser: ArgumentParser) -> None:
     networking_group = parser.add_argument_group('networking arguments')
     networking_group.add_argument('--rpc', metavar="RPC", type=Text, default=DEFAULT_RPC,
                                   help='JSON RPC provider URL (default: \'{}\')'.format(DEFAULT_RPC))
+    networking_group.add_argument('--rpc-cache', metavar='PATH', type=Text,
+                                  help='SQLite file caching code and storage read from the node (default: disabled)')
+    networking_group.add_argument('--block', metavar='NUMBER', type=int,
+                                  help='block to read the chain state at (default: latest block at start)')
 
+def init_compilation_arguments(parser: ArgumentParser) -> None:
     compilation_group = parser.add_argument_group('compilation arguments')
     compilation_group.add_argument('--solc', metavar='SOLC', type=Text, default=DEFAULT_SOLC,
                                    help='solc binary path (default: \'{}\')'.format(DEFAULT_SOLC))
+    compilation_group.add_argument('--contract', metavar='NAME', type=Text, dest='contract_name',
+                                   help='contract of the Solidity file to analyze (default: the last one defined)')
+    compilation_group.add_argument('--compile-cache', metavar='PATH', type=Text,
+                                   help='directory caching solc output by source, imports, compiler and settings '
+                                        '(default: disabled)')
+
+def init_cache_arguments(parser: ArgumentParser) -> None:
+    cache_group = parser.add_argument_group('cache arguments')
+    cache_group.add_argument('--cache-dir', metavar='PATH', type=Text,
+                             help='directory of the analysis result cache (default: disabled)')
+    cache_group.add_argument('--cache-max-size', metavar='MB', type=int, default=DEFAULT_CACHE_MAX_SIZE_MB,
+                             help='maximum size of the result cache (default: {})'.format(DEFAULT_CACHE_MAX_SIZE_MB))
+    cache_group.add_argument('--cache-max-age', metavar='HOURS', type=float, default=DEFAULT_CACHE_MAX_AGE_HOURS,
+                             help='maximum age of cached results (default: {})'.format(DEFAULT_CACHE_MAX_AGE_HOURS))
+    cache_group.add_argument('--smt-cache', metavar='PATH', type=Text,
+                             help='SQLite file caching solver verdicts across runs and contracts (default: disabled)')
+
+def get_result_cache(args) -> Optional[ResultCache]:
+    if not args.cache_dir:
+        return None
+    return ResultCache(args.cache_dir, max_size=args.cache_max_size * 1024 * 1024,
+                       max_age=args.cache_max_age * 60 * 60)
+
+def get_smt_cache(args):
+    if not args.smt_cache:
+        return None
+    from dolabra.analysis.smt_cache import SolverCache
+    return SolverCache(args.smt_cache)
 
+def cached_report(args) -> Optional[List]:
+    """ Looks up the report of a --bin contract in the result cache without importing the analysis engine. """
+    if not args.cache_dir or not args.bin_path or args.engine != ENGINE_SYMBOLIC or args.profile or args.checkpoint \
+            or args.resume:
+        return None
+    try:
+        with open(args.bin_path) as contract_bin:
+            bytecode = contract_bin.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    key = ResultCache.key(bytecode, DEFAULT_MODULES, timeout=args.timeout, max_depth=args.max_depth,
+                          bounded_loops_limit=BOUNDED_LOOPS_LIMIT,
+                          variant=analysis_variant(args.per_function, args.adaptive))
+    return get_result_cache(args).get(key) if key else None
+
+def label_report(args, report: List) -> List:
+    """ Labels the findings of a report with the signatures of their functions, with --signatures. """
+    if not args.signatures:
+        return report
+    from dolabra.analysis.signatures import open_signature_index
+    return open_signature_index(args.signatures).label_report(report)
+
+def stream_report(args, report, output) -> None:
+    findings_writer = FindingsWriter(output, contract=args.bin_path)
+    findings_writer.emit_report(report)
+    findings_writer.summary()
 
 def analyze(args) -> None:
+    report = cached_report(args)
+    if report is not None:
+        report = label_report(args, report)
+        if args.output == OUTPUT_JSONL and args.output_file:
+            with open(args.output_file, 'w') as output:
+                stream_report(args, report, output)
+        elif args.output == OUTPUT_JSONL:
+            stream_report(args, report, sys.stdout)
+        else:
+            pprint.pprint(report, width=1)
+        return
+
+    from dolabra.analysis.batch import run_batch, jobs_from_corpus
+    from dolabra.contract_loaders.loader import LoaderType, Loader
+
+    if args.all_addresses:
+        if not args.corpus:
+            raise ValueError('--all requires --corpus')
+        # The wall-clock limit of a contract keeps the slack the batch default leaves over the default --timeout
+        job_timeout = BATCH_JOB_TIMEOUT + args.timeout - DEFAULT_TIMEOUT_ANALYSIS
+        run_batch(jobs_from_corpus(args.corpus), sys.stdout, workers=args.jobs, job_timeout=job_timeout,
+                  timeout=args.timeout, result_cache=get_result_cache(args), engine=args.engine,
+                  symbolic_fallback=args.fallback, adaptive=args.adaptive, smt_cache=args.smt_cache,
+                  signatures=args.signatures)
+        return
+
     # Get the contract loader factory based on the specified options
-    if args.bin_path:
+    if args.corpus:
+        if not args.address:
+            raise ValueError('--corpus requires --address or --all')
+        contract_loader = Loader.get_contract(LoaderType.CORPUS, corpus=args.corpus, address=args.address)
+    elif args.bin_path:
         contract_loader = Loader.get_contract(LoaderType.BINARY, path=args.bin_path)
     elif args.sol_path:
-        contract_loader = Loader.get_contract(LoaderType.SOLIDITY, path=args.sol_path, solc=args.solc)
+        contract_loader = Loader.get_contract(LoaderType.SOLIDITY, path=args.sol_path, solc=args.solc,
+                                              contract_name=args.contract_name, compile_cache=args.compile_cache)
     elif args.address:
-        contract_loader = Loader.get_contract(LoaderType.JSON_RPC, address=args.address, rpc=args.rpc)
+        contract_loader = Loader.get_contract(LoaderType.JSON_RPC, address=args.address, rpc=args.rpc,
+                                              rpc_cache=args.rpc_cache, block=args.block)
     else:
         raise NotImplementedError('This feature is not available')
 
-    symbolic_analysis = SymbolicWrapper(contract_loader)
+    # The code of a proxy only forwards calls, its implementation is analyzed in its place
+    proxy = contract_loader.proxy() if args.address and not args.corpus and args.resolve_proxies else None
+    if proxy is not None:
+        contract_loader = Loader.get_contract(LoaderType.JSON_RPC, address=proxy.implementation, rpc=args.rpc,
+                                              rpc_cache=args.rpc_cache, block=args.block)
+
+    if args.output == OUTPUT_JSONL:
+        if args.output_file:
+            with open(args.output_file, 'w') as output:
+                stream_analysis(args, contract_loader, output, proxy)
+        else:
+            stream_analysis(args, contract_loader, sys.stdout, proxy)
+        return
+
+    if proxy is not None:
+        print('{} is a {} proxy, analyzing its implementation {}'.format(args.address, proxy.kind,
+                                                                           proxy.implementation))
+
+    if args.engine == ENGINE_STATIC:
+        from dolabra.analysis.static import StaticWrapper
+        static_analysis = StaticWrapper(contract_loader, DEFAULT_MODULES, symbolic_fallback=args.fallback,
+                                        result_cache=get_result_cache(args), signatures=args.signatures)
+        report = static_analysis.run_analysis()
+        pprint.pprint(report, width=1)
+        if static_analysis.undecided:
+            print('Undecided functions:')
+            pprint.pprint(static_analysis.undecided, width=1)
+        return
+
+    from dolabra.analysis.profiler import ModuleProfiler
+    from dolabra.analysis.symbolic import SymbolicWrapper
+    symbolic_analysis = SymbolicWrapper(contract_loader, result_cache=get_result_cache(args),
+                                        function_workers=args.jobs if args.per_function else None,
+                                        saturation=args.saturation,
+                                        profiler=ModuleProfiler() if args.profile else None,
+                                        timeout=args.timeout, max_depth=args.max_depth, adaptive=args.adaptive,
+                                        smt_cache=get_smt_cache(args), block_memo=args.block_memo,
+                                        checkpoint=args.checkpoint, resume=args.resume,
+                                        signatures=args.signatures)
     
     report = symbolic_analysis.run_analysis()
     pprint.pprint(report, width=1)
+    if args.profile:
+        symbolic_analysis.profiler.write(args.profile)
+
+def stream_analysis(args, contract_loader, output, proxy=None) -> None:
+    findings_writer = FindingsWriter(output, contract=args.address or args.bin_path or args.sol_path,
+                                     proxy=proxy._asdict() if proxy is not None else None)
+    try:
+        if args.engine == ENGINE_STATIC:
+            from dolabra.analysis.static import StaticWrapper
+            static_analysis = StaticWrapper(contract_loader, DEFAULT_MODULES, symbolic_fallback=args.fallback,
+                                            result_cache=get_result_cache(args), signatures=args.signatures)
+            findings_writer.emit_report(static_analysis.run_analysis())
+        else:
+            from dolabra.analysis.profiler import ModuleProfiler
+            from dolabra.analysis.symbolic import SymbolicWrapper
+            profiler = ModuleProfiler() if args.profile else None
+            SymbolicWrapper(contract_loader, result_cache=get_result_cache(args),
+                            function_workers=args.jobs if args.per_function else None,
+                            findings_writer=findings_writer, saturation=args.saturation,
+                            profiler=profiler, timeout=args.timeout, max_depth=args.max_depth,
+                            adaptive=args.adaptive, smt_cache=get_smt_cache(args),
+                            block_memo=args.block_memo, checkpoint=args.checkpoint,
+                            resume=args.resume, signatures=args.signatures).run_analysis()
+            if profiler is not None:
+                profiler.write(args.profile)
+    except Exception as e:
+        findings_writer.summary(status='error', error=str(e) or type(e).__name__)
+        raise
+    findings_writer.summary()
+
+def collect_jobs(args) -> List:
+    """ Creates the batch jobs of the input arguments, none without input. """
+    from dolabra.analysis.batch import (
+        expand_solidity_jobs,
+        jobs_from_addresses,
+        jobs_from_corpus,
+        jobs_from_directory,
+        jobs_from_manifest
+    )
+
+    if args.manifest:
+        jobs = jobs_from_manifest(args.manifest, rpc=args.rpc, solc=args.solc, rpc_cache=args.rpc_cache,
+                                  block=args.block)
+    elif args.directory:
+        jobs = jobs_from_directory(args.directory, solc=args.solc)
+    elif args.addresses:
+        jobs = jobs_from_addresses(args.addresses, rpc=args.rpc, rpc_cache=args.rpc_cache, block=args.block)
+    elif args.corpus:
+        jobs = jobs_from_corpus(args.corpus)
+    else:
+        return []
+    # Compile all Solidity files at once and analyze every contract they define
+    return expand_solidity_jobs(jobs, solc=args.solc, compile_cache=args.compile_cache)
+
+def merge_followers(followers: Dict, new_followers: Dict) -> None:
+    for name, names in new_followers.items():
+        followers.setdefault(name, []).extend(names)
+
+def analyze_batch(args) -> None:
+    from dolabra.analysis.batch import run_batch
+
+    jobs = collect_jobs(args)
+    followers, proxies = {}, None
+    if args.resolve_proxies:
+        from dolabra.analysis.batch import resolve_proxy_jobs
+        proxy_plan = resolve_proxy_jobs(jobs)
+        jobs, proxies = proxy_plan.jobs, proxy_plan.proxies
+        merge_followers(followers, proxy_plan.followers)
+    if args.triage:
+        from dolabra.analysis.triage import triage_jobs
+        plan = triage_jobs(jobs, threshold=args.triage_threshold)
+        jobs = plan.jobs
+        # An implementation demoted by triage brings its proxies along, see *run_batch*
+        merge_followers(followers, plan.followers)
+    result_cache = get_result_cache(args)
+    if args.output:
+        with open(args.output, 'w') as output:
+            run_batch(jobs, output, workers=args.jobs, job_timeout=args.job_timeout, result_cache=result_cache,
+                      engine=args.engine, symbolic_fallback=args.fallback, adaptive=args.adaptive,
+                      smt_cache=args.smt_cache, signatures=args.signatures, followers=followers,
+                      proxies=proxies, prefetch=args.prefetch)
+    else:
+        run_batch(jobs, sys.stdout, workers=args.jobs, job_timeout=args.job_timeout, result_cache=result_cache,
+                  engine=args.engine, symbolic_fallback=args.fallback, adaptive=args.adaptive,
+                  smt_cache=args.smt_cache, signatures=args.signatures, followers=followers,
+                  proxies=proxies, prefetch=args.prefetch)
+
+def build(args) -> None:
+    from dolabra.contract_loaders.corpus_loader import build_corpus, entries_from_directory, entries_from_jsonl
+
+    entries = entries_from_directory(args.directory) if args.directory else entries_from_jsonl(args.jsonl)
+    count = build_corpus(args.output, entries)
+    print('Packed {} contracts into {}'.format(count, args.output))
+
+def build_signatures(args) -> None:
+    from dolabra.analysis.signatures import build_signature_index, signatures_from_dump
+
+    signatures = (signature for dump in args.dumps for signature in signatures_from_dump(dump))
+    count = build_signature_index(args.output, signatures)
+    print('Packed {} signatures into {}'.format(count, args.output))
+
+def bench(args) -> None:
+    from dolabra.benchmark.imports import measure_imports
+    from dolabra.benchmark.suite import benchmark_jobs, compare, run_benchmark
+    from dolabra.benchmark.synthetic import SyntheticSpec, default_family
+
+    specs = None
+    if args.synthetic:
+        specs = [SyntheticSpec.parse(spec) for spec in args.synthetic_specs or []] or default_family()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='dolabra-bench-')
+    jobs = benchmark_jobs(args.contracts, specs, work_dir=work_dir, solc=args.solc, compile_cache=args.compile_cache)
+    if not jobs:
+        raise ValueError('No contracts to benchmark')
+
+    results = run_benchmark(jobs, args.modules or DEFAULT_MODULES, engine=args.engine,
+                            symbolic_fallback=args.fallback, saturation=args.saturation, repeat=max(args.repeat, 1))
+    if args.imports:
+        results['imports'] = measure_imports(repeat=max(args.repeat, 1))
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            results['comparison'] = compare(results, json.load(baseline_file), args.threshold / 100)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.baseline and (args.update_baseline or not os.path.exists(args.baseline)):
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    regressions = results.get('comparison', {}).get('regressions')
+    if regressions:
+        for regression in regressions:
+            print('Regression in {case}: {metric} {baseline} -> {current}'.format(**regression), file=sys.stderr)
+        exit(1)
+
+def serve(args) -> None:
+    from dolabra.analysis.service import AnalysisService
+    from dolabra.cli.server import serve as serve_api
+
+    service = AnalysisService(workers=args.jobs, job_timeout=args.job_timeout, result_cache=get_result_cache(args),
+                              engine=args.engine, symbolic_fallback=args.fallback, adaptive=args.adaptive,
+                              rpc=args.rpc, rpc_cache=args.rpc_cache, block=args.block, solc=args.solc,
+                              compile_cache=args.compile_cache, smt_cache=args.smt_cache,
+                              signatures=args.signatures)
+    serve_api(service, args.host, args.port, socket_path=args.socket_path)
+
+def campaign(args) -> None:
+    from dolabra.analysis.job_store import JobStore, run_campaign
+
+    store = JobStore(args.store, lease=args.lease, max_attempts=args.max_attempts)
+    if args.status:
+        print(json.dumps(store.counts()))
+        return
+    if args.export:
+        with open(args.export, 'w') as export_file:
+            for record in store.records():
+                export_file.write(json.dumps(record) + '\n')
+        return
+    jobs = collect_jobs(args)
+    if jobs:
+        print('Added {} of {} jobs to {}'.format(store.add(jobs), len(jobs), args.store), file=sys.stderr)
+    if args.retry:
+        print('Made {} jobs pending again'.format(store.requeue(args.retry)), file=sys.stderr)
+    if not args.run:
+        return
+
+    options = dict(workers=args.jobs, job_timeout=args.job_timeout, result_cache=get_result_cache(args),
+                   engine=args.engine, symbolic_fallback=args.fallback, adaptive=args.adaptive,
+                   smt_cache=args.smt_cache, worker=args.worker_id, max_jobs=args.max_jobs,
+                   signatures=args.signatures)
+    if args.output:
+        with open(args.output, 'a') as output:
+            run_campaign(store, output, **options)
+    else:
+        run_campaign(store, **options)
+    print(json.dumps(store.counts()), file=sys.stderr)
 
 def main():
     parser = init_parser()
     args = parser.parse_args()
+    if args.command:
+        from dolabra.logger.log_manager import setup_logger
+        setup_logger()
 
     if args.command == 'analyze':
         analyze(args)
+    elif args.command == 'analyze-batch':
+        analyze_batch(args)
+    elif args.command == 'build-corpus':
+        build(args)
+    elif args.command == 'build-signatures':
+        build_signatures(args)
+    elif args.command == 'bench':
+        bench(args)
+    elif args.command == 'serve':
+        serve(args)
+    elif args.command == 'campaign':
+        campaign(args)
     else:
         parser.print_help()
         exit(1)
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, Optional, Text
+
+from dolabra.analysis.service import AnalysisService
+
+log = logging.getLogger(__name__)
+
+# Seconds an event stream waits for new events before checking that the client is still there
+STREAM_POLL_INTERVAL = 15
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the analysis service:
+
+    POST /jobs              queue a job, see *AnalysisService*, returns its id
+    GET  /jobs              list the jobs
+    GET  /jobs/<id>         state of a job and, once finished, its record
+    GET  /jobs/<id>/events  stream the findings of a job as JSON lines, ending with a summary line
+    GET  /status            queue depth and per-worker utilization
+    """
+
+    @property
+    def service(self) -> AnalysisService:
+        return self.server.service
+
+    def do_POST(self) -> None:
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('A job must be a JSON object')
+            job = self.service.submit(request)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        # A job finished and forgotten right away is described by its id alone
+        self._send_json(202, self.service.describe(job.id) or {'id': job.id})
+
+    def do_GET(self) -> None:
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['status']:
+            self._send_json(200, self.service.status())
+        elif parts == ['jobs']:
+            self._send_json(200, {'jobs': self.service.describe_jobs()})
+        elif len(parts) == 2 and parts[0] == 'jobs' and self.service.job(parts[1]) is not None:
+            self._send_json(200, self.service.describe(parts[1], with_record=True) or {'id': parts[1]})
+        elif (len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events'
+              and self.service.job(parts[1]) is not None):
+            self._stream_events(parts[1])
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _send_json(self, code: int, body: Dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream_events(self, job_id: Text) -> None:
+        # No Content-Length, the stream ends when the connection is closed after the summary line
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        sent = 0
+        done = False
+        try:
+            while not done:
+                events, done = self.service.wait_events(job_id, sent, timeout=STREAM_POLL_INTERVAL)
+                for event in events:
+                    self.wfile.write((json.dumps(event) + '\n').encode())
+                sent += len(events)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug('Client of the events of job %s went away', job_id)
+        self.close_connection = True
+
+    def address_string(self) -> Text:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args) -> None:
+        log.debug('%s - %s', self.address_string(), format % args)
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: AnalysisService):
+        self.service = service
+        super().__init__(address, ServiceRequestHandler)
+
+
+class ServiceUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Text, service: AnalysisService):
+        self.service = service
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, ServiceRequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def serve(service: AnalysisService, host: Text, port: int, socket_path: Optional[Text] = None) -> None:
+    """ Starts *service* and answers its API on *socket_path*, or on *host*:*port*, until interrupted. """
+    service.start()
+    # Only now, the workers keep the default handler so terminating the pool still stops them
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    if socket_path:
+        server = ServiceUnixServer(socket_path, service)
+        log.info('Listening on %s', socket_path)
+    else:
+        server = ServiceHTTPServer((host, port), service)
+        log.info('Listening on http://%s:%d', *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info('Shutting down the analysis service')
+    finally:
+        server.server_close()
+        service.close()
@@ -1,4 +1,92 @@
 # SymbolicWrapper constants
+DEFAULT_MODULES = ['Getter', 'Setter']
 TIMEOUT = 60
 MAX_DEPTH = 128
-BOUNDED_LOOPS_LIMIT = 3
\ No newline at end of file
+BOUNDED_LOOPS_LIMIT = 3
+
+# Analysis engines
+ENGINE_SYMBOLIC = 'symbolic'
+ENGINE_STATIC = 'static'
+
+# Batch analysis constants
+BATCH_JOB_TIMEOUT = 300
+
+# Result cache constants
+RESULT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+RESULT_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+RESULT_CACHE_EVICTION_INTERVAL = 64
+
+# JSON-RPC client constants
+RPC_POOL_SIZE = 8
+RPC_MAX_RETRIES = 3
+RPC_BATCH_SIZE = 100
+# Storage slots fetched together with the code of a contract, most simple contracts keep their state there
+RPC_PREFETCH_SLOTS = 8
+# Contracts of a batch loaded ahead of their analysis, on top of those being analyzed
+RPC_PREFETCH_AHEAD = 32
+# Contracts the prefetch stage of a batch loads at once
+RPC_PREFETCH_CONCURRENCY = 16
+
+# Benchmark constants
+BENCH_FORMAT_VERSION = 1
+# Relative change of a metric against the baseline counted as a regression
+BENCH_REGRESSION_THRESHOLD = 0.1
+
+# Adaptive budget constants, the fixed limits above are the upper bounds
+BUDGET_MIN_TIMEOUT = 5
+BUDGET_BASE_SECONDS = 2
+BUDGET_SECONDS_PER_FUNCTION = 1.5
+BUDGET_SECONDS_PER_BACK_EDGE = 2
+BUDGET_BYTES_PER_SECOND = 1000
+BUDGET_STORAGE_WEIGHT = 10
+# Share of the budget given to the shallow pass and its limits
+BUDGET_SHALLOW_SHARE = 0.4
+BUDGET_SHALLOW_MAX_DEPTH = 64
+BUDGET_SHALLOW_LOOPS_LIMIT = 2
+# Functions with less of their code covered by the shallow pass are explored again
+BUDGET_COVERAGE_TARGET = 0.9
+
+# Analysis service constants
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 7550
+# Finished jobs kept for their results, the oldest are forgotten first
+SERVE_MAX_FINISHED_JOBS = 1000
+# Jobs a worker runs before it is replaced by a fresh process, bounding what a long-lived worker accumulates
+SERVE_MAX_TASKS_PER_CHILD = 100
+# Seconds between checks of the workers running jobs, and past its timeout before a job is given up
+SERVE_LIVENESS_INTERVAL = 5
+SERVE_DEADLINE_GRACE = 60
+
+# SMT query cache constants
+SMT_CACHE_MAX_ENTRIES = 1000000
+# New verdicts are written to disk in batches of this many
+SMT_CACHE_FLUSH_INTERVAL = 256
+# Verdicts a process keeps in memory in front of the database
+SMT_CACHE_MEMORY_ENTRIES = 65536
+
+# Campaign job store constants
+# Seconds after the last heartbeat the jobs of a worker are given to other workers
+JOB_STORE_LEASE = 120
+JOB_STORE_HEARTBEAT_INTERVAL = 30
+# Seconds past its timeout, and the time it may borrow, before a running job is given up
+JOB_STORE_DEADLINE_GRACE = 60
+# Runs of a job lost with its worker before it is failed
+JOB_STORE_MAX_ATTEMPTS = 3
+# Seconds to wait for the lock of the database held by other workers
+JOB_STORE_BUSY_TIMEOUT = 60
+
+# Block memo constants
+# Recorded blocks kept per symbolic execution, all are dropped once there are more
+BLOCK_MEMO_MAX_ENTRIES = 65536
+
+# Checkpoint constants
+CHECKPOINT_FORMAT_VERSION = 1
+
+# Triage constants
+TRIAGE_SELECTOR_PERMUTATIONS = 64
+TRIAGE_SHINGLE_PERMUTATIONS = 64
+# Rows per band of the locality-sensitive hashing, fewer rows compare more pairs
+TRIAGE_BAND_SIZE = 4
+TRIAGE_SHINGLE_SIZE = 4
+# Estimated Jaccard similarity above which contracts are clustered
+TRIAGE_THRESHOLD = 0.8
@@ -1,12 +1,63 @@
 import logging
-from typing import Text
+from typing import Optional, Text
 
+from mythril.disassembler.asm import disassemble
 from mythril.ethereum.evmcontract import EVMContract
+from mythril.support.opcodes import OPCODES, STACK
 
 from dolabra.contract_loaders.file_loader import FileLoader
 
 log = logging.getLogger(__name__)
 
+BLOCK_BOUNDARIES = ('JUMPDEST', 'JUMP', 'JUMPI', 'STOP', 'RETURN', 'REVERT', 'INVALID', 'SELFDESTRUCT')
+
+def runtime_code(creation_code: Text) -> Optional[Text]:
+    """
+    Recovers the runtime code from contract creation code by looking for the constructor returning a CODECOPY
+    of a constant code region. Returns None if no such pattern is found.
+    """
+    code = creation_code[2:] if creation_code.startswith('0x') else creation_code
+    try:
+        instructions = disassemble(bytes.fromhex(code))
+    except ValueError:
+        return None
+
+    # Evaluate the constant stack arguments within each basic block, unknown values are None
+    stack = []
+    copied = None
+    for instruction in instructions:
+        opcode = instruction['opcode']
+        if opcode in BLOCK_BOUNDARIES:
+            if opcode == 'RETURN' and copied is not None and len(stack) >= 2 and stack[-1] == copied[0]:
+                offset, length = copied[1], copied[2]
+                if length and (offset + length) * 2 <= len(code):
+                    return code[offset * 2:(offset + length) * 2]
+            stack = []
+            copied = None
+        elif opcode.startswith('PUSH'):
+            try:
+                stack.append(int(instruction['argument'], 16))
+            except (KeyError, ValueError):
+                stack.append(None)
+        elif opcode.startswith('DUP'):
+            depth = int(opcode[3:])
+            stack.append(stack[-depth] if len(stack) >= depth else None)
+        elif opcode.startswith('SWAP'):
+            depth = int(opcode[4:]) + 1
+            if len(stack) >= depth:
+                stack[-1], stack[-depth] = stack[-depth], stack[-1]
+            else:
+                stack = []
+        elif opcode == 'CODECOPY':
+            arguments = stack[-3:][::-1] if len(stack) >= 3 else [None] * 3
+            copied = arguments if None not in arguments else None
+            del stack[-3:]
+        else:
+            pops, pushes = OPCODES[opcode][STACK] if opcode in OPCODES else (0, 0)
+            del stack[len(stack) - min(pops, len(stack)):]
+            stack.extend([None] * pushes)
+    return None
+
 class BinaryLoader(FileLoader):
     def __init__(self, path: Text) -> None:
         super().__init__(path)
@@ -18,7 +69,8 @@ class BinaryLoader(FileLoader):
         except IOError as e:
             log.error('Failed to open contract binary file: %s', e)
             raise IOError('Failed to open contract binary file')
-        return EVMContract(creation_code=bytecode)
+        bytecode = bytecode.strip()
+        return EVMContract(code=runtime_code(bytecode) or '', creation_code=bytecode)
 
     @classmethod
     def create(cls, **options):
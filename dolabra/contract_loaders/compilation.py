@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import re
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Text
+
+from mythril.exceptions import CompilerError
+
+from dolabra.analysis.cache import ResultCache
+
+log = logging.getLogger(__name__)
+
+# Bump whenever the layout of the stored compilation outputs changes
+COMPILATION_FORMAT_VERSION = 1
+DEFAULT_SOLC_SETTINGS = {'optimizer': {'enabled': False}}
+OUTPUT_SELECTION = {'*': {'*': ['evm.bytecode.object', 'evm.deployedBytecode.object']}}
+IMPORT_PATTERN = re.compile(r'^\s*import\s+(?:[^;"\']*?\s+from\s+)?["\']([^"\']+)["\']', re.MULTILINE)
+
+
+class CompiledContract(NamedTuple):
+    name: Text
+    creation_code: Text
+    runtime_code: Text
+
+
+@lru_cache(maxsize=None)
+def solc_version(solc_binary: Text = 'solc') -> Text:
+    """ Returns the version reported by *solc_binary*, which is part of every compilation key. """
+    try:
+        output = subprocess.run([solc_binary, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                check=True).stdout.decode()
+    except FileNotFoundError:
+        raise CompilerError('Compiler not found. Make sure that solc is installed and in PATH, '
+                            'or pass its path with --solc.')
+    except subprocess.CalledProcessError as e:
+        raise CompilerError('Could not query the solc version: %s' % e.stderr.decode().strip())
+    for line in output.splitlines():
+        if line.startswith('Version:'):
+            return line.split(':', 1)[1].strip()
+    return output.strip()
+
+
+def _file_hash(path: Path) -> Text:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _resolve_import(source: Path, name: Text) -> Optional[Path]:
+    """ Resolves an import path the way solc does for relative imports; other paths are tried from the working directory. """
+    candidates = [source.parent / name] if name.startswith('.') else [Path(name), source.parent / name]
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate.resolve()
+    return None
+
+
+def source_imports(path: Path) -> Dict[Text, Optional[Path]]:
+    """ Returns every import reachable from the source at *path*, mapped to its file or None when it cannot be found. """
+    imports: Dict[Text, Optional[Path]] = {}
+    visited: Set[Path] = set()
+    work_list = [Path(path).resolve()]
+    while work_list:
+        source = work_list.pop()
+        if source in visited:
+            continue
+        visited.add(source)
+        for name in IMPORT_PATTERN.findall(source.read_text(errors='replace')):
+            resolved = _resolve_import(source, name)
+            key = str(resolved) if resolved is not None else name
+            if key not in imports:
+                imports[key] = resolved
+                if resolved is not None:
+                    work_list.append(resolved)
+    return imports
+
+
+def compilation_key(path: Path, solc_binary: Text = 'solc', settings: Optional[Dict] = None) -> Text:
+    """ Keys the compilation of *path* by its content, the contents of its imports, the solc version and settings. """
+    imports = sorted((name, _file_hash(resolved) if resolved is not None else None)
+                     for name, resolved in source_imports(path).items())
+    key = json.dumps([COMPILATION_FORMAT_VERSION, _file_hash(Path(path)), imports, solc_version(solc_binary),
+                      settings or DEFAULT_SOLC_SETTINGS])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class CompilationCache(ResultCache):
+    """ On-disk cache of the contracts compiled from a source file, see *compilation_key*. """
+
+    def contracts(self, key: Text) -> Optional[List[CompiledContract]]:
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return [CompiledContract(*contract) for contract in entry]
+
+    def put_contracts(self, key: Text, contracts: List[CompiledContract]) -> None:
+        self.put(key, [list(contract) for contract in contracts])
+
+
+def compile_sources(paths: Iterable[Path], solc_binary: Text = 'solc',
+                    settings: Optional[Dict] = None) -> Dict[Path, List[CompiledContract]]:
+    """ Compiles *paths* with a single solc invocation and returns the contracts defined in each of them. """
+    sources = {str(path): Path(path) for path in paths}
+    solc_settings = dict(settings or DEFAULT_SOLC_SETTINGS)
+    solc_settings['outputSelection'] = OUTPUT_SELECTION
+    input_json = json.dumps({'language': 'Solidity',
+                             'sources': {name: {'urls': [name]} for name in sources},
+                             'settings': solc_settings})
+    try:
+        process = subprocess.run([solc_binary, '--standard-json', '--allow-paths', '.,/'],
+                                 input=input_json.encode(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise CompilerError('Compiler not found. Make sure that solc is installed and in PATH, '
+                            'or pass its path with --solc.')
+    try:
+        output = json.loads(process.stdout.decode())
+    except ValueError:
+        raise CompilerError('Unexpected solc output: %s' % process.stderr.decode().strip())
+    errors = [error['formattedMessage'] for error in output.get('errors', []) if error.get('severity') == 'error']
+    if errors:
+        raise CompilerError('Solc experienced a fatal error.\n\n%s' % '\n'.join(errors))
+
+    compiled = {}
+    for name, path in sources.items():
+        contracts = output.get('contracts', {}).get(name, {})
+        compiled[path] = [CompiledContract(contract_name, contract['evm']['bytecode']['object'],
+                                           contract['evm']['deployedBytecode']['object'])
+                          for contract_name, contract in sorted(contracts.items())]
+    return compiled
+
+
+class SolidityCompiler:
+    """
+    Compiles Solidity sources through an optional *CompilationCache*. Sources missing from the cache are compiled
+    together in one solc invocation; if that fails, they are compiled one by one so a broken file only loses itself.
+    """
+
+    def __init__(self, solc_binary: Text = 'solc', cache: Optional[CompilationCache] = None,
+                 settings: Optional[Dict] = None):
+        self.solc_binary = solc_binary or 'solc'
+        self.cache = cache
+        self.settings = settings
+
+    def compile(self, paths: Iterable[Path]) -> Dict[Path, List[CompiledContract]]:
+        paths = [Path(path) for path in paths]
+        compiled: Dict[Path, List[CompiledContract]] = {}
+        keys: Dict[Path, Text] = {}
+        if self.cache is not None:
+            for path in paths:
+                keys[path] = compilation_key(path, self.solc_binary, self.settings)
+                contracts = self.cache.contracts(keys[path])
+                if contracts is not None:
+                    compiled[path] = contracts
+        missing = [path for path in paths if path not in compiled]
+        if missing:
+            log.info('Compiling %d Solidity sources, %d found in the cache', len(missing), len(compiled))
+            compiled.update(self._compile_missing(missing))
+            if self.cache is not None:
+                for path in missing:
+                    if path in compiled:
+                        self.cache.put_contracts(keys[path], compiled[path])
+        return compiled
+
+    def _compile_missing(self, paths: List[Path]) -> Dict[Path, List[CompiledContract]]:
+        if len(paths) == 1:
+            return compile_sources(paths, self.solc_binary, self.settings)
+        try:
+            return compile_sources(paths, self.solc_binary, self.settings)
+        except CompilerError as e:
+            log.warning('Compiling the sources together failed, compiling them one by one: %s', e)
+        compiled = {}
+        for path in paths:
+            try:
+                compiled.update(compile_sources([path], self.solc_binary, self.settings))
+            except CompilerError as e:
+                log.error('Failed to compile %s: %s', path, e)
+        return compiled
+
+
+def select_contract(contracts: List[CompiledContract], name: Optional[Text] = None) -> Optional[CompiledContract]:
+    """ Picks the contract called *name*, or like mythril the last deployable contract in name order. """
+    deployable = [contract for contract in contracts if contract.runtime_code]
+    if name is not None:
+        return next((contract for contract in deployable if contract.name == name), None)
+    return deployable[-1] if deployable else None
@@ -0,0 +1,203 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Text, Tuple, Union
+
+from mythril.disassembler.disassembly import Disassembly
+from mythril.laser.ethereum.state.world_state import WorldState
+from mythril.support.support_utils import sha3
+
+from dolabra.contract_loaders.contract_loader import ContractLoader
+
+log = logging.getLogger(__name__)
+
+# Layout: header | concatenated code | index sorted by address
+# header: magic, number of index records, offset of the index
+# index record: address, keccak hash of the code, offset and length of the code
+CORPUS_MAGIC = b'DLBCRP01'
+HEADER = struct.Struct('<8sQQ')
+RECORD = struct.Struct('<20s32sQI')
+ADDRESS_SIZE = 20
+
+
+def _address_bytes(address: Union[Text, int]) -> bytes:
+    if isinstance(address, int):
+        return address.to_bytes(ADDRESS_SIZE, 'big')
+    address = address[2:] if address.startswith('0x') else address
+    raw = bytes.fromhex(address.rjust(2 * ADDRESS_SIZE, '0'))
+    if len(raw) != ADDRESS_SIZE:
+        raise ValueError('Invalid contract address: "%s"' % address)
+    return raw
+
+
+def _code_bytes(code: Text) -> bytes:
+    code = code.strip()
+    return bytes.fromhex(code[2:] if code.startswith('0x') else code)
+
+
+class Corpus:
+    """
+    Read-only view of a packed bytecode corpus.
+
+    The file is memory-mapped, so every process analyzing the same corpus shares the page cache
+    instead of reading its own copy. Lookups binary search the address index.
+    """
+
+    def __init__(self, path: Union[Text, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as corpus_file:
+            self._map = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != CORPUS_MAGIC:
+            raise ValueError('Not a bytecode corpus: "%s"' % self.path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, position: int) -> Tuple[bytes, bytes, int, int]:
+        return RECORD.unpack_from(self._map, self._index_offset + position * RECORD.size)
+
+    def _address_at(self, position: int) -> bytes:
+        start = self._index_offset + position * RECORD.size
+        return self._map[start:start + ADDRESS_SIZE]
+
+    def _find(self, address: bytes) -> Optional[int]:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._address_at(middle) < address:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._address_at(low) == address:
+            return low
+        return None
+
+    def code(self, address: Union[Text, int]) -> Optional[bytes]:
+        position = self._find(_address_bytes(address))
+        if position is None:
+            return None
+        _, _, offset, length = self._record(position)
+        return self._map[offset:offset + length]
+
+    def code_hash(self, address: Union[Text, int]) -> Optional[Text]:
+        position = self._find(_address_bytes(address))
+        if position is None:
+            return None
+        return '0x' + self._record(position)[1].hex()
+
+    def addresses(self) -> Iterator[Text]:
+        for position in range(self.count):
+            yield '0x' + self._address_at(position).hex()
+
+    def close(self) -> None:
+        self._map.close()
+
+
+# One mapping per corpus and process, shared by all loaders of the process
+_open_corpora: Dict[Text, Corpus] = {}
+
+
+def open_corpus(path: Union[Text, Path]) -> Corpus:
+    key = os.path.realpath(str(path))
+    corpus = _open_corpora.get(key)
+    if corpus is None:
+        corpus = _open_corpora[key] = Corpus(key)
+    return corpus
+
+
+def build_corpus(output: Union[Text, Path], entries: Iterable[Tuple[Text, Text]]) -> int:
+    """
+    Packs (address, runtime code) pairs into a corpus file at *output*. Identical code is stored once.
+    Returns the number of addresses in the corpus.
+    """
+    index: Dict[bytes, Tuple[bytes, int, int]] = {}
+    stored: Dict[bytes, Tuple[int, int]] = {}
+    tmp_path = Path(str(output) + '.tmp')
+    with open(tmp_path, 'wb') as corpus_file:
+        corpus_file.write(HEADER.pack(CORPUS_MAGIC, 0, 0))
+        offset = HEADER.size
+        for address, code in entries:
+            try:
+                address_key = _address_bytes(address)
+                code_key = _code_bytes(code)
+            except ValueError as e:
+                log.warning('Skipping %s: %s', address, e)
+                continue
+            if not code_key:
+                continue
+            if address_key in index:
+                log.warning('Skipping duplicate address %s', address)
+                continue
+            code_hash = sha3(code_key)
+            if code_hash not in stored:
+                corpus_file.write(code_key)
+                stored[code_hash] = (offset, len(code_key))
+                offset += len(code_key)
+            index[address_key] = (code_hash,) + stored[code_hash]
+
+        for address_key in sorted(index):
+            code_hash, code_offset, length = index[address_key]
+            corpus_file.write(RECORD.pack(address_key, code_hash, code_offset, length))
+        corpus_file.seek(0)
+        corpus_file.write(HEADER.pack(CORPUS_MAGIC, len(index), offset))
+    os.replace(tmp_path, output)
+    log.info('Packed %d addresses with %d distinct codes into %s', len(index), len(stored), output)
+    return len(index)
+
+
+def entries_from_directory(directory: Union[Text, Path]) -> Iterator[Tuple[Text, Text]]:
+    """ Yields the runtime code of every <address>.bin file below *directory*. """
+    for path in sorted(Path(directory).rglob('*.bin')):
+        with open(path) as code_file:
+            yield path.stem, code_file.read()
+
+
+def entries_from_jsonl(dump: Union[Text, Path]) -> Iterator[Tuple[Text, Text]]:
+    """ Yields the runtime code of a JSONL dump with one {"address": ..., "code": ...} object per line. """
+    with open(dump) as dump_file:
+        for line in dump_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            code = entry.get('code', entry.get('bytecode'))
+            if code:
+                yield entry['address'], code
+
+
+class CorpusLoader(ContractLoader):
+    def __init__(self, corpus_path: Union[Text, Path], address: Text):
+        assert address is not None, "No contract address provided"
+        self._corpus_path = str(corpus_path)
+        self._address = address
+
+    @property
+    def corpus(self) -> Corpus:
+        return open_corpus(self._corpus_path)
+
+    @property
+    def address(self) -> Text:
+        return self._address
+
+    def disassembly(self) -> Optional[Disassembly]:
+        code = self.corpus.code(self.address)
+        if code is None:
+            log.error('Address %s is not part of the corpus %s', self.address, self._corpus_path)
+            return None
+        return Disassembly(code.hex())
+
+    def world_state(self) -> WorldState:
+        """ Returns a world state holding just the contract, with symbolic storage and an empty balance. """
+        disassembly = self.disassembly()
+        if disassembly is None:
+            raise ValueError('Address %s is not part of the corpus' % self.address)
+        world_state = WorldState()
+        world_state.create_account(address=int(self.address, 16), code=disassembly)
+        return world_state
+
+    @classmethod
+    def create(cls, **options):
+        return cls(options.get('corpus'), options.get('address'))
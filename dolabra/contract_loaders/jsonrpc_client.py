@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Text, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from mythril.ethereum.interface.rpc.base_client import BaseClient
+from mythril.ethereum.interface.rpc.client import GETH_DEFAULT_RPC_PORT
+from mythril.ethereum.interface.rpc.exceptions import (
+    BadJsonError,
+    BadResponseError,
+    BadStatusCodeError,
+    ConnectionError,
+)
+
+from dolabra.constants import RPC_POOL_SIZE, RPC_MAX_RETRIES, RPC_BATCH_SIZE
+
+log = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = 'application/json'
+BLOCK_TAG_LATEST = 'latest'
+# Pseudo slots under which code and balance are cached next to the storage slots of an account
+CODE_SLOT = 'code'
+BALANCE_SLOT = 'balance'
+
+CacheKey = Tuple[int, int, Text, Text]
+
+
+class RpcCache:
+    """
+    Persistent cache of chain data keyed by (chain id, block number, address, slot).
+
+    Values at a fixed block never change, so entries are never invalidated.
+    """
+
+    def __init__(self, path: Union[Text, Path]):
+        self.path = Path(path)
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), timeout=30)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS chain_data (chain_id INTEGER, block INTEGER, '
+                                     'address TEXT, slot TEXT, value TEXT, PRIMARY KEY (chain_id, block, address, slot))')
+        return self._connection
+
+    def get(self, key: CacheKey) -> Optional[Text]:
+        row = self.connection.execute('SELECT value FROM chain_data WHERE chain_id = ? AND block = ? AND address = ? '
+                                      'AND slot = ?', key).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, entries: Iterable[Tuple[CacheKey, Text]]) -> None:
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO chain_data VALUES (?, ?, ?, ?, ?)',
+                                        [key + (value,) for key, value in entries])
+
+    def __getstate__(self):
+        return {'path': self.path, '_connection': None}
+
+
+class PooledJsonRpc(BaseClient):
+    """
+    JSON-RPC client for mythril's DynLoader with keep-alive connection pooling, batch requests and caching.
+
+    The first read pins 'latest' to the current block number, so every value of an analysis comes from the same
+    block and can be cached. Code, balances and storage slots are kept in memory and, given an *RpcCache*, on disk.
+    Hits, misses and HTTP round trips are counted in *stats*.
+    """
+
+    def __init__(self, host: Text = 'localhost', port: Optional[int] = GETH_DEFAULT_RPC_PORT, tls: bool = False, path: Text = '',
+                 cache: Optional[RpcCache] = None, block: Union[Text, int] = BLOCK_TAG_LATEST):
+        scheme = 'https' if tls else 'http'
+        self.url = '{}://{}{}{}'.format(scheme, host, ':{}'.format(port) if port else '', path)
+        self.cache = cache
+        self.block = block
+        self.stats = Counter()
+        self._chain_id: Optional[int] = None
+        self._memory: Dict[CacheKey, Text] = {}
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=RPC_POOL_SIZE, pool_maxsize=RPC_POOL_SIZE,
+                                  max_retries=RPC_MAX_RETRIES)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        return self._session
+
+    def __getstate__(self):
+        # Sessions and locks do not survive pickling, workers open their own connections
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _post(self, payload: Union[Dict, List]) -> Union[Dict, List]:
+        self.stats['requests'] += 1
+        log.debug('rpc send: %s', payload)
+        try:
+            response = self.session.post(self.url, headers={'Content-Type': JSON_MEDIA_TYPE}, data=json.dumps(payload))
+        except RequestsConnectionError:
+            raise ConnectionError
+        if response.status_code // 100 != 2:
+            raise BadStatusCodeError(response.status_code)
+        try:
+            return response.json()
+        except ValueError:
+            raise BadJsonError(response.text)
+
+    def _request(self, method: Text, params: List) -> Dict:
+        with self._lock:
+            self._next_id += 1
+            return {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': self._next_id}
+
+    @staticmethod
+    def _result(response: Dict):
+        try:
+            return response['result']
+        except (KeyError, TypeError):
+            raise BadResponseError(response)
+
+    def _call(self, method, params=None, _id=1):
+        params = params or []
+        key = self._cache_key(method, params)
+        if key is None:
+            return self._result(self._post(self._request(method, params)))
+        value = self._cached(key)
+        if value is None:
+            value = self._result(self._post(self._request(method, self._pinned(method, params))))
+            self._store([(key, value)])
+        return value
+
+    def batch_requests(self, calls: List[Tuple[Text, List]]) -> Dict[int, Dict]:
+        """ The requests of *calls* by their id, to be sent as a single batch. """
+        requests_by_id = {}
+        for method, params in calls:
+            request = self._request(method, params)
+            requests_by_id[request['id']] = request
+        return requests_by_id
+
+    def batch_results(self, requests_by_id: Dict[int, Dict], responses: Union[Dict, List]) -> Optional[List]:
+        """ The results of the batch *requests_by_id* in order, None when the node rejected the batch. """
+        if not isinstance(responses, list):
+            # Some nodes do not implement batches and answer with a single error object
+            log.debug('Batch request rejected, falling back to single requests: %s', responses)
+            return None
+        by_id = {response.get('id'): response for response in responses if isinstance(response, dict)}
+        return [self._result(by_id.get(request_id)) for request_id in requests_by_id]
+
+    def batch(self, calls: List[Tuple[Text, List]]) -> List:
+        """ Sends *calls* as JSON-RPC batches and returns their results in order. """
+        results = []
+        for start in range(0, len(calls), RPC_BATCH_SIZE):
+            requests_by_id = self.batch_requests(calls[start:start + RPC_BATCH_SIZE])
+            found = self.batch_results(requests_by_id, self._post(list(requests_by_id.values())))
+            if found is None:
+                found = [self._result(self._post(request)) for request in requests_by_id.values()]
+            results.extend(found)
+        return results
+
+    @staticmethod
+    def _account_calls(address: Text, slots: Iterable[int], code: bool, balance: bool) -> List[Tuple[Text, List]]:
+        calls = []
+        if code:
+            calls.append(('eth_getCode', [address, BLOCK_TAG_LATEST]))
+        if balance:
+            calls.append(('eth_getBalance', [address, BLOCK_TAG_LATEST]))
+        calls.extend(('eth_getStorageAt', [address, hex(slot), BLOCK_TAG_LATEST]) for slot in sorted(set(slots)))
+        return calls
+
+    def prefetch_keys(self, address: Text, slots: Iterable[int] = (), code: bool = True,
+                      balance: bool = True) -> List[CacheKey]:
+        """ The cache keys of the values *prefetch* loads, code first. """
+        return [self._cache_key(method, params) for method, params in self._account_calls(address, slots, code, balance)]
+
+    def prefetch_calls(self, address: Text, slots: Iterable[int] = (), code: bool = True,
+                       balance: bool = True) -> List[Tuple[CacheKey, Text, List]]:
+        """ The cache key, method and pinned parameters of the calls loading the values *prefetch* would load. """
+        missing = []
+        for method, params in self._account_calls(address, slots, code, balance):
+            key = self._cache_key(method, params)
+            if self._cached(key, count=False) is None:
+                missing.append((key, method, self._pinned(method, params)))
+        return missing
+
+    def prefetch(self, address: Text, slots: Iterable[int] = (), code: bool = True, balance: bool = True) -> None:
+        """ Loads the code, balance and storage *slots* of *address* that are not cached yet in a single batch. """
+        missing = self.prefetch_calls(address, slots, code, balance)
+        if not missing:
+            return
+        log.debug('Prefetching %d values of %s', len(missing), address)
+        values = self.batch([(method, params) for _, method, params in missing])
+        self.store(missing, values)
+
+    def store(self, calls: List[Tuple[CacheKey, Text, List]], values: List) -> None:
+        """ Caches the *values* loaded by the *prefetch_calls* *calls*. """
+        self._store([(key, value) for (key, _, _), value in zip(calls, values)])
+        self.stats['prefetched'] += len(calls)
+
+    def cached(self, key: CacheKey) -> Optional[Text]:
+        return self._cached(key, count=False)
+
+    def preload(self, entries: Iterable[Tuple[CacheKey, Text]]) -> None:
+        """
+        Keeps values loaded by another client in memory, e.g. by the prefetch stage of a batch. Their chain
+        becomes the chain of this client; values of other blocks than the pinned one are never read.
+        """
+        entries = [(tuple(key), value) for key, value in entries]
+        if entries and self._chain_id is None:
+            self._chain_id = entries[0][0][0]
+        self._memory.update(entries)
+
+    def call(self, to: Text, data: Text) -> Text:
+        """ Result of an eth_call of *to* with the calldata *data* at the pinned block, not cached. """
+        return self._call('eth_call', [{'to': to, 'data': data}, hex(self.block_number)])
+
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            try:
+                self._chain_id = int(self._result(self._post(self._request('eth_chainId', []))), 16)
+            except BadResponseError:
+                # Nodes predating EIP-695 only know the network id
+                self._chain_id = int(self._result(self._post(self._request('net_version', []))))
+        return self._chain_id
+
+    @property
+    def block_number(self) -> int:
+        if not isinstance(self.block, int):
+            self.block = self.eth_blockNumber() if self.block == BLOCK_TAG_LATEST else int(self.block, 16)
+            log.info('Reading chain data at block %d', self.block)
+        return self.block
+
+    def _cache_key(self, method: Text, params: List) -> Optional[CacheKey]:
+        if method == 'eth_getCode':
+            address, slot = params[0], CODE_SLOT
+        elif method == 'eth_getBalance':
+            address, slot = params[0], BALANCE_SLOT
+        elif method == 'eth_getStorageAt':
+            address, slot = params[0], hex(int(params[1], 16))
+        else:
+            return None
+        return self.chain_id, self.block_number, address.lower(), slot
+
+    def _pinned(self, method: Text, params: List) -> List:
+        """ Replaces the block tag of a cacheable call by the pinned block number. """
+        return [params[0].lower()] + list(params[1:-1]) + [hex(self.block_number)]
+
+    def _cached(self, key: CacheKey, count: bool = True) -> Optional[Text]:
+        value = self._memory.get(key)
+        if value is None and self.cache is not None:
+            value = self.cache.get(key)
+            if value is not None:
+                self._memory[key] = value
+        if count:
+            self.stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def _store(self, entries: List[Tuple[CacheKey, Text]]) -> None:
+        self._memory.update(entries)
+        if self.cache is not None:
+            self.cache.put_many(entries)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+class AsyncHttpTransport:
+    """
+    Posts JSON-RPC payloads over keep-alive HTTP/1.1 connections with asyncio streams, for stages that keep many
+    requests in flight from a single thread. At most *connections* requests are sent at once; idle connections
+    are reused, and a request failing on a dropped connection is sent again on a new one.
+    """
+
+    def __init__(self, url: Text, connections: int = RPC_POOL_SIZE):
+        parts = urlsplit(url)
+        self.tls = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.tls else 80)
+        self.path = parts.path or '/'
+        self.connections = connections
+        self.requests = 0
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def post(self, payload: Union[Dict, List]) -> Union[Dict, List]:
+        if self._semaphore is None:
+            # Created in the loop of the first request
+            self._semaphore = asyncio.Semaphore(self.connections)
+        body = json.dumps(payload).encode()
+        request = ('POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n\r\n'
+                   .format(self.path, self.host, JSON_MEDIA_TYPE, len(body)).encode() + body)
+        async with self._semaphore:
+            self.requests += 1
+            for attempt in range(RPC_MAX_RETRIES + 1):
+                connection = self._idle.pop() if self._idle else None
+                try:
+                    if connection is None:
+                        connection = await asyncio.open_connection(self.host, self.port, ssl=self.tls or None)
+                    status, response, keep_alive = await self._exchange(connection, request)
+                except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                    if connection is not None:
+                        connection[1].close()
+                    if attempt == RPC_MAX_RETRIES:
+                        raise ConnectionError from e
+                    continue
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    connection[1].close()
+                break
+        if status // 100 != 2:
+            raise BadStatusCodeError(status)
+        try:
+            return json.loads(response)
+        except ValueError:
+            raise BadJsonError(response.decode(errors='replace'))
+
+    @staticmethod
+    async def _exchange(connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter],
+                        request: bytes) -> Tuple[int, bytes, bool]:
+        """ Sends *request* and reads the status, body and whether the connection stays open of the response. """
+        reader, writer = connection
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the node')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        keep_alive = status_line.startswith(b'HTTP/1.1') and headers.get('connection') != 'close'
+        if headers.get('transfer-encoding') == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    # Skips the trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, bytes(body), keep_alive
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
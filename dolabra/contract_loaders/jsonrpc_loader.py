@@ -1,32 +1,49 @@
 import logging
 import re
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from mythril.ethereum.interface.rpc.client import EthJsonRpc
 from mythril.disassembler.disassembly import Disassembly
 from mythril.support.loader import DynLoader
 
 from dolabra.contract_loaders.contract_loader import ContractLoader
+from dolabra.contract_loaders.jsonrpc_client import CacheKey, PooledJsonRpc, RpcCache
+from dolabra.contract_loaders.proxy import Proxy, resolve_proxy
+from dolabra.constants import RPC_PREFETCH_SLOTS
 
 log = logging.getLogger(__name__)
 
+def rpc_client(rpc: Optional[str] = None, rpc_cache: Optional[str] = None,
+               block: Optional[int] = None) -> PooledJsonRpc:
+    """ The client of the JSON RPC provider URL *rpc*, caching into the SQLite file *rpc_cache*. """
+    cache = RpcCache(rpc_cache) if rpc_cache else None
+    if rpc is None:
+        eth_json_rpc = PooledJsonRpc(cache=cache)
+    else:
+        match = re.match(r'(http(s)?:\/\/)?([a-zA-Z0-9\.\-]+)(:([0-9]+))?(\/.+)?', rpc)
+        if match:
+            host = match.group(3)
+            port = match.group(5) if match.group(4) else None
+            path = match.group(6) if match.group(6) else ''
+            tls = bool(match.group(2))
+            log.debug('Parsed RPC provider params: host=%s, port=%s, tls=%r, path=%s', host, port, tls, path)
+            eth_json_rpc = PooledJsonRpc(host=host, port=port, tls=tls, path=path, cache=cache)
+        else:
+            raise Exception('Invalid JSON RPC URL provided: "%s"' % rpc)
+    if block is not None:
+        eth_json_rpc.block = block
+    return eth_json_rpc
+
+
 class JsonRpcLoader(ContractLoader):
-    def __init__(self, address: str, rpc: Optional[str] = None):
+    def __init__(self, address: str, rpc: Optional[str] = None, rpc_cache: Optional[str] = None,
+                 block: Optional[int] = None, prefetched: Optional[List[Tuple[CacheKey, str]]] = None):
         assert address is not None, "No contract address provided"
 
-        if rpc is None:
-            eth_json_rpc = EthJsonRpc()
-        else:
-            match = re.match(r'(http(s)?:\/\/)?([a-zA-Z0-9\.\-]+)(:([0-9]+))?(\/.+)?', rpc)
-            if match:
-                host = match.group(3)
-                port = match.group(5) if match.group(4) else None
-                path = match.group(6) if match.group(6) else ''
-                tls = bool(match.group(2))
-                log.debug('Parsed RPC provider params: host=%s, port=%s, tls=%r, path=%s', host, port, tls, path)
-                eth_json_rpc = EthJsonRpc(host=host + path, port=port, tls=tls)
-            else:
-                raise Exception('Invalid JSON RPC URL provided: "%s"' % rpc)
+        eth_json_rpc = rpc_client(rpc, rpc_cache, block)
+        if prefetched:
+            # Loaded ahead by the prefetch stage of a batch, see *PrefetchPipeline*
+            eth_json_rpc.preload(prefetched)
+        self._rpc = eth_json_rpc
         self._dyn_loader = DynLoader(eth_json_rpc)
         self._address = address
 
@@ -38,9 +55,37 @@ class JsonRpcLoader(ContractLoader):
     def address(self) -> str:
         return self._address
 
+    @property
+    def rpc_stats(self) -> Dict[str, int]:
+        """ Cache hits and misses and the number of HTTP round trips to the node. """
+        return dict(self._rpc.stats)
+
+    def prefetch(self, slots: Iterable[int]) -> None:
+        """ Loads the given storage slots of the contract with a single batch request. """
+        self._rpc.prefetch(self.address, slots, code=False, balance=False)
+
     def disassembly(self) -> Optional[Disassembly]:
+        # Code, balance and the lowest storage slots arrive in one round trip
+        self._rpc.prefetch(self.address, range(RPC_PREFETCH_SLOTS))
         return self.dyn_loader.dynld(self.address)
-    
+
+    def proxy(self) -> Optional[Proxy]:
+        """ The implementation the contract delegates to when it is a known kind of proxy, see *resolve_proxy*. """
+        self._rpc.prefetch(self.address, range(RPC_PREFETCH_SLOTS))
+        code = self._rpc.eth_getCode(self.address)
+        return resolve_proxy(self._rpc, self.address, bytes.fromhex(code[2:] if code.startswith('0x') else code))
+
+    def loaded_options(self) -> Dict:
+        """
+        Options of *create* reading the contract at the same block, carrying the code, balance and lowest storage
+        slots read so far, so another loader, e.g. of a batch worker, does not read them again.
+        """
+        keys = self._rpc.prefetch_keys(self.address, range(RPC_PREFETCH_SLOTS))
+        values = [(key, self._rpc.cached(key)) for key in keys]
+        return {'block': self._rpc.block_number,
+                'prefetched': [(key, value) for key, value in values if value is not None]}
+
     @classmethod
     def create(cls, **options):
-        return cls(options.get('address'), options.get('rpc'))
+        return cls(options.get('address'), options.get('rpc'), rpc_cache=options.get('rpc_cache'),
+                   block=options.get('block'), prefetched=options.get('prefetched'))
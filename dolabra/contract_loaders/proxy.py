@@ -0,0 +1,110 @@
+import logging
+from typing import Dict, NamedTuple, Optional, Text
+
+# eth_hash rather than mythril's sha3, so the slots are known without importing mythril
+from eth_hash.auto import keccak
+
+log = logging.getLogger(__name__)
+
+PROXY_EIP1167 = 'eip1167'
+PROXY_EIP1967 = 'eip1967'
+PROXY_EIP1967_BEACON = 'eip1967-beacon'
+PROXY_ZEPPELINOS = 'zeppelinos'
+PROXY_EIP1822 = 'eip1822'
+
+# EIP-1167 runtime: CALLDATACOPY the call, PUSH<n> <implementation>, DELEGATECALL it and return or revert its result.
+# Implementations at vanity addresses are pushed with fewer than 20 bytes.
+MINIMAL_PROXY_PREFIX = bytes.fromhex('363d3d373d3d3d363d')
+MINIMAL_PROXY_BODY = bytes.fromhex('5af43d82803e903d9160')
+MINIMAL_PROXY_SUFFIX = bytes.fromhex('57fd5bf3')
+PUSH1 = 0x60
+PUSH20 = 0x73
+PUSH32 = 0x7f
+DELEGATECALL = 0xf4
+ADDRESS_SIZE = 20
+
+
+def _slot(name: Text, offset: int = 0) -> int:
+    return int.from_bytes(keccak(name.encode()), 'big') - offset
+
+
+# Well-known storage slots holding the implementation of a delegating proxy, in the order they are tried
+IMPLEMENTATION_SLOTS: Dict[Text, int] = {
+    PROXY_EIP1967: _slot('eip1967.proxy.implementation', 1),
+    PROXY_EIP1967_BEACON: _slot('eip1967.proxy.beacon', 1),
+    PROXY_ZEPPELINOS: _slot('org.zeppelinos.proxy.implementation'),
+    PROXY_EIP1822: _slot('PROXIABLE'),
+}
+# implementation() of an EIP-1967 beacon
+BEACON_IMPLEMENTATION_SELECTOR = '0x5c60da1b'
+
+
+class Proxy(NamedTuple):
+    """ A proxy contract and the contract it delegates its calls to. """
+    kind: Text
+    implementation: Text
+
+
+def _address(word: Optional[Text]) -> Optional[Text]:
+    """ The address in the lowest 20 bytes of the hex encoded *word*, None for an empty or zero word. """
+    if not word or word == '0x':
+        return None
+    value = int(word, 16) & ((1 << 8 * ADDRESS_SIZE) - 1)
+    return '0x%040x' % value if value else None
+
+
+def minimal_proxy_implementation(code: bytes) -> Optional[Text]:
+    """ The implementation of the EIP-1167 minimal proxy *code*, None for other code. """
+    if not code.startswith(MINIMAL_PROXY_PREFIX) or len(code) <= len(MINIMAL_PROXY_PREFIX):
+        return None
+    push = code[len(MINIMAL_PROXY_PREFIX)]
+    if not PUSH1 <= push <= PUSH20:
+        return None
+    start = len(MINIMAL_PROXY_PREFIX) + 1
+    end = start + push - PUSH1 + 1
+    body = code[end:]
+    if (len(body) != len(MINIMAL_PROXY_BODY) + 1 + len(MINIMAL_PROXY_SUFFIX)
+            or not body.startswith(MINIMAL_PROXY_BODY) or not body.endswith(MINIMAL_PROXY_SUFFIX)):
+        return None
+    return _address('0x' + code[start:end].hex())
+
+
+def delegates_calls(code: bytes) -> bool:
+    """ Whether *code* has a DELEGATECALL instruction, bytes of PUSH data aside. """
+    # Most code has no 0xf4 byte at all, the instructions are only walked when it does
+    if DELEGATECALL not in code:
+        return False
+    position = 0
+    while position < len(code):
+        opcode = code[position]
+        if opcode == DELEGATECALL:
+            return True
+        position += opcode - PUSH1 + 2 if PUSH1 <= opcode <= PUSH32 else 1
+    return False
+
+
+def resolve_proxy(rpc, address: Text, code: bytes) -> Optional[Proxy]:
+    """
+    Detects whether *address*, running *code*, is a proxy, and resolves its implementation through the
+    *PooledJsonRpc* client *rpc*. Minimal proxies are recognized by their code; code that can delegate calls
+    has the well-known implementation slots of *IMPLEMENTATION_SLOTS* read in a single batch.
+    """
+    implementation = minimal_proxy_implementation(code)
+    if implementation is not None:
+        return Proxy(PROXY_EIP1167, implementation)
+    if not delegates_calls(code):
+        return None
+
+    rpc.prefetch(address, IMPLEMENTATION_SLOTS.values(), code=False, balance=False)
+    for kind, slot in IMPLEMENTATION_SLOTS.items():
+        implementation = _address(rpc.eth_getStorageAt(address, slot))
+        if implementation is None:
+            continue
+        if kind == PROXY_EIP1967_BEACON:
+            implementation = _address(rpc.call(implementation, BEACON_IMPLEMENTATION_SELECTOR))
+            if implementation is None:
+                log.warning('Beacon of proxy %s has no implementation', address)
+                continue
+        log.info('%s is a %s proxy of %s', address, kind, implementation)
+        return Proxy(kind, implementation)
+    return None
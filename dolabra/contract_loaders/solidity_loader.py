@@ -2,22 +2,44 @@ from pathlib import Path
 from typing import Union, Optional
 
 from mythril.ethereum.evmcontract import EVMContract
+from mythril.exceptions import NoContractFoundError
 from mythril.solidity.soliditycontract import SolidityContract
 
 from dolabra.contract_loaders.file_loader import FileLoader
+from dolabra.contract_loaders.compilation import CompilationCache, SolidityCompiler, select_contract
 
 class SolidityLoader(FileLoader):
-    def __init__(self, file_path: Union[str, Path], solc: Optional[str] = 'solc'):
+    def __init__(self, file_path: Union[str, Path], solc: Optional[str] = 'solc', contract_name: Optional[str] = None,
+                 compile_cache: Optional[str] = None):
         super().__init__(file_path)
         self._solc = solc
+        self._contract_name = contract_name
+        self._compile_cache = compile_cache
+        self._contract: Optional[EVMContract] = None
 
     def contract(self) -> EVMContract:
-        return SolidityContract(str(self._file_path), solc_binary=self._solc)
-    
-    @classmethod
-    def create(cls, **options):
-        return cls(options.get('path'), solc=options.get('solc'))
+        # Compile once per loader, the disassembly and the analysis ask for the contract separately
+        if self._contract is None:
+            self._contract = self._compile()
+        return self._contract
 
-    
+    def _compile(self) -> EVMContract:
+        if self._compile_cache is None:
+            return SolidityContract(str(self._file_path), name=self._contract_name, solc_binary=self._solc)
+        compiler = SolidityCompiler(self._solc, cache=CompilationCache(self._compile_cache))
+        contracts = compiler.compile([self._file_path]).get(self._file_path, [])
+        compiled = select_contract(contracts, self._contract_name)
+        if compiled is None:
+            raise NoContractFoundError
+        return EVMContract(code=compiled.runtime_code, creation_code=compiled.creation_code, name=compiled.name)
 
+    def __getstate__(self):
+        # Workers compile, or read the compilation cache, on their own
+        state = self.__dict__.copy()
+        state['_contract'] = None
+        return state
 
+    @classmethod
+    def create(cls, **options):
+        return cls(options.get('path'), solc=options.get('solc'), contract_name=options.get('contract_name'),
+                   compile_cache=options.get('compile_cache'))
@@ -9,9 +9,15 @@ PYTHON_REQUIREMENT = '>=3.7.0'
 REQUIREMENTS = [
     "Jinja2==2.11.2",
     "mythril==0.23.17",
+    "eth-hash>=0.3.1,<0.4.0",
     "colorama==0.4.3",
+    "importlib_metadata; python_version<'3.8'",
 ]
 
+EXTRAS_REQUIREMENTS = {
+    "triage": ["numpy"],
+}
+
 setup(
     name="dolabra",
     version=VERSION,
@@ -35,6 +41,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=REQUIREMENTS,
+    extras_require=EXTRAS_REQUIREMENTS,
     python_requires=PYTHON_REQUIREMENT,
     entry_points={
         'console_scripts': [
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Text, Tuple
+
+import pytest
+
+from dolabra.benchmark.synthetic import SyntheticSpec, selector
+
+# Runtime code of a contract reading slots 0 and 0x20: PUSH1 0 SLOAD PUSH1 0x20 SLOAD STOP
+CONTRACT_CODE = '0x600054602054' + '00'
+CONTRACT_ADDRESS = '0x' + '11' * 20
+SLOW_ADDRESS = '0x' + '22' * 20
+
+MODULES = ['Getter', 'Setter', 'Payable', 'StorageCallerCheck']
+
+
+def expected_findings(spec: SyntheticSpec) -> Dict[Text, set]:
+    """ The dispatched functions of the synthetic contract of *spec* each module should report. """
+    names = ['_function_0x%08x' % selector(index) for index in range(spec.functions)]
+    return {'Getter': set(names[0::2]),
+            'Setter': set(names[1::2]),
+            'Payable': set(names),
+            'StorageCallerCheck': set(names[:spec.checks])}
+
+
+class StubNode:
+    """
+    JSON-RPC node on a local port serving fixed chain data over HTTP/1.1, with switches for the behaviours
+    of real nodes the clients have to cope with: chunked bodies, closed connections, dropped requests and
+    rejected batches.
+    """
+
+    def __init__(self, codes: Optional[Dict[Text, Text]] = None, storage: Optional[Dict[Tuple[Text, int], int]] = None,
+                 block: int = 0x100, chain_id: int = 1):
+        self.codes = {address.lower(): code for address, code in (codes or {}).items()}
+        self.storage = storage or {}
+        # Results of eth_call by called address and calldata
+        self.calls: Dict[Tuple[Text, Text], Text] = {}
+        self.block = block
+        self.chain_id = chain_id
+        # Answers with a chunked body instead of a Content-Length
+        self.chunked = False
+        # Answers with Connection: close and closes the connection after every response
+        self.close_connections = False
+        # Number of the next requests whose connection is closed without an answer
+        self.drop_requests = 0
+        # Seconds to wait before answering a request reading an address
+        self.delays: Dict[Text, float] = {}
+        # Answers batches with a single error object, like nodes not implementing them
+        self.reject_batches = False
+        self.connections = 0
+        self.posts = 0
+        self.methods = Counter()
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> Text:
+        return 'http://127.0.0.1:%d' % self.port
+
+    def start(self) -> 'StubNode':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def answer(self, request: Dict) -> Dict:
+        method, params = request['method'], request.get('params', [])
+        with self._lock:
+            self.methods[method] += 1
+            self.requests.append(request)
+        if method == 'eth_chainId':
+            result = hex(self.chain_id)
+        elif method == 'eth_blockNumber':
+            result = hex(self.block)
+        elif method == 'eth_getCode':
+            result = self.codes.get(params[0].lower(), '0x')
+        elif method == 'eth_getBalance':
+            result = '0x0'
+        elif method == 'eth_getStorageAt':
+            result = '0x%064x' % self.storage.get((params[0].lower(), int(params[1], 16)), 0)
+        elif method == 'eth_call':
+            result = self.calls.get((params[0]['to'].lower(), params[0]['data']), '0x')
+        else:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': -32601, 'message': 'Unknown method'}}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with node._lock:
+                    node.connections += 1
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with node._lock:
+                    node.posts += 1
+                    dropped = node.drop_requests > 0
+                    node.drop_requests -= dropped
+                if dropped:
+                    self.close_connection = True
+                    return
+                if isinstance(payload, list) and node.reject_batches:
+                    rejection = {'jsonrpc': '2.0', 'id': None,
+                                 'error': {'code': -32600, 'message': 'Batch requests are not supported'}}
+                    self._send(json.dumps(rejection).encode())
+                    return
+                requests = payload if isinstance(payload, list) else [payload]
+                delay = max((node.delays.get(str(request.get('params', [''])[0]).lower(), 0) for request in requests
+                             if request.get('params')), default=0)
+                time.sleep(delay)
+                answers = [node.answer(request) for request in requests]
+                self._send(json.dumps(answers if isinstance(payload, list) else answers[0]).encode())
+
+            def _send(self, body: bytes) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if node.close_connections:
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+                if node.chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    middle = len(body) // 2
+                    for chunk in (body[:middle], body[middle:]):
+                        self.wfile.write(b'%x;note=stub\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.write(b'0\r\nX-Trailer: 1\r\n\r\n')
+                else:
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def rpc_node():
+    node = StubNode(codes={CONTRACT_ADDRESS: CONTRACT_CODE, SLOW_ADDRESS: CONTRACT_CODE},
+                    storage={(CONTRACT_ADDRESS, 0): 1}).start()
+    yield node
+    node.stop()
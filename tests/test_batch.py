@@ -0,0 +1,26 @@
+from multiprocessing import Value
+
+from dolabra.analysis import batch
+from dolabra.analysis.batch import STATUS_OK, BatchJob, _run_job
+from dolabra.analysis.cache import ResultCache
+from dolabra.benchmark.synthetic import SyntheticSpec, creation_code
+from dolabra.contract_loaders.loader import LoaderType
+
+
+def test_cached_jobs_leave_the_time_bank_alone(tmp_path, monkeypatch):
+    path = tmp_path / 'contract.bin'
+    path.write_text(creation_code(SyntheticSpec(functions=2, slots=1)).hex())
+    job = BatchJob('contract', LoaderType.BINARY, {'path': str(path)})
+    time_bank = Value('d', 0.0)
+    monkeypatch.setattr(batch, '_time_bank', time_bank)
+    result_cache = ResultCache(tmp_path / 'cache')
+
+    # The analysis leaves most of its timeout unused
+    record = _run_job(job, result_cache=result_cache, adaptive=True, timeout=30)
+    assert record['status'] == STATUS_OK
+    saved = time_bank.value
+    assert 30 - record['wall_time'] <= saved < 30
+
+    cached = _run_job(job, result_cache=result_cache, adaptive=True, timeout=30)
+    assert cached['results'] == record['results']
+    assert time_bank.value == saved
@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+from dolabra.analysis.cache import ResultCache, analysis_variant
+from dolabra.analysis.symbolic import SymbolicWrapper
+from dolabra.benchmark.synthetic import SyntheticSpec, creation_code
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+BYTECODE = '0x600054602054' + '00'
+REPORT = [[{'contract': 'Unknown', 'pattern': 'Getter', 'function_name': '_function_0x12345678'}]]
+
+
+def test_key_covers_code_and_settings():
+    key = ResultCache.key(BYTECODE, ['Getter', 'Setter'])
+    assert key == ResultCache.key(BYTECODE[2:] + '\n', ['Setter', 'Getter'])
+    assert key != ResultCache.key(BYTECODE + '00', ['Getter', 'Setter'])
+    assert key != ResultCache.key(BYTECODE, ['Getter'])
+    assert key != ResultCache.key(BYTECODE, ['Getter', 'Setter'], timeout=1)
+    assert key != ResultCache.key(BYTECODE, ['Getter', 'Setter'], variant=analysis_variant(adaptive=True))
+    assert (ResultCache.key(BYTECODE, ['Getter'], variant=analysis_variant(selectors=[1]))
+            != ResultCache.key(BYTECODE, ['Getter'], variant=analysis_variant(selectors=[1], exclude=True)))
+    assert ResultCache.key('not hex', ['Getter']) is None
+
+
+def test_entries_round_trip_and_expire(tmp_path):
+    cache = ResultCache(tmp_path, max_age=60)
+    key = ResultCache.key(BYTECODE, ['Getter'])
+    assert cache.get(key) is None
+    cache.put(key, REPORT)
+    assert cache.get(key) == REPORT
+
+    path = cache._path(key)
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_unreadable_entries_are_dropped(tmp_path):
+    cache = ResultCache(tmp_path)
+    key = ResultCache.key(BYTECODE, ['Getter'])
+    cache.put(key, REPORT)
+    cache._path(key).write_text('{"truncated": ')
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    keys = [ResultCache.key(BYTECODE, ['Getter'], timeout=timeout) for timeout in range(3)]
+    cache = ResultCache(tmp_path)
+    for age, key in zip((30, 20, 10), keys):
+        cache.put(key, REPORT)
+        os.utime(cache._path(key), (time.time() - age, time.time() - age))
+    # Reading the oldest entry makes it the most recently used
+    cache.get(keys[0])
+    cache.max_size = 2 * cache._path(keys[0]).stat().st_size
+    cache.evict()
+    assert [cache._path(key).exists() for key in keys] == [True, False, True]
+
+
+def test_symbolic_analysis_reads_its_cached_report(tmp_path, monkeypatch):
+    path = tmp_path / 'contract.bin'
+    path.write_text(creation_code(SyntheticSpec(functions=2, slots=1)).hex())
+
+    def analyze(white_list):
+        wrapper = SymbolicWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)),
+                                  result_cache=ResultCache(tmp_path / 'cache'))
+        wrapper.white_list = white_list
+        return wrapper.run_analysis()
+
+    report = analyze(['Getter', 'Setter'])
+    assert len(list((tmp_path / 'cache').rglob('*.json'))) == 1
+
+    def run_pass(*args, **kwargs):
+        raise AssertionError('Cached analysis ran symbolic execution')
+
+    monkeypatch.setattr(SymbolicWrapper, '_run_pass', run_pass)
+    assert analyze(['Setter', 'Getter']) == report
+    # Other settings miss the cache
+    with pytest.raises(AssertionError, match='ran symbolic execution'):
+        analyze(['Getter'])
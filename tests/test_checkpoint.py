@@ -0,0 +1,43 @@
+from dolabra.analysis.cache import ResultCache
+from dolabra.analysis.symbolic import SymbolicWrapper
+from dolabra.benchmark.synthetic import SyntheticSpec, creation_code
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+
+def findings(report):
+    return sorted((result['pattern'], result['function_name']) for results in report for result in results)
+
+
+def analyze(path, **kwargs):
+    wrapper = SymbolicWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)), **kwargs)
+    return wrapper, findings(wrapper.run_analysis())
+
+
+def looping_contract(tmp_path):
+    # A calldata-bounded loop keeps the execution busy past the timeout
+    path = tmp_path / 'looping.bin'
+    path.write_text(creation_code(SyntheticSpec(functions=2, slots=1, loops=1)).hex())
+    return path
+
+
+def test_timeout_checkpoint_round_trips(tmp_path):
+    path = looping_contract(tmp_path)
+    checkpoint_path = tmp_path / 'looping.checkpoint'
+
+    interrupted, first = analyze(path, timeout=1, checkpoint=str(checkpoint_path))
+    assert interrupted.checkpointer.taken
+    assert checkpoint_path.exists()
+
+    _, resumed = analyze(path, timeout=60, resume=str(checkpoint_path))
+    _, uninterrupted = analyze(path, timeout=60)
+    assert set(first) <= set(resumed)
+    assert resumed == uninterrupted
+
+
+def test_checkpointed_report_is_not_cached(tmp_path):
+    path = looping_contract(tmp_path)
+    result_cache = ResultCache(tmp_path / 'cache')
+    interrupted, _ = analyze(path, timeout=1, checkpoint=str(tmp_path / 'looping.checkpoint'),
+                             result_cache=result_cache)
+    assert interrupted.checkpointer.taken
+    assert not list((tmp_path / 'cache').rglob('*.json'))
@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+from dolabra.analysis import job_store
+from dolabra.analysis.batch import STATUS_ERROR, STATUS_OK, STATUS_TIMEOUT, BatchJob
+from dolabra.analysis.job_store import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING, JOB_TIMED_OUT, JobStore
+from dolabra.contract_loaders.loader import LoaderType
+
+
+def binary_job(name):
+    return BatchJob(name, LoaderType.BINARY, {'path': name + '.bin'})
+
+
+def ok_record(name):
+    return {'name': name, 'status': STATUS_OK, 'wall_time': 0.1, 'results': [], 'error': None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(tmp_path / 'jobs.db', lease=0.2, max_attempts=2)
+    store.add([binary_job(name) for name in ('a', 'b', 'c')])
+    yield store
+    store.close()
+
+
+def test_claim_hands_out_each_job_once(store):
+    first = store.claim('first', 2)
+    second = store.claim('second', 2)
+    assert [stored.job.name for stored in first] == ['a', 'b']
+    assert [stored.job.name for stored in second] == ['c']
+    assert all(stored.attempts == 1 for stored in first + second)
+    assert store.claim('third') == []
+    assert store.counts()[JOB_RUNNING] == 3
+
+
+def test_heartbeat_keeps_the_lease(store):
+    stored, = store.claim('first')
+    time.sleep(0.15)
+    store.heartbeat('first', [stored.id])
+    time.sleep(0.1)
+    assert [other.job.name for other in store.claim('second', 3)] == ['b', 'c']
+
+
+def test_expired_lease_is_claimed_again(store):
+    stored = store.claim('first', 3)[0]
+    time.sleep(0.3)
+    reclaimed, = store.claim('second')
+    assert reclaimed.id == stored.id and reclaimed.attempts == 2
+    # Only the worker holding the lease stores the record
+    assert not store.finish('first', stored.id, ok_record('a'))
+    assert store.finish('second', reclaimed.id, ok_record('a'))
+    assert [record['name'] for record in store.records()] == ['a']
+    assert store.counts()[JOB_DONE] == 1
+    assert store.counts()[JOB_RUNNING] == 2
+
+
+def test_lost_job_fails_after_its_attempts(store):
+    store.claim('first', 3)
+    time.sleep(0.3)
+    assert len(store.claim('second', 3)) == 3
+    time.sleep(0.3)
+    assert store.claim('third', 3) == []
+    assert store.counts()[JOB_FAILED] == 3
+
+
+def test_retry_counts_the_attempt(store):
+    stored, = store.claim('first')
+    assert not store.retry('second', stored.id)
+    assert store.retry('first', stored.id)
+    assert store.counts()[JOB_PENDING] == 3
+    stored, = store.claim('first')
+    assert stored.attempts == 2
+    assert not store.retry('first', stored.id)
+
+
+def fake_run_job(job, **options):
+    if job.name == 'crash':
+        os._exit(1)
+    if job.name == 'hang':
+        time.sleep(60)
+    return ok_record(job.name)
+
+
+def test_campaign_recovers_jobs_lost_with_their_worker(tmp_path, monkeypatch):
+    # The pool forks after the patches, its workers run the fake jobs
+    monkeypatch.setattr(job_store, '_run_job', fake_run_job)
+    monkeypatch.setattr(job_store, 'JOB_STORE_HEARTBEAT_INTERVAL', 0.1)
+    monkeypatch.setattr(job_store, 'JOB_STORE_DEADLINE_GRACE', 0)
+    store = JobStore(tmp_path / 'jobs.db', max_attempts=2)
+    store.add([binary_job(name) for name in ('ok', 'crash', 'hang')])
+
+    summary = job_store.run_campaign(store, workers=2, job_timeout=0.5, engine='static')
+    assert summary == {STATUS_OK: 1, STATUS_ERROR: 1, STATUS_TIMEOUT: 1}
+    counts = store.counts()
+    assert (counts[JOB_DONE], counts[JOB_FAILED], counts[JOB_TIMED_OUT], counts[JOB_RUNNING]) == (1, 1, 1, 0)
+    crashed, = (record for record in store.records() if record['name'] == 'crash')
+    assert crashed['attempt'] == 2
+    store.close()
@@ -0,0 +1,62 @@
+from dolabra.contract_loaders.jsonrpc_client import CODE_SLOT, PooledJsonRpc, RpcCache
+
+from conftest import CONTRACT_ADDRESS, CONTRACT_CODE
+
+
+def rpc_client(node, cache=None):
+    return PooledJsonRpc(host='127.0.0.1', port=node.port, cache=cache)
+
+
+def storage_value(value):
+    return '0x%064x' % value
+
+
+def test_prefetch_batches_account_reads(rpc_node):
+    client = rpc_client(rpc_node)
+    client.prefetch(CONTRACT_ADDRESS, slots=[0, 1, 2])
+    # The chain id and the block number are read on their own, the account in a single batch
+    assert rpc_node.posts == 3
+    assert rpc_node.methods['eth_getStorageAt'] == 3
+    assert client.stats['prefetched'] == 5
+
+    posts = rpc_node.posts
+    assert client.eth_getCode(CONTRACT_ADDRESS) == CONTRACT_CODE
+    assert client.eth_getStorageAt(CONTRACT_ADDRESS, 0) == storage_value(1)
+    assert client.eth_getStorageAt(CONTRACT_ADDRESS, 2) == storage_value(0)
+    assert rpc_node.posts == posts
+    assert client.stats['hits'] == 3
+
+
+def test_rejected_batch_falls_back_to_single_requests(rpc_node):
+    rpc_node.reject_batches = True
+    client = rpc_client(rpc_node)
+    results = client.batch([('eth_getCode', [CONTRACT_ADDRESS, 'latest']),
+                            ('eth_getStorageAt', [CONTRACT_ADDRESS, '0x0', 'latest'])])
+    assert results == [CONTRACT_CODE, storage_value(1)]
+    assert rpc_node.posts == 3
+
+
+def test_cache_answers_other_clients(rpc_node, tmp_path):
+    cache = RpcCache(tmp_path / 'rpc.db')
+    first = rpc_client(rpc_node, cache)
+    assert first.eth_getCode(CONTRACT_ADDRESS) == CONTRACT_CODE
+    assert (first.stats['hits'], first.stats['misses']) == (0, 1)
+
+    second = rpc_client(rpc_node, RpcCache(tmp_path / 'rpc.db'))
+    assert second.eth_getCode(CONTRACT_ADDRESS) == CONTRACT_CODE
+    assert (second.stats['hits'], second.stats['misses']) == (1, 0)
+    assert rpc_node.methods['eth_getCode'] == 1
+    assert cache.get((1, rpc_node.block, CONTRACT_ADDRESS, CODE_SLOT)) == CONTRACT_CODE
+
+
+def test_reads_are_pinned_to_the_first_block(rpc_node):
+    client = rpc_client(rpc_node)
+    client.eth_getStorageAt(CONTRACT_ADDRESS, 0)
+    pinned = rpc_node.block
+    rpc_node.block += 1
+    client.eth_getStorageAt(CONTRACT_ADDRESS, 1)
+    client.eth_getBalance(CONTRACT_ADDRESS)
+    assert client.block_number == pinned
+    assert rpc_node.methods['eth_blockNumber'] == 1
+    reads = [request for request in rpc_node.requests if request['method'] in ('eth_getStorageAt', 'eth_getBalance')]
+    assert [request['params'][-1] for request in reads] == [hex(pinned)] * 3
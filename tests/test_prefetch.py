@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from mythril.ethereum.interface.rpc.exceptions import ConnectionError
+
+from dolabra.analysis.batch import BatchJob, job_from_address
+from dolabra.analysis.prefetch import PrefetchPipeline
+from dolabra.constants import RPC_MAX_RETRIES, RPC_PREFETCH_SLOTS
+from dolabra.contract_loaders.jsonrpc_client import AsyncHttpTransport
+from dolabra.contract_loaders.jsonrpc_loader import JsonRpcLoader
+from dolabra.contract_loaders.loader import LoaderType
+
+from conftest import CONTRACT_ADDRESS, CONTRACT_CODE, SLOW_ADDRESS
+
+CHAIN_ID_REQUEST = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_chainId', 'params': []}
+
+
+def post_all(transport: AsyncHttpTransport, payloads):
+    """ Posts *payloads* one after the other on a fresh event loop. """
+    async def post():
+        return [await transport.post(payload) for payload in payloads]
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(post())
+    finally:
+        transport.close()
+        loop.close()
+
+
+def binary_job(name):
+    return BatchJob(name, LoaderType.BINARY, {'path': name + '.bin'})
+
+
+def test_transport_reads_chunked_bodies(rpc_node):
+    rpc_node.chunked = True
+    batch = [dict(CHAIN_ID_REQUEST, id=1), dict(CHAIN_ID_REQUEST, id=2, method='eth_blockNumber')]
+    response, = post_all(AsyncHttpTransport(rpc_node.url), [batch])
+    assert [answer['result'] for answer in response] == ['0x1', '0x100']
+
+
+def test_transport_reuses_keep_alive_connections(rpc_node):
+    transport = AsyncHttpTransport(rpc_node.url)
+    responses = post_all(transport, [CHAIN_ID_REQUEST] * 3)
+    assert [response['result'] for response in responses] == ['0x1'] * 3
+    assert transport.requests == 3
+    assert rpc_node.connections == 1
+
+
+def test_transport_reconnects_after_connection_close(rpc_node):
+    rpc_node.close_connections = True
+    rpc_node.chunked = True
+    responses = post_all(AsyncHttpTransport(rpc_node.url), [CHAIN_ID_REQUEST] * 3)
+    assert [response['result'] for response in responses] == ['0x1'] * 3
+    assert rpc_node.connections == 3
+
+
+def test_transport_retries_dropped_requests(rpc_node):
+    rpc_node.drop_requests = RPC_MAX_RETRIES
+    response, = post_all(AsyncHttpTransport(rpc_node.url), [CHAIN_ID_REQUEST])
+    assert response['result'] == '0x1'
+    assert rpc_node.posts == RPC_MAX_RETRIES + 1
+
+
+def test_transport_gives_up_after_retries(rpc_node):
+    rpc_node.drop_requests = RPC_MAX_RETRIES + 1
+    with pytest.raises(ConnectionError):
+        post_all(AsyncHttpTransport(rpc_node.url), [CHAIN_ID_REQUEST])
+
+
+def test_pipeline_window_pauses_hand_over():
+    pipeline = PrefetchPipeline(workers=1, ahead=1)
+    jobs = [binary_job(str(index)) for index in range(5)]
+    taken = []
+    consumer = threading.Thread(target=lambda: taken.extend(pipeline.jobs(jobs)))
+    consumer.start()
+    time.sleep(0.3)
+    # One job being analyzed and one waiting fill the window
+    assert len(taken) == 2
+    pipeline.finished()
+    time.sleep(0.3)
+    assert len(taken) == 3
+    for _ in jobs:
+        pipeline.finished()
+    consumer.join(5)
+    assert not consumer.is_alive()
+    assert taken == jobs
+
+
+def test_pipeline_keeps_input_order(rpc_node):
+    rpc_node.delays[SLOW_ADDRESS] = 0.3
+    jobs = [job_from_address(SLOW_ADDRESS, rpc=rpc_node.url), binary_job('binary'),
+            job_from_address(CONTRACT_ADDRESS, rpc=rpc_node.url)]
+    pipeline = PrefetchPipeline(workers=len(jobs), ahead=len(jobs))
+    handed_over = [job.name for job in pipeline.jobs(jobs)]
+    assert handed_over == [job.name for job in jobs]
+    assert pipeline.stats['contracts'] == 2
+
+
+def test_preloaded_jobs_are_not_read_again(rpc_node):
+    pipeline = PrefetchPipeline(workers=1)
+    job, = pipeline.jobs([job_from_address(CONTRACT_ADDRESS, rpc=rpc_node.url)])
+    pipeline.finished()
+    assert job.options['block'] == rpc_node.block
+    assert len(job.options['prefetched']) == 2 + RPC_PREFETCH_SLOTS + 1
+
+    posts = rpc_node.posts
+    contract_loader = JsonRpcLoader.create(**job.options)
+    assert contract_loader.disassembly().bytecode == CONTRACT_CODE
+    assert contract_loader.dyn_loader.read_storage(CONTRACT_ADDRESS, 0) == '0x%064x' % 1
+    assert rpc_node.posts == posts
+    assert contract_loader.rpc_stats.get('requests', 0) == 0
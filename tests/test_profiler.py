@@ -0,0 +1,49 @@
+import tracemalloc
+
+from dolabra.analysis.profiler import ModuleProfiler
+from dolabra.analysis.symbolic import SymbolicWrapper
+from dolabra.benchmark.synthetic import SyntheticSpec, creation_code
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+
+def profiled_run(tmp_path, block_memo=True):
+    path = tmp_path / 'contract.bin'
+    path.write_text(creation_code(SyntheticSpec(functions=3, slots=2)).hex())
+    profiler = ModuleProfiler()
+    wrapper = SymbolicWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)), profiler=profiler,
+                              block_memo=block_memo)
+    wrapper.run_analysis()
+    return wrapper, profiler.report()
+
+
+def test_profiler_keeps_tracing_started_by_its_caller():
+    tracemalloc.start()
+    try:
+        profiler = ModuleProfiler()
+        profiler.start()
+        profiler.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    profiler = ModuleProfiler()
+    profiler.start()
+    assert tracemalloc.is_tracing()
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+
+def test_replayed_steps_are_profiled_apart(tmp_path):
+    wrapper, report = profiled_run(tmp_path)
+    assert wrapper.dispatcher.report_memo()['replayed_steps'] > 0
+    modules = report['modules'].values()
+    replayed = sum(module['replay_count'] for module in modules)
+    assert replayed > 0
+    # Without the memo, the same module steps are all executed
+    _, unmemoized = profiled_run(tmp_path, block_memo=False)
+    assert sum(module['replay_count'] for module in unmemoized['modules'].values()) == 0
+    assert (sum(module['count'] for module in modules) + replayed
+            == sum(module['count'] for module in unmemoized['modules'].values()))
+    instructions = report['instructions']
+    assert instructions['opcodes']['SLOAD']['count'] > 0
+    assert instructions['total_time'] == sum(opcode['total_time'] for opcode in instructions['opcodes'].values())
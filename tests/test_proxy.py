@@ -0,0 +1,83 @@
+import pytest
+
+from dolabra.contract_loaders.jsonrpc_client import PooledJsonRpc
+from dolabra.contract_loaders.proxy import (
+    BEACON_IMPLEMENTATION_SELECTOR,
+    IMPLEMENTATION_SLOTS,
+    PROXY_EIP1167,
+    PROXY_EIP1967,
+    PROXY_EIP1967_BEACON,
+    Proxy,
+    delegates_calls,
+    minimal_proxy_implementation,
+    resolve_proxy
+)
+
+from conftest import StubNode
+
+PROXY_ADDRESS = '0x' + '33' * 20
+IMPLEMENTATION = '0x' + 'be' * 20
+BEACON = '0x' + 'bc' * 20
+# EIP-1167 minimal proxy of IMPLEMENTATION
+MINIMAL_PROXY = bytes.fromhex('363d3d373d3d3d363d73' + 'be' * 20 + '5af43d82803e903d91602b57fd5bf3')
+# Proxy body: copy the calldata, DELEGATECALL the implementation read from the EIP-1967 slot and return its result
+DELEGATING_CODE = bytes.fromhex('36600080376000803660007f%064x545af43d6000803e3d6000f3' % IMPLEMENTATION_SLOTS[PROXY_EIP1967])
+# PUSH2 0xf4f4 POP STOP: the DELEGATECALL opcode only appears in PUSH data
+PUSHED_DELEGATECALL = bytes.fromhex('61f4f45000')
+
+
+def slot_value(address):
+    return int(address, 16)
+
+
+@pytest.fixture
+def proxy_node():
+    node = StubNode().start()
+    yield node
+    node.stop()
+
+
+def resolve(node, code):
+    return resolve_proxy(PooledJsonRpc(host='127.0.0.1', port=node.port), PROXY_ADDRESS, code)
+
+
+def test_minimal_proxy_implementation():
+    assert minimal_proxy_implementation(MINIMAL_PROXY) == IMPLEMENTATION
+    # Vanity implementations are pushed with fewer bytes
+    vanity = bytes.fromhex('363d3d373d3d3d363d6f' + 'be' * 16 + '5af43d82803e903d91602b57fd5bf3')
+    assert minimal_proxy_implementation(vanity) == '0x00000000' + 'be' * 16
+    assert minimal_proxy_implementation(MINIMAL_PROXY + b'\x00') is None
+    assert minimal_proxy_implementation(DELEGATING_CODE) is None
+
+
+def test_delegates_calls_skips_push_data():
+    assert delegates_calls(DELEGATING_CODE)
+    assert not delegates_calls(PUSHED_DELEGATECALL)
+    # A PUSH running past the end of the code
+    assert not delegates_calls(bytes.fromhex('7ff4'))
+
+
+def test_resolve_minimal_proxy_from_its_code(proxy_node):
+    assert resolve(proxy_node, MINIMAL_PROXY) == Proxy(PROXY_EIP1167, IMPLEMENTATION)
+    assert proxy_node.posts == 0
+
+
+def test_resolve_eip1967_proxy(proxy_node):
+    proxy_node.storage[(PROXY_ADDRESS, IMPLEMENTATION_SLOTS[PROXY_EIP1967])] = slot_value(IMPLEMENTATION)
+    assert resolve(proxy_node, DELEGATING_CODE) == Proxy(PROXY_EIP1967, IMPLEMENTATION)
+    # Every implementation slot is read in a single batch
+    assert proxy_node.methods['eth_getStorageAt'] == len(IMPLEMENTATION_SLOTS)
+
+
+def test_resolve_eip1967_beacon_proxy(proxy_node):
+    proxy_node.storage[(PROXY_ADDRESS, IMPLEMENTATION_SLOTS[PROXY_EIP1967_BEACON])] = slot_value(BEACON)
+    proxy_node.calls[(BEACON, BEACON_IMPLEMENTATION_SELECTOR)] = '0x%064x' % slot_value(IMPLEMENTATION)
+    assert resolve(proxy_node, DELEGATING_CODE) == Proxy(PROXY_EIP1967_BEACON, IMPLEMENTATION)
+
+
+def test_code_without_delegatecall_is_not_a_proxy(proxy_node):
+    proxy_node.storage[(PROXY_ADDRESS, IMPLEMENTATION_SLOTS[PROXY_EIP1967])] = slot_value(IMPLEMENTATION)
+    assert resolve(proxy_node, PUSHED_DELEGATECALL) is None
+    # The same body making a CALL
+    assert resolve(proxy_node, DELEGATING_CODE.replace(b'\x5a\xf4', b'\x5a\xf1')) is None
+    assert proxy_node.methods['eth_getStorageAt'] == 0
@@ -0,0 +1,44 @@
+from dolabra.analysis.symbolic import SymbolicWrapper
+from dolabra.benchmark.synthetic import Assembler, selector
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+
+def non_payable_contract() -> bytes:
+    """ Creation code of a contract reverting on call value before dispatching, like a non-payable solc contract. """
+    code = Assembler()
+    code.push(0x80).push(0x40).op('MSTORE')
+    code.op('CALLVALUE', 'DUP1', 'ISZERO').push_label('non_payable').op('JUMPI').push(0).op('DUP1', 'REVERT')
+    code.label('non_payable').op('POP')
+    code.push(4).op('CALLDATASIZE', 'LT').push_label('fallback').op('JUMPI')
+    code.push(0).op('CALLDATALOAD').push(0xe0).op('SHR')
+    for index in range(2):
+        code.op('DUP1').push(selector(index), 4).op('EQ').push_label('function{}'.format(index)).op('JUMPI')
+    # The fallback reads a slot, so the getter module settles on it too
+    code.label('fallback').push(0).op('DUP1', 'SLOAD').push(0).op('MSTORE').push(0x20).push(0).op('RETURN')
+    code.label('function0').op('POP').push(1).push(1).op('SSTORE', 'STOP')
+    code.label('function1').op('POP').push(1).op('DUP1', 'SLOAD').push(0).op('MSTORE').push(0x20).push(0).op('RETURN')
+    runtime = code.assemble()
+
+    constructor = Assembler()
+    constructor.push(len(runtime), 2).op('DUP1').push_label('runtime').push(0).op('CODECOPY')
+    constructor.push(0).op('RETURN', 'INVALID')
+    constructor.mark('runtime')
+    return constructor.assemble() + runtime
+
+
+def analyze(path, saturation):
+    wrapper = SymbolicWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)), saturation=saturation)
+    wrapper.white_list = ['Getter', 'Payable']
+    report = wrapper.run_analysis()
+    return wrapper, sorted((result['pattern'], result['function_name']) for results in report for result in results)
+
+
+def test_dispatcher_states_are_never_saturated(tmp_path):
+    path = tmp_path / 'non_payable.bin'
+    path.write_text(non_payable_contract().hex())
+    pruned, findings = analyze(path, saturation=True)
+    # Settling on the fallback in the prologue must not drop the states on their way to the functions
+    assert 'fallback' not in pruned.saturation_plugin.saturated
+    assert ('Getter', 'fallback') in findings
+    _, unpruned = analyze(path, saturation=False)
+    assert findings == unpruned
@@ -0,0 +1,75 @@
+import json
+import subprocess
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from dolabra.analysis.batch import BatchJob
+from dolabra.analysis.service import JOB_RUNNING, AnalysisService, ServiceJob, WorkerStats
+from dolabra.cli.server import ServiceHTTPServer
+from dolabra.contract_loaders.loader import LoaderType
+
+
+@pytest.fixture
+def server():
+    # Invalid requests are answered before a job reaches the pool, which is not started
+    server = ServiceHTTPServer(('127.0.0.1', 0), AnalysisService(workers=1))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def request(server, method, path, body=None):
+    connection = HTTPConnection(*server.server_address[:2])
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    answer = json.loads(response.read())
+    connection.close()
+    return response.status, answer
+
+
+@pytest.mark.parametrize('body', [b'{"bytecode": ', b'[]', b'{"engine": "unknown"}', b'{"name": "nothing to analyze"}',
+                                  b'{"bytecode": "6000", "job_timeout": [1]}', b'{"bytecode": "not hex"}'])
+def test_invalid_jobs_are_rejected(server, body):
+    status, answer = request(server, 'POST', '/jobs', body)
+    assert status == 400
+    assert 'error' in answer
+
+
+def test_unknown_jobs_are_not_found(server):
+    assert request(server, 'GET', '/jobs') == (200, {'jobs': []})
+    assert request(server, 'GET', '/jobs/unknown')[0] == 404
+    assert request(server, 'GET', '/jobs/unknown/events')[0] == 404
+
+
+def running_job(service, pid, current_job):
+    job = ServiceJob('job', BatchJob('job', LoaderType.BINARY, {'path': 'job.bin'}), timeout=1)
+    job.status, job.started, job.worker = JOB_RUNNING, time.time() - 3600, pid
+    service._jobs[job.id] = job
+    service._worker_stats[pid] = WorkerStats(pid)
+    service._worker_stats[pid].current_job = current_job
+    return job
+
+
+@pytest.mark.parametrize('current_job, killed', [('job', True), ('next job', False)])
+def test_overrunning_job_kills_only_its_worker(current_job, killed):
+    worker = subprocess.Popen(['sleep', '30'])
+    service = AnalysisService(workers=1)
+    try:
+        job = running_job(service, worker.pid, current_job)
+        service._check_workers(time.time())
+        assert job.done and job.record['error'] == 'Job exceeded its deadline'
+        if killed:
+            assert worker.wait(5) == -9
+        else:
+            time.sleep(0.1)
+            assert worker.poll() is None
+    finally:
+        worker.kill()
+        worker.wait()
+        service.close()
@@ -0,0 +1,45 @@
+import pytest
+
+from dolabra.analysis import signatures
+from dolabra.analysis.signatures import SignatureIndex, build_signature_index, selector
+
+TRANSFER = 'transfer(address,uint256)'
+# Two signatures sharing the selector 0x42966c68
+COLLIDING = ['burn(uint256)', 'collate_propagate_storage(bytes16)']
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = tmp_path / 'signatures.idx'
+    assert build_signature_index(path, [TRANSFER, 'balanceOf(address)', TRANSFER] + COLLIDING) == 4
+    return path
+
+
+def test_index_looks_up_packed_signatures(index_path):
+    index = SignatureIndex(index_path)
+    assert len(index) == 4
+    assert selector(TRANSFER) == 0xa9059cbb
+    assert index.signature(0xa9059cbb) == TRANSFER
+    assert index.signature(selector('balanceOf(address)')) == 'balanceOf(address)'
+    assert index.signatures(selector(COLLIDING[0])) == COLLIDING
+    index.close()
+
+
+def test_index_misses_unknown_selectors(index_path):
+    index = SignatureIndex(index_path)
+    assert index.signature(0xffffffff) is None
+    assert index.signatures(0x12345678) == []
+    result = {'function_name': '_function_0xffffffff', 'signature': 'stale()'}
+    assert 'signature' not in index.label(result)
+    assert index.label({'function_name': 'fallback'}) == {'function_name': 'fallback'}
+    assert index.label({'function_name': '_function_0xa9059cbb'})['signature'] == TRANSFER
+    index.close()
+
+
+def test_index_rejects_offsets_past_its_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(signatures, 'MAX_OFFSET', signatures.HEADER.size + len(TRANSFER))
+    path = tmp_path / 'signatures.idx'
+    with pytest.raises(ValueError):
+        build_signature_index(path, [TRANSFER, 'balanceOf(address)', 'approve(address,uint256)'])
+    assert not path.exists()
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,65 @@
+from mythril.disassembler.disassembly import Disassembly
+
+from dolabra.analysis.static import StaticScanner, StaticWrapper
+from dolabra.benchmark.synthetic import Assembler, SyntheticSpec, creation_code, runtime_code, selector
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+from conftest import MODULES, expected_findings
+
+SPEC = SyntheticSpec(functions=4, slots=2, loops=1, checks=2)
+
+
+def scan(code, patterns=MODULES):
+    return {function.name: function.verdicts for function in StaticScanner(Disassembly(code.hex())).scan(patterns)}
+
+
+def guarded_runtime(guard: bool) -> bytes:
+    """ A getter reading msg.value, behind a msg.value == 0 check of the prologue when *guard* is set. """
+    code = Assembler()
+    if guard:
+        code.op('CALLVALUE', 'DUP1', 'ISZERO').push_label('non_payable').op('JUMPI').push(0).op('DUP1', 'REVERT')
+        code.label('non_payable').op('POP')
+    code.push(0).op('CALLDATALOAD').push(0xe0).op('SHR')
+    code.op('DUP1').push(selector(0), 4).op('EQ').push_label('function0').op('JUMPI').push(0).op('DUP1', 'REVERT')
+    code.label('function0').op('POP', 'CALLVALUE').push(0).op('MSTORE').push(0x20).push(0).op('RETURN')
+    return code.assemble()
+
+
+def test_scanner_recovers_the_dispatcher():
+    scanner = StaticScanner(Disassembly(runtime_code(SPEC).hex()))
+    assert sorted(scanner.dispatcher()) == sorted(selector(index) for index in range(SPEC.functions))
+    assert scanner.storage_slots() >= {0, 1}
+
+
+def test_scanner_verdicts_agree_with_the_modules():
+    expected = expected_findings(SPEC)
+    verdicts = scan(runtime_code(SPEC))
+    assert set(verdicts) == set(expected['Payable'])
+    for name, function_verdicts in verdicts.items():
+        for pattern, verdict in function_verdicts.items():
+            if verdict is not None:
+                assert verdict == (name in expected[pattern]), (name, pattern)
+    # Only the owner check of the first setter reads storage the Getter cannot rule out
+    undecided = [(name, pattern) for name, function_verdicts in verdicts.items()
+                 for pattern, verdict in function_verdicts.items() if verdict is None]
+    assert undecided == [('_function_0x%08x' % selector(1), 'Getter')]
+
+
+def test_scanner_decides_payable_from_callvalue_guards():
+    name = '_function_0x%08x' % selector(0)
+    assert scan(guarded_runtime(guard=True), ['Payable']) == {name: {'Payable': False}}
+    # msg.value is read without a guard, only symbolic execution can tell
+    assert scan(guarded_runtime(guard=False), ['Payable']) == {name: {'Payable': None}}
+
+
+def test_static_wrapper_hands_undecided_functions_to_symbolic_execution(tmp_path):
+    path = tmp_path / (SPEC.name + '.bin')
+    path.write_text(creation_code(SPEC).hex())
+    expected = expected_findings(SPEC)
+    for symbolic_fallback in (False, True):
+        wrapper = StaticWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)), MODULES,
+                                symbolic_fallback=symbolic_fallback)
+        report = wrapper.run_analysis()
+        assert {pattern: {result['function_name'] for result in results}
+                for pattern, results in zip(MODULES, report)} == expected
+        assert bool(wrapper.undecided) != symbolic_fallback
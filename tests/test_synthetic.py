@@ -0,0 +1,23 @@
+from dolabra.analysis.symbolic import SymbolicWrapper
+from dolabra.benchmark.synthetic import SyntheticSpec, creation_code
+from dolabra.contract_loaders.loader import Loader, LoaderType
+
+from conftest import MODULES, expected_findings
+
+
+def test_every_module_hits_the_synthetic_contract(tmp_path):
+    spec = SyntheticSpec(functions=4, slots=2, loops=1, checks=2)
+    path = tmp_path / (spec.name + '.bin')
+    path.write_text(creation_code(spec).hex())
+    wrapper = SymbolicWrapper(Loader.get_contract(LoaderType.BINARY, path=str(path)))
+    wrapper.white_list = MODULES
+
+    expected = expected_findings(spec)
+    found = {module: set() for module in MODULES}
+    for results in wrapper.run_analysis():
+        for result in results:
+            if result['function_name'].startswith('_function_'):
+                found[result['pattern']].add(result['function_name'])
+    for module in MODULES:
+        assert found[module] & expected[module], module
+        assert found[module] <= expected[module], module
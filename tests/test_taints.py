@@ -0,0 +1,22 @@
+import copy
+import gc
+import pickle
+
+from dolabra.analysis.module.modules.taints import STORAGE_LOAD, PushFourTaint, StorageLoadTaint
+
+
+def test_payload_taints_are_interned_while_referenced():
+    taint = PushFourTaint(0xa9059cbb)
+    assert PushFourTaint(0xa9059cbb) is taint
+    assert copy.deepcopy(taint) is taint
+    assert pickle.loads(pickle.dumps(taint)) is taint
+    assert StorageLoadTaint() is STORAGE_LOAD
+    assert StorageLoadTaint(1) is not STORAGE_LOAD
+
+    interned = len(PushFourTaint._interned)
+    taints = [PushFourTaint(selector) for selector in range(1000)]
+    assert len(PushFourTaint._interned) >= interned + 1000
+    del taints
+    gc.collect()
+    assert len(PushFourTaint._interned) <= interned
+    assert PushFourTaint(0xa9059cbb) is taint
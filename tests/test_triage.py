@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from dolabra.analysis.batch import jobs_from_corpus
+from dolabra.analysis.triage import (
+    MinHasher,
+    StaticShape,
+    cluster,
+    extract_features,
+    instruction_starts,
+    similarity,
+    strip_metadata,
+    triage_jobs
+)
+from dolabra.benchmark.synthetic import Assembler, SyntheticSpec, runtime_code
+from dolabra.constants import DEFAULT_MODULES
+from dolabra.contract_loaders.corpus_loader import build_corpus
+
+BASE = runtime_code(SyntheticSpec(functions=8))
+# Dispatches one more function
+NEAR_DUPLICATE = runtime_code(SyntheticSpec(functions=9))
+# Its first function requires the caller to be the owner
+OWNER_CHECKED = runtime_code(SyntheticSpec(functions=8, checks=1))
+UNRELATED = bytes(range(256)) * 2
+
+
+def with_constant(code, value):
+    """ *code* followed by an unreachable PUSH32 of *value*. """
+    return code + Assembler().push(value, 32).op('POP').assemble()
+
+
+def signatures(codes):
+    hasher = MinHasher()
+    return np.stack([hasher.signature(extract_features(code)) for code in codes])
+
+
+def test_features_skip_push_data_and_metadata():
+    # PUSH4 0x60606060 PUSH1 0x5b JUMPDEST, then metadata: a2 marker, payload, two byte length
+    code = bytes([0x63, 0x60, 0x60, 0x60, 0x60, 0x60, 0x5b, 0x5b])
+    metadata = bytes([0xa2, 0x01, 0x02, 0x00, 0x03])
+    assert strip_metadata(code + metadata) == code
+    assert list(instruction_starts(np.frombuffer(code, dtype=np.uint8))) == [0, 5, 7]
+    features = extract_features(code + metadata)
+    assert list(features.selectors) == [0x60606060]
+    assert features.histogram.sum() == 3
+
+
+def test_skeleton_ignores_wide_constants():
+    first, second = extract_features(with_constant(BASE, 1)), extract_features(with_constant(BASE, 2))
+    assert first.skeleton == second.skeleton
+    assert first.skeleton != extract_features(BASE).skeleton
+    assert first.skeleton != extract_features(with_constant(NEAR_DUPLICATE, 1)).skeleton
+
+
+def test_minhash_estimates_similarity():
+    base, identical, near, unrelated = signatures([BASE, BASE, NEAR_DUPLICATE, UNRELATED])
+    assert similarity(base, identical) == 1.0
+    assert 0.8 <= similarity(base, near) < 1.0
+    assert similarity(base, unrelated) < 0.2
+
+
+def test_cluster_groups_near_duplicates_in_input_order():
+    rows = signatures([UNRELATED, BASE, NEAR_DUPLICATE, BASE])
+    assert cluster(rows) == [[0], [1, 2, 3]]
+    assert cluster(rows, threshold=1.0) == [[0], [1, 3], [2]]
+
+
+def test_static_shape_verifies_equal_functions():
+    patterns = list(DEFAULT_MODULES)
+    shape = StaticShape(BASE, patterns)
+    assert shape.decided
+    assert StaticShape(with_constant(BASE, 1), patterns) == shape
+    assert StaticShape(NEAR_DUPLICATE, patterns) != shape
+    assert StaticShape(OWNER_CHECKED, patterns) != shape
+    # A pattern without a static matcher leaves the shape undecided, it verifies nothing
+    undecided = StaticShape(BASE, patterns + ['Unmatched'])
+    assert not undecided.decided
+    assert not undecided == StaticShape(BASE, patterns + ['Unmatched'])
+
+
+@pytest.mark.parametrize('follower, verified', [(BASE, True), (with_constant(BASE, 1), True),
+                                               (NEAR_DUPLICATE, False), (OWNER_CHECKED, False)])
+def test_triage_keeps_unverified_members(tmp_path, follower, verified):
+    corpus = tmp_path / 'corpus.bin'
+    # The corpus sorts addresses, the representative comes first
+    entries = [('0x' + '01' * 20, BASE.hex()), ('0x' + '02' * 20, follower.hex()), ('0x' + '03' * 20, UNRELATED.hex())]
+    build_corpus(corpus, entries)
+    jobs = jobs_from_corpus(str(corpus))
+
+    plan = triage_jobs(jobs)
+    assert plan.clusters == 2
+    if verified:
+        assert plan.jobs == [jobs[0], jobs[2]]
+        assert plan.followers == {jobs[0].name: [jobs[1]]}
+    else:
+        assert plan.jobs == jobs
+        assert plan.followers == {}